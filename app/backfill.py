@@ -0,0 +1,408 @@
+"""Load wrapper messages from JSONL files straight into the pipeline, without data-mq.
+
+    python backfill.py PATH [PATH ...] [--mode all|cache|forward|validate]
+                       [--processes N] [--batch-size N] [--checkpoint FILE]
+
+PATH is a file with one wrapper message per line, optionally gzip-compressed, or
+a directory of .jsonl and .gz files. The main process reads the input once, plain
+files through mmap, and hands each worker process batches of its share of the
+wrappers, so a wrapper's messages are handled in file order as by the consumers.
+Batches are validated with one pipelined statistics round trip, cached with one
+Redis pipeline and forwarded to COLLECTED_DATA_QUEUE with pipelined confirms.
+
+``cache`` and ``forward`` do only one of the two. ``validate`` is a dry run: it
+checks coherence against the stored wrapper statistics without recording any, or
+learning profiles, so it can be repeated.
+With --checkpoint the main process records how far each worker got after every
+batch, and a rerun with the same files and --processes resumes from there.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import zlib
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger("backfill")
+
+MODES = ("all", "cache", "forward", "validate")
+_GZIP_MAGIC = b"\x1f\x8b"
+_PROGRESS_INTERVAL = 5.0
+# Batches waiting for each worker before the reader blocks
+_QUEUED_BATCHES = 4
+
+# Index of a file in the input and an offset in it, in uncompressed bytes
+Position = Tuple[int, int]
+
+
+def input_files(paths: List[str]) -> List[str]:
+    """Expand directories into their .jsonl and .gz files, in name order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.endswith((".jsonl", ".gz")))
+            files.extend(os.path.join(path, name) for name in names)
+        else:
+            files.append(path)
+    return [os.path.abspath(file) for file in files]
+
+
+def read_lines(path: str, start: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield each line after offset ``start`` with the offset past it and the bytes of the file read so far.
+
+    Offsets count uncompressed bytes; gzip files are decompressed up to ``start``.
+    """
+    with open(path, "rb") as file:
+        if file.read(2) == _GZIP_MAGIC:
+            file.seek(0)
+            with gzip.GzipFile(fileobj=file) as lines:
+                offset = 0
+                for line in lines:
+                    offset += len(line)
+                    if offset > start:
+                        yield line, offset, file.tell()
+            return
+
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            size = len(mapped)
+            pos = start
+            while pos < size:
+                end = mapped.find(b"\n", pos)
+                end = size if end == -1 else end + 1
+                yield mapped[pos:end], end, end
+                pos = end
+
+
+class Checkpoint:
+    """Position before which each worker has handled all of its lines, rewritten atomically."""
+
+    def __init__(self, path: Optional[str], processes: int, files: List[str]) -> None:
+        self._path = path
+        self._processes = processes
+        self._files = files
+        self.positions: List[Position] = [(0, 0)] * processes
+        if path and os.path.exists(path):
+            with open(path) as file:
+                state = json.load(file)
+            if state["processes"] != processes:
+                raise SystemExit(f"{path} was written by a run with {state['processes']} processes, not {processes}")
+            if state["files"] != files:
+                raise SystemExit(f"{path} was written by a run over other files")
+            self.positions = [tuple(position) for position in state["positions"]]
+
+    def save(self) -> None:
+        if not self._path:
+            return
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"processes": self._processes, "files": self._files, "positions": self.positions}, file)
+        os.replace(tmp_path, self._path)
+
+
+class Backfill:
+    """Validates and stores the batches handed to one worker process."""
+
+    def __init__(self, index: int, mode: str, progress: Any) -> None:
+        from services import data_ingestor
+        from services.validation_service import ValidationService
+
+        self._ingestor = data_ingestor
+        self._validation = (
+            ValidationService(read_only=True) if mode == "validate" else data_ingestor.validation_service
+        )
+        self._index = index
+        self._cache = mode in ("all", "cache")
+        self._forward = mode in ("all", "forward")
+        self._progress = progress
+        self._counts: Counter = Counter()
+        self._errors: Counter = Counter()
+
+    async def _handle_batch(self, bodies: List[bytes]) -> None:
+        ingestor = self._ingestor
+        decoded_items = []
+        for body in bodies:
+            try:
+                decoded_items.append(self._validation.decode_body(body))
+            except ValueError:
+                self._errors["invalid_format"] += 1
+        results = await self._validation.validate_batch(decoded_items)
+        validated_messages = [validated for validated, _ in results if validated]
+        for _, error in results:
+            if error:
+                self._errors[error.error_type] += 1
+        self._counts["messages"] += len(bodies)
+        self._counts["validated"] += len(validated_messages)
+        if not validated_messages:
+            return
+
+        payloads = [ingestor.encode_wrapper_message(validated) for validated in validated_messages]
+        if self._cache:
+            async with ingestor.redis_client.pipeline(transaction=False) as pipe:
+                ingestor.cache_service.store_messages(validated_messages, pipe, payloads)
+                if settings.HISTORY_ENABLED:
+                    for validated in validated_messages:
+                        await ingestor.history_service.append(validated, pipe)
+                await pipe.execute()
+            if settings.HISTORY_ENABLED:
+                await ingestor.history_service.downsample_messages(validated_messages)
+        if self._forward:
+            await ingestor.forward_collected(payloads)
+            self._counts["forwarded"] += len(payloads)
+
+    async def run(self, work: Any) -> None:
+        """Handle batches from ``work`` until it yields None, reporting after each one."""
+        from dependencies.rabbitmq import services_mq_client
+        from services.cache_writer import cache_write_buffer
+
+        loop = asyncio.get_running_loop()
+        if self._forward:
+            await services_mq_client.connect()
+        if self._cache and cache_write_buffer is not None:
+            cache_write_buffer.start()
+        try:
+            while True:
+                # Waits in a thread so that the write-behind flushes keep running
+                batch = await loop.run_in_executor(None, work.get)
+                if batch is None:
+                    break
+                seq, bodies = batch
+                await self._handle_batch(bodies)
+                self._progress.put((self._index, seq, dict(self._counts), dict(self._errors)))
+        finally:
+            if self._cache and cache_write_buffer is not None:
+                await cache_write_buffer.close()
+            if self._forward:
+                await self._ingestor.collected_envelope_writer.close()
+                await services_mq_client.close()
+        self._progress.put((self._index, None, dict(self._counts), dict(self._errors)))
+
+
+def run_backfill(index: int, mode: str, work: Any, progress: Any) -> None:
+    """Entry point of one worker process."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s backfill-{index} %(levelname)s %(name)s: %(message)s")
+    asyncio.run(Backfill(index, mode, progress).run(work))
+
+
+class Reader:
+    """Reads the input once and hands each worker batches of its share of the wrappers.
+
+    A wrapper always goes to the same worker, chosen as by the consumers'
+    ShardedDispatcher, and its lines are sent in file order. For the checkpoint the
+    reader tracks, per worker, the position of the first line not handled yet: the
+    start of its oldest unconfirmed batch, of its unsent lines, or else the line
+    being read.
+    """
+
+    def __init__(
+        self,
+        workers: List[Any],
+        queues: List[Any],
+        progress: Any,
+        batch_size: int,
+        checkpoint: Checkpoint,
+        total_bytes: int,
+    ) -> None:
+        from services.data_ingestor import body_wrapper_id
+
+        self._wrapper_id = body_wrapper_id
+        self._workers = workers
+        self._queues = queues
+        self._progress = progress
+        self._batch_size = batch_size
+        self._checkpoint = checkpoint
+        # Each worker handled all of its lines before these in an earlier run
+        self._resume = list(checkpoint.positions)
+        self._pending: List[List[bytes]] = [[] for _ in workers]
+        self._pending_start: List[Position] = [(0, 0)] * len(workers)
+        self._sent: List[Deque[Tuple[int, Position]]] = [deque() for _ in workers]
+        self._seq = 0
+        self.position: Position = (0, 0)
+        self.read_bytes = 0
+        self.total_bytes = total_bytes
+        self.stats: Dict[int, Tuple[Dict[str, int], Dict[str, int]]] = {}
+        self.finished: set = set()
+        self.started = self._last_log = time.monotonic()
+
+    def _shard(self, line: bytes) -> int:
+        if len(self._workers) == 1:
+            return 0
+        wrapper_id = self._wrapper_id(line) or ""
+        return zlib.crc32(wrapper_id.encode()) % len(self._workers)
+
+    def _unhandled(self, index: int) -> Position:
+        if self._sent[index]:
+            return self._sent[index][0][1]
+        if self._pending[index]:
+            return self._pending_start[index]
+        return self.position
+
+    def _save_checkpoint(self) -> None:
+        self._checkpoint.positions = [
+            max(self._resume[index], self._unhandled(index)) for index in range(len(self._workers))
+        ]
+        self._checkpoint.save()
+
+    def drain(self, timeout: float = 0.0) -> None:
+        """Record the reports of finished batches and checkpoint past them."""
+        reported = False
+        while True:
+            try:
+                index, seq, counts, errors = self._progress.get(timeout=timeout)
+            except queue.Empty:
+                break
+            timeout = 0.0
+            reported = True
+            self.stats[index] = (counts, errors)
+            if seq is None:
+                self.finished.add(index)
+            elif self._sent[index] and self._sent[index][0][0] == seq:
+                self._sent[index].popleft()
+        if reported:
+            self._save_checkpoint()
+        if time.monotonic() - self._last_log >= _PROGRESS_INTERVAL:
+            _log_progress(self)
+            self._last_log = time.monotonic()
+
+    def _put(self, index: int, item: Any) -> None:
+        while True:
+            try:
+                self._queues[index].put(item, timeout=1.0)
+                return
+            except queue.Full:
+                self.drain()
+                if not self._workers[index].is_alive():
+                    raise RuntimeError(f"{self._workers[index].name} exited with code {self._workers[index].exitcode}")
+
+    def _send(self, index: int) -> None:
+        self._seq += 1
+        self._sent[index].append((self._seq, self._pending_start[index]))
+        bodies, self._pending[index] = self._pending[index], []
+        self._put(index, (self._seq, bodies))
+
+    def read(self, files: List[str]) -> None:
+        """Send every line not handled by an earlier run, then the partial batches."""
+        resume = min(self._resume)
+        read_before = 0
+        for file_index, path in enumerate(files):
+            size = os.path.getsize(path)
+            if file_index < resume[0]:
+                read_before += size
+                continue
+            logger.info(f"Reading {path}")
+            start = resume[1] if file_index == resume[0] else 0
+            for line, end, read in read_lines(path, start):
+                self.position = (file_index, start)
+                start = end
+                self.read_bytes = read_before + read
+                line = line.strip()
+                if not line:
+                    continue
+                index = self._shard(line)
+                if self.position < self._resume[index]:
+                    continue
+                if not self._pending[index]:
+                    self._pending_start[index] = self.position
+                self._pending[index].append(line)
+                if len(self._pending[index]) >= self._batch_size:
+                    self._send(index)
+                    self.drain()
+            read_before += size
+        self.position = (len(files), 0)
+        self.read_bytes = read_before
+        for index, pending in enumerate(self._pending):
+            if pending:
+                self._send(index)
+
+    def stop(self) -> None:
+        """Ask the live workers to exit once their queues are empty, and wait for their last reports."""
+        for index, worker in enumerate(self._workers):
+            if worker.is_alive():
+                self._put(index, None)
+        while len(self.finished) < len(self._workers):
+            self.drain(timeout=1.0)
+            # Reports are drained before giving up on processes that died
+            if not any(worker.is_alive() for index, worker in enumerate(self._workers) if index not in self.finished):
+                self.drain()
+                break
+        self._save_checkpoint()
+
+
+def _log_progress(reader: Reader) -> Tuple[Counter, Counter]:
+    counts: Counter = Counter()
+    errors: Counter = Counter()
+    for process_counts, process_errors in reader.stats.values():
+        counts.update(process_counts)
+        errors.update(process_errors)
+    elapsed = max(time.monotonic() - reader.started, 1e-9)
+    done = reader.read_bytes / reader.total_bytes if reader.total_bytes else 1.0
+    logger.info(
+        f"{done:.1%} read, {counts['messages']} messages ({counts['messages'] / elapsed:.0f}/s), "
+        f"{counts['validated']} valid, {counts['forwarded']} forwarded, {sum(errors.values())} rejected"
+    )
+    return counts, errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="JSONL or gzip files, or directories of them")
+    parser.add_argument("--mode", choices=MODES, default="all",
+                        help="write the cache and forward (all), only one of them, or only validate")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--checkpoint", help="file recording how far each worker got")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s backfill %(levelname)s %(name)s: %(message)s")
+    files = input_files(args.paths)
+    # Fails before starting any process when the checkpoint is from another run
+    checkpoint = Checkpoint(args.checkpoint, args.processes, files)
+    total_bytes = sum(os.path.getsize(path) for path in files)
+    logger.info(f"Backfilling {len(files)} files ({total_bytes} bytes) with {args.processes} processes, mode {args.mode}")
+
+    context = multiprocessing.get_context("spawn")
+    progress = context.Queue()
+    queues = [context.Queue(maxsize=_QUEUED_BATCHES) for _ in range(args.processes)]
+    workers = [
+        context.Process(target=run_backfill, args=(index, args.mode, queues[index], progress), name=f"backfill-{index}")
+        for index in range(args.processes)
+    ]
+    for process in workers:
+        process.start()
+
+    reader = Reader(workers, queues, progress, args.batch_size, checkpoint, total_bytes)
+    try:
+        reader.read(files)
+    except RuntimeError as e:
+        logger.error(f"Stopped reading: {e}")
+    finally:
+        reader.stop()
+    for process in workers:
+        process.join()
+
+    counts, errors = _log_progress(reader)
+    for error_type, count in errors.most_common():
+        logger.info(f"Rejected as {error_type}: {count}")
+    failed = [process.name for process in workers if process.exitcode != 0]
+    if failed:
+        logger.error(f"{', '.join(failed)} failed; rerun with the same --checkpoint to resume")
+        return 1
+    logger.info(f"Done in {time.monotonic() - reader.started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,9 +18,152 @@ class Settings(BaseSettings):
     COLLECTED_DATA_QUEUE: str = Field(default="collected_data", env="COLLECTED_DATA_QUEUE")
     VALIDATION_ERROR_QUEUE: str = Field(default="validation_errors", env="VALIDATION_ERROR_QUEUE")
 
+    # Validation Error Reporting Configuration
+    # Errors are summarized per wrapper and error type every window on the summary queue
+    VALIDATION_ERROR_SUMMARY_QUEUE: str = Field(
+        default="validation_error_summaries", env="VALIDATION_ERROR_SUMMARY_QUEUE"
+    )
+    VALIDATION_ERROR_WINDOW_SECONDS: float = Field(default=60.0, env="VALIDATION_ERROR_WINDOW_SECONDS")
+    # Individual errors published per wrapper and window, the rest only counted (0 = unlimited)
+    VALIDATION_ERROR_WRAPPER_LIMIT: int = Field(default=0, env="VALIDATION_ERROR_WRAPPER_LIMIT")
+    # original_data larger than this as JSON is replaced by a sample (0 = never)
+    VALIDATION_ERROR_MAX_ORIGINAL_BYTES: int = Field(default=65536, env="VALIDATION_ERROR_MAX_ORIGINAL_BYTES")
+    VALIDATION_ERROR_SAMPLE_POINTS: int = Field(default=10, env="VALIDATION_ERROR_SAMPLE_POINTS")
+
+    # Publisher Configuration
+    PUBLISH_MAX_IN_FLIGHT: int = Field(default=256, env="PUBLISH_MAX_IN_FLIGHT")
+    PUBLISH_RETRY_BACKOFF: float = Field(default=0.2, env="PUBLISH_RETRY_BACKOFF")
+
+    # Collected Data Envelope Configuration
+    # Packs validated messages into one AMQP message per envelope. Inputs are acked once
+    # their envelope is confirmed, so pair it with DATA_BATCH_SIZE > 1 or CONSUMER_CONCURRENCY > 1
+    COLLECTED_ENVELOPE_ENABLED: bool = Field(default=False, env="COLLECTED_ENVELOPE_ENABLED")
+    COLLECTED_ENVELOPE_MAX_MESSAGES: int = Field(default=100, env="COLLECTED_ENVELOPE_MAX_MESSAGES")
+    COLLECTED_ENVELOPE_MAX_BYTES: int = Field(default=1_000_000, env="COLLECTED_ENVELOPE_MAX_BYTES")
+    COLLECTED_ENVELOPE_LINGER_MS: int = Field(default=50, env="COLLECTED_ENVELOPE_LINGER_MS")
+    COLLECTED_ENVELOPE_COMPRESS: bool = Field(default=False, env="COLLECTED_ENVELOPE_COMPRESS")
+
+    # Consumer Configuration
+    # Run the AMQP consumers inside the API process; disable when using worker.py
+    RUN_CONSUMERS: bool = Field(default=True, env="RUN_CONSUMERS")
+    # Consumer processes started by worker.py and the delay before restarting a crashed one
+    WORKER_PROCESSES: int = Field(default=1, env="WORKER_PROCESSES")
+    WORKER_RESTART_DELAY: float = Field(default=1.0, env="WORKER_RESTART_DELAY")
+    # Worker N serves its metrics on this port + N (0 = disabled); with PROMETHEUS_MULTIPROC_DIR
+    # set, the supervisor serves the merged metrics of all workers on this port instead
+    WORKER_METRICS_PORT: int = Field(default=0, env="WORKER_METRICS_PORT")
+    CONSUMER_PREFETCH_COUNT: int = Field(default=10, env="CONSUMER_PREFETCH_COUNT")
+    # Number of ordered shards processed in parallel per queue (1 = serial)
+    CONSUMER_CONCURRENCY: int = Field(default=1, env="CONSUMER_CONCURRENCY")
+    CONSUMER_MAX_IN_FLIGHT: int = Field(default=10, env="CONSUMER_MAX_IN_FLIGHT")
+    CONSUMER_DRAIN_TIMEOUT: float = Field(default=30.0, env="CONSUMER_DRAIN_TIMEOUT")
+    # Micro-batching for the data queue consumer (1 = handle messages one by one)
+    DATA_BATCH_SIZE: int = Field(default=1, env="DATA_BATCH_SIZE")
+    DATA_BATCH_LINGER_MS: int = Field(default=20, env="DATA_BATCH_LINGER_MS")
+    # Store data points column-wise instead of one model per point
+    COLUMNAR_DATA_ENABLED: bool = Field(default=False, env="COLUMNAR_DATA_ENABLED")
+    # Messages larger than this are validated chunk by chunk and forwarded as ordered
+    # segments of SEGMENT_CHUNK_POINTS points (0 = disabled)
+    SEGMENT_THRESHOLD_BYTES: int = Field(default=0, env="SEGMENT_THRESHOLD_BYTES")
+    SEGMENT_CHUNK_POINTS: int = Field(default=10000, env="SEGMENT_CHUNK_POINTS")
+
+    # Retry Configuration
+    # Failed messages are redelivered after an exponential backoff and quarantined in
+    # <queue>.dead after RETRY_MAX_ATTEMPTS attempts; disabled, they are requeued at once.
+    # Off by default: enabling it declares the retry and dead-letter queues (see README)
+    RETRY_ENABLED: bool = Field(default=False, env="RETRY_ENABLED")
+    RETRY_MAX_ATTEMPTS: int = Field(default=5, env="RETRY_MAX_ATTEMPTS")
+    RETRY_BASE_DELAY_MS: int = Field(default=1000, env="RETRY_BASE_DELAY_MS")
+    RETRY_MAX_DELAY_MS: int = Field(default=60000, env="RETRY_MAX_DELAY_MS")
+
+    # Adaptive Flow Control Configuration
+    # Adjusts consumer prefetch from handler latency and pauses intake while publishes
+    # to the collected data queue fail or slow down
+    FLOW_CONTROL_ENABLED: bool = Field(default=False, env="FLOW_CONTROL_ENABLED")
+    FLOW_MIN_PREFETCH: int = Field(default=1, env="FLOW_MIN_PREFETCH")
+    FLOW_MAX_PREFETCH: int = Field(default=200, env="FLOW_MAX_PREFETCH")
+    FLOW_PREFETCH_STEP: int = Field(default=2, env="FLOW_PREFETCH_STEP")
+    FLOW_TARGET_LATENCY: float = Field(default=0.5, env="FLOW_TARGET_LATENCY")
+    FLOW_MAX_ERROR_RATE: float = Field(default=0.05, env="FLOW_MAX_ERROR_RATE")
+    FLOW_PAUSE_PUBLISH_LATENCY: float = Field(default=2.0, env="FLOW_PAUSE_PUBLISH_LATENCY")
+    FLOW_RESUME_PUBLISH_LATENCY: float = Field(default=0.5, env="FLOW_RESUME_PUBLISH_LATENCY")
+    FLOW_PAUSE_SECONDS: float = Field(default=5.0, env="FLOW_PAUSE_SECONDS")
+    FLOW_ADJUST_INTERVAL: float = Field(default=1.0, env="FLOW_ADJUST_INTERVAL")
+
     # Redis Configuration
     REDIS_URL: str = Field(default="redis://redis:6379", env="REDIS_URL")
 
+    # Cached payload compression: "none", "zlib" or "zstd" (falls back to zlib if unavailable)
+    CACHE_COMPRESSION: str = Field(default="none", env="CACHE_COMPRESSION")
+    CACHE_COMPRESSION_MIN_BYTES: int = Field(default=1024, env="CACHE_COMPRESSION_MIN_BYTES")
+    CACHE_COMPRESSION_LEVEL: int = Field(default=3, env="CACHE_COMPRESSION_LEVEL")
+
+    # Buffer last-message cache writes per key and flush them every interval as one MSET
+    CACHE_WRITE_BEHIND_ENABLED: bool = Field(default=False, env="CACHE_WRITE_BEHIND_ENABLED")
+    CACHE_WRITE_BEHIND_INTERVAL_MS: int = Field(default=100, env="CACHE_WRITE_BEHIND_INTERVAL_MS")
+    # Wrappers whose writes are buffered, plus one entry for the global last-message keys
+    CACHE_WRITE_BEHIND_MAX_ENTRIES: int = Field(default=10000, env="CACHE_WRITE_BEHIND_MAX_ENTRIES")
+    # Seconds before a flush, or a wrapper statistics write, counts as failed
+    CACHE_WRITE_BEHIND_TIMEOUT: float = Field(default=1.0, env="CACHE_WRITE_BEHIND_TIMEOUT")
+    # Consecutive failed Redis writes that stop flushes and statistics writes for
+    # CACHE_BREAKER_RESET_SECONDS; messages are then checked against cached X value types only
+    CACHE_BREAKER_FAILURE_THRESHOLD: int = Field(default=3, env="CACHE_BREAKER_FAILURE_THRESHOLD")
+    CACHE_BREAKER_RESET_SECONDS: float = Field(default=10.0, env="CACHE_BREAKER_RESET_SECONDS")
+
+    # In-process cache of payloads served by the last-message routes
+    RESPONSE_CACHE_SIZE: int = Field(default=1024, env="RESPONSE_CACHE_SIZE")
+    RESPONSE_CACHE_TTL: float = Field(default=1.0, env="RESPONSE_CACHE_TTL")
+
+    # Schema Profile Configuration
+    # Learn each wrapper's data profile from its first messages and flag messages outside it
+    SCHEMA_PROFILE_ENABLED: bool = Field(default=False, env="SCHEMA_PROFILE_ENABLED")
+    SCHEMA_PROFILE_LEARN_MESSAGES: int = Field(default=20, env="SCHEMA_PROFILE_LEARN_MESSAGES")
+    # Y values beyond the learned range by more than this fraction of its span are flagged
+    SCHEMA_PROFILE_Y_TOLERANCE: float = Field(default=0.5, env="SCHEMA_PROFILE_Y_TOLERANCE")
+    SCHEMA_PROFILE_CACHE_SIZE: int = Field(default=10000, env="SCHEMA_PROFILE_CACHE_SIZE")
+
+    # Deduplication Configuration
+    # Skip messages whose raw body was already ingested for the same wrapper within the TTL
+    DEDUP_ENABLED: bool = Field(default=False, env="DEDUP_ENABLED")
+    DEDUP_CACHE_SIZE: int = Field(default=100000, env="DEDUP_CACHE_SIZE")
+    DEDUP_TTL_SECONDS: float = Field(default=600.0, env="DEDUP_TTL_SECONDS")
+    # Share claims across processes and replicas with SET NX EX
+    DEDUP_REDIS_ENABLED: bool = Field(default=False, env="DEDUP_REDIS_ENABLED")
+
+    # Delta Forwarding Configuration
+    # Comma-separated wrapper_ids whose messages are forwarded with only the points that
+    # are new or changed since their previous message ("*" = every wrapper)
+    DELTA_FORWARDING_WRAPPERS: str = Field(default="", env="DELTA_FORWARDING_WRAPPERS")
+    DELTA_INDEX_TTL_SECONDS: int = Field(default=86400, env="DELTA_INDEX_TTL_SECONDS")
+
+    # Live Feed Configuration
+    # Ingesting processes publish each validated message for the /live stream when enabled
+    LIVE_FEED_ENABLED: bool = Field(default=False, env="LIVE_FEED_ENABLED")
+    LIVE_FEED_CHANNEL: str = Field(default="live_data", env="LIVE_FEED_CHANNEL")
+    LIVE_FEED_BUFFER_SIZE: int = Field(default=100, env="LIVE_FEED_BUFFER_SIZE")
+    LIVE_FEED_HEARTBEAT_SECONDS: float = Field(default=15.0, env="LIVE_FEED_HEARTBEAT_SECONDS")
+    # Single-message publishes waiting for Redis; further ones are dropped while this many are
+    LIVE_FEED_MAX_IN_FLIGHT: int = Field(default=100, env="LIVE_FEED_MAX_IN_FLIGHT")
+    # How long a count of the channel's subscribers is trusted; nothing is published while it is 0
+    LIVE_FEED_LISTENER_CHECK_SECONDS: float = Field(default=1.0, env="LIVE_FEED_LISTENER_CHECK_SECONDS")
+
+    # Wrapper Statistics Cache Configuration
+    WRAPPER_STATS_CACHE_SIZE: int = Field(default=10000, env="WRAPPER_STATS_CACHE_SIZE")
+    # Only X value types are cached, for coherence checks; statistics are read from Redis
+    WRAPPER_STATS_CACHE_TTL: float = Field(default=300.0, env="WRAPPER_STATS_CACHE_TTL")
+    WRAPPER_STATS_INVALIDATION_CHANNEL: str = Field(
+        default="wrapper_stats_invalidation", env="WRAPPER_STATS_INVALIDATION_CHANNEL"
+    )
+
+    # Wrapper History Configuration
+    HISTORY_ENABLED: bool = Field(default=False, env="HISTORY_ENABLED")
+    HISTORY_MAX_POINTS: int = Field(default=10000, env="HISTORY_MAX_POINTS")
+    # Age limits and downsampling apply to datetime X values only (0 = disabled)
+    HISTORY_MAX_AGE_SECONDS: int = Field(default=0, env="HISTORY_MAX_AGE_SECONDS")
+    HISTORY_DOWNSAMPLE_AFTER_SECONDS: int = Field(default=0, env="HISTORY_DOWNSAMPLE_AFTER_SECONDS")
+    HISTORY_DOWNSAMPLE_BUCKET_SECONDS: int = Field(default=60, env="HISTORY_DOWNSAMPLE_BUCKET_SECONDS")
+    HISTORY_DOWNSAMPLE_INTERVAL_SECONDS: int = Field(default=300, env="HISTORY_DOWNSAMPLE_INTERVAL_SECONDS")
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
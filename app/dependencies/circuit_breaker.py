@@ -0,0 +1,59 @@
+import logging
+import time
+from typing import Any, Dict
+
+from dependencies.metrics import CIRCUIT_BREAKER_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Stops calls to a degraded dependency for a while after repeated failures.
+
+    ``failure_threshold`` consecutive failures open the breaker; callers then skip
+    the dependency until ``reset_timeout`` seconds have passed, after which one trial
+    call is let through (half-open). Its success closes the breaker, its failure
+    opens it for another ``reset_timeout``.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = CLOSED
+        self._gauge = CIRCUIT_BREAKER_STATE.labels(name)
+        self._gauge.set(_STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning(f"Circuit breaker '{self.name}' {self.state} -> {state}")
+        self.state = state
+        self._gauge.set(_STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        """Tell whether a call may be made now, moving an expired open breaker to half-open."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._set_state(HALF_OPEN)
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import zlib
+from typing import Awaitable, Callable, List, Optional
+
+import aio_pika
+
+logger = logging.getLogger(__name__)
+
+MessageProcessor = Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]]
+BatchProcessor = Callable[[List[aio_pika.abc.AbstractIncomingMessage]], Awaitable[None]]
+ShardKey = Callable[[aio_pika.abc.AbstractIncomingMessage], Optional[str]]
+
+
+class ShardedDispatcher:
+    """Process consumed messages concurrently while keeping per-key ordering.
+
+    Messages sharing a shard key always land on the same worker, so they are
+    handled one at a time in delivery order. Messages without a key are spread
+    by delivery tag. At most ``max_in_flight`` messages are accepted but not yet
+    processed; ``submit`` waits for a free slot once the limit is reached.
+    """
+
+    def __init__(
+        self,
+        queue_name: str,
+        process: MessageProcessor,
+        shard_key: Optional[ShardKey],
+        shards: int,
+        max_in_flight: int,
+    ) -> None:
+        self.queue_name = queue_name
+        self._process = process
+        self._shard_key = shard_key
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(shards)]
+        self._workers: List[asyncio.Task] = []
+        self.in_flight = 0
+
+    def start(self) -> None:
+        for shard in self._queues:
+            self._workers.append(asyncio.create_task(self._work(shard)))
+        logger.info(f"Started {len(self._queues)} ordered workers for queue '{self.queue_name}'")
+
+    def _shard_for(self, message: aio_pika.abc.AbstractIncomingMessage) -> int:
+        key = self._shard_key(message) if self._shard_key else None
+        if key is None:
+            return (message.delivery_tag or 0) % len(self._queues)
+        return zlib.crc32(key.encode()) % len(self._queues)
+
+    async def submit(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        """Queue a message on its shard, waiting while the in-flight limit is reached."""
+        await self._slots.acquire()
+        self.in_flight += 1
+        self._queues[self._shard_for(message)].put_nowait(message)
+
+    async def _work(self, shard: asyncio.Queue) -> None:
+        while True:
+            message = await shard.get()
+            try:
+                await self._process(message)
+            except Exception as e:
+                logger.exception(f"Unhandled error processing message from queue '{self.queue_name}': {e}")
+            finally:
+                self.in_flight -= 1
+                self._slots.release()
+                shard.task_done()
+
+    async def drain(self, timeout: float) -> None:
+        """Wait for accepted messages to finish, then stop the workers."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(shard.join() for shard in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out draining {self.in_flight} in-flight messages from queue '{self.queue_name}'")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+
+class BatchDispatcher:
+    """Group consumed messages into batches handed to a single batch processor.
+
+    A batch is closed when it holds ``batch_size`` messages or ``linger`` seconds
+    after its first message arrived, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        queue_name: str,
+        process_batch: BatchProcessor,
+        batch_size: int,
+        linger: float,
+    ) -> None:
+        self.queue_name = queue_name
+        self._process_batch = process_batch
+        self._batch_size = batch_size
+        self._linger = linger
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self.in_flight = 0
+
+    def start(self) -> None:
+        self._worker = asyncio.create_task(self._work())
+        logger.info(
+            f"Started batch worker for queue '{self.queue_name}' "
+            f"(size={self._batch_size}, linger={self._linger * 1000:.0f}ms)"
+        )
+
+    async def submit(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        self.in_flight += 1
+        self._pending.put_nowait(message)
+
+    async def _collect(self) -> List[aio_pika.abc.AbstractIncomingMessage]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._pending.get()]
+        deadline = loop.time() + self._linger
+        while len(batch) < self._batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._pending.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _work(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                await self._process_batch(batch)
+            except Exception as e:
+                logger.exception(f"Unhandled error processing batch from queue '{self.queue_name}': {e}")
+            finally:
+                self.in_flight -= len(batch)
+                for _ in batch:
+                    self._pending.task_done()
+
+    async def drain(self, timeout: float) -> None:
+        """Wait for pending batches to finish, then stop the worker."""
+        try:
+            await asyncio.wait_for(self._pending.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out draining {self.in_flight} in-flight messages from queue '{self.queue_name}'")
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import aio_pika
+from aio_pika.exceptions import AMQPConnectionError, AMQPChannelError
+
+from config import settings
+from dependencies.metrics import FLOW_PAUSED, FLOW_PREFETCH
+
+logger = logging.getLogger(__name__)
+
+
+class _Window:
+    __slots__ = ("count", "errors", "seconds")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def observe(self, seconds: float, failed: bool) -> None:
+        self.count += 1
+        self.seconds += seconds
+        if failed:
+            self.errors += 1
+
+    @property
+    def mean(self) -> float:
+        return self.seconds / self.count if self.count else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.count if self.count else 0.0
+
+
+class FlowController:
+    """Adapts consumer prefetch to handler latency and pauses intake when publishing degrades.
+
+    Every ``interval`` seconds the handler observations of the last window drive an
+    additive-increase/multiplicative-decrease step on the prefetch: it grows by
+    ``step`` while handlers stay under ``target_latency`` and ``max_error_rate``,
+    and halves otherwise. Publishes to the watched queues can pause consumption
+    when their mean confirm latency exceeds ``pause_latency`` or their failure rate
+    exceeds ``max_error_rate``. A pause lasts at least ``pause_seconds`` and ends
+    only once publishes are back under ``resume_latency``, restarting from the
+    minimum prefetch, so the controller does not flap around a single threshold.
+    """
+
+    def __init__(
+        self,
+        watched_queues: Iterable[str],
+        initial_prefetch: int,
+        min_prefetch: int,
+        max_prefetch: int,
+        step: int,
+        target_latency: float,
+        max_error_rate: float,
+        pause_latency: float,
+        resume_latency: float,
+        pause_seconds: float,
+        interval: float,
+    ) -> None:
+        self.watched_queues = set(watched_queues)
+        self.min_prefetch = min_prefetch
+        self.max_prefetch = max_prefetch
+        self.prefetch = max(min_prefetch, min(initial_prefetch, max_prefetch))
+        self.step = step
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.pause_latency = pause_latency
+        self.resume_latency = resume_latency
+        self.pause_seconds = pause_seconds
+        self.interval = interval
+        self.paused = False
+        self.paused_at: Optional[float] = None
+        self.last_reason: Optional[str] = None
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._handlers = _Window()
+        self._publishes = _Window()
+        self._last_windows: Dict[str, Dict[str, float]] = {}
+        self._channels: Dict[str, Tuple[aio_pika.abc.AbstractChannel, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def observe_handler(self, seconds: float, failed: bool = False) -> None:
+        self._handlers.observe(seconds, failed)
+
+    def observe_publish(self, queue_name: str, seconds: float, failed: bool = False) -> None:
+        if queue_name in self.watched_queues:
+            self._publishes.observe(seconds, failed)
+
+    async def wait_until_resumed(self) -> None:
+        if not self.paused:
+            return
+        await self._resumed.wait()
+
+    def prefetch_for(self, floor: int = 0) -> int:
+        return max(self.prefetch, floor)
+
+    async def attach(self, queue_name: str, channel: aio_pika.abc.AbstractChannel, floor: int = 0) -> None:
+        """Apply the current prefetch to a consuming channel and follow it from now on.
+
+        ``floor`` keeps the prefetch at least that high, e.g. a batch consumer's batch size.
+        """
+        self._channels[queue_name] = (channel, floor)
+        await self._apply_qos(queue_name, channel, floor)
+
+    def detach(self, queue_name: str) -> None:
+        self._channels.pop(queue_name, None)
+
+    async def _apply_qos(self, queue_name: str, channel: aio_pika.abc.AbstractChannel, floor: int) -> None:
+        # A channel-wide limit is re-evaluated by the broker for running consumers, a
+        # per-consumer one only applies to consumers started afterwards
+        try:
+            await channel.set_qos(prefetch_count=self.prefetch_for(floor), global_=True)
+        except (AMQPConnectionError, AMQPChannelError) as e:
+            logger.warning(f"Could not update prefetch for queue '{queue_name}': {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._resume("stopped")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            previous = self.prefetch
+            self.adjust(time.monotonic())
+            FLOW_PREFETCH.set(self.prefetch)
+            FLOW_PAUSED.set(int(self.paused))
+            if self.prefetch != previous:
+                for queue_name, (channel, floor) in list(self._channels.items()):
+                    if not channel.is_closed:
+                        await self._apply_qos(queue_name, channel, floor)
+
+    def adjust(self, now: float) -> None:
+        """Close the current observation window and update prefetch and pause state."""
+        handlers, publishes = self._handlers, self._publishes
+        self._handlers, self._publishes = _Window(), _Window()
+        self._last_windows = {
+            "handler": {"count": handlers.count, "mean_seconds": handlers.mean, "error_rate": handlers.error_rate},
+            "publish": {"count": publishes.count, "mean_seconds": publishes.mean, "error_rate": publishes.error_rate},
+        }
+
+        if self.paused:
+            healthy = publishes.count == 0 or (
+                publishes.errors == 0 and publishes.mean < self.resume_latency
+            )
+            if healthy and now - self.paused_at >= self.pause_seconds:
+                self.prefetch = self.min_prefetch
+                self._resume("publishes recovered")
+            return
+
+        if publishes.count and publishes.error_rate > self.max_error_rate:
+            self._pause(now, f"publish error rate {publishes.error_rate:.0%}")
+            return
+        if publishes.count and publishes.mean > self.pause_latency:
+            self._pause(now, f"publish latency {publishes.mean:.3f}s")
+            return
+
+        if not handlers.count:
+            return
+        if handlers.error_rate > self.max_error_rate or handlers.mean > self.target_latency:
+            self.prefetch = max(self.min_prefetch, self.prefetch // 2)
+        else:
+            self.prefetch = min(self.max_prefetch, self.prefetch + self.step)
+
+    def _pause(self, now: float, reason: str) -> None:
+        self.paused = True
+        self.paused_at = now
+        self.last_reason = reason
+        self.prefetch = self.min_prefetch
+        self._resumed.clear()
+        logger.warning(f"Pausing consumption: {reason}")
+
+    def _resume(self, reason: str) -> None:
+        if self.paused:
+            logger.info(f"Resuming consumption: {reason}")
+            self.last_reason = reason
+        self.paused = False
+        self.paused_at = None
+        self._resumed.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "prefetch": self.prefetch,
+            "min_prefetch": self.min_prefetch,
+            "max_prefetch": self.max_prefetch,
+            "paused": self.paused,
+            "last_reason": self.last_reason,
+            "watched_queues": sorted(self.watched_queues),
+            "queues": {queue_name: self.prefetch_for(floor) for queue_name, (_, floor) in self._channels.items()},
+            "last_window": self._last_windows,
+        }
+
+
+flow_controller: Optional[FlowController] = None
+if settings.FLOW_CONTROL_ENABLED:
+    flow_controller = FlowController(
+        watched_queues=[settings.COLLECTED_DATA_QUEUE],
+        initial_prefetch=settings.CONSUMER_PREFETCH_COUNT,
+        min_prefetch=settings.FLOW_MIN_PREFETCH,
+        max_prefetch=settings.FLOW_MAX_PREFETCH,
+        step=settings.FLOW_PREFETCH_STEP,
+        target_latency=settings.FLOW_TARGET_LATENCY,
+        max_error_rate=settings.FLOW_MAX_ERROR_RATE,
+        pause_latency=settings.FLOW_PAUSE_PUBLISH_LATENCY,
+        resume_latency=settings.FLOW_RESUME_PUBLISH_LATENCY,
+        pause_seconds=settings.FLOW_PAUSE_SECONDS,
+        interval=settings.FLOW_ADJUST_INTERVAL,
+    )
@@ -0,0 +1,130 @@
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client import generate_latest, multiprocess
+
+# Upper bounds in seconds, from sub-millisecond pydantic work up to slow broker confirms
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Content type of ``render``, the Prometheus text exposition format
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+def collecting_registry() -> CollectorRegistry:
+    """Return the registry to expose: this process's metrics, or those of every process.
+
+    With ``PROMETHEUS_MULTIPROC_DIR`` set, each process writes its values to files in
+    that directory and the metrics of all of them are merged on every scrape. Gauges
+    say in their ``multiprocess_mode`` how they are merged.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render() -> bytes:
+    return generate_latest(collecting_registry())
+
+
+INGEST_STAGE_SECONDS = Histogram(
+    "data_collector_ingest_stage_seconds",
+    "Time spent in each stage of handling a single data message",
+    ("stage",),
+    buckets=DEFAULT_BUCKETS,
+)
+INGEST_BATCH_STAGE_SECONDS = Histogram(
+    "data_collector_ingest_batch_stage_seconds",
+    "Time spent in each stage of handling a batch of data messages",
+    ("stage",),
+    buckets=DEFAULT_BUCKETS,
+)
+# Counters are named without _total: the client appends it and adds a _created sample
+MESSAGES_SETTLED = Counter(
+    "data_collector_messages_settled",
+    "Consumed messages by settlement outcome (ack, reject, nack, retry, dead_letter)",
+    ("queue", "outcome"),
+)
+VALIDATION_ERRORS = Counter(
+    "data_collector_validation_errors",
+    "Messages rejected by validation, by error type",
+    ("error_type",),
+)
+SCHEMA_ANOMALIES = Counter(
+    "data_collector_schema_anomalies",
+    "Accepted messages flagged for departing from their wrapper's learned profile, by anomaly",
+    ("anomaly",),
+)
+VALIDATION_ERRORS_SUPPRESSED = Counter(
+    "data_collector_validation_errors_suppressed",
+    "Validation errors only counted in summaries because their wrapper hit its per-window limit",
+    ("error_type",),
+)
+DUPLICATES_SKIPPED = Counter(
+    "data_collector_duplicates_skipped",
+    "Messages acked without processing because the same body was recently ingested",
+)
+DELTA_POINTS_SUPPRESSED = Counter(
+    "data_collector_delta_points_suppressed",
+    "Data points not forwarded because the wrapper sent them unchanged in its previous message",
+)
+DELTA_MESSAGES_SUPPRESSED = Counter(
+    "data_collector_delta_messages_suppressed",
+    "Validated messages not forwarded because none of their points were new",
+)
+CACHE_WRITES_COALESCED = Counter(
+    "data_collector_cache_writes_coalesced",
+    "Buffered cache entries replaced by a later write of the same entry before being flushed",
+)
+CACHE_WRITES_DROPPED = Counter(
+    "data_collector_cache_writes_dropped",
+    "Buffered cache entries discarded, oldest first, because the write-behind buffer was full",
+)
+CACHE_WRITE_FLUSHES = Counter(
+    "data_collector_cache_write_flushes",
+    "Write-behind buffer flushes by outcome (ok, failed, skipped)",
+    ("outcome",),
+)
+LIVE_FEED_SKIPPED = Counter(
+    "data_collector_live_feed_skipped",
+    "Live feed publishes not made, because no process was subscribed or too many were in flight",
+    ("reason",),
+)
+MESSAGES_IN_FLIGHT = Gauge(
+    "data_collector_messages_in_flight",
+    "Messages received from a queue and not yet handled",
+    ("queue",),
+    multiprocess_mode="livesum",
+)
+QUEUE_DEPTH = Gauge(
+    "data_collector_queue_depth",
+    "Ready messages in each consumed queue, sampled when metrics are scraped",
+    ("queue",),
+    multiprocess_mode="livemostrecent",
+)
+FLOW_PREFETCH = Gauge(
+    "data_collector_flow_prefetch",
+    "Prefetch currently chosen by adaptive flow control",
+    multiprocess_mode="liveall",
+)
+FLOW_PAUSED = Gauge(
+    "data_collector_flow_paused",
+    "1 while adaptive flow control has paused consumption",
+    multiprocess_mode="livemax",
+)
+CACHE_WRITE_BUFFER_ENTRIES = Gauge(
+    "data_collector_cache_write_buffer_entries",
+    "Cache entries (a wrapper's keys or the last-message keys) waiting in the write-behind buffer",
+    multiprocess_mode="livesum",
+)
+STATS_NOT_RECORDED = Counter(
+    "data_collector_stats_not_recorded",
+    "Messages accepted on the in-process X value type alone while Redis writes were failing",
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "data_collector_circuit_breaker_state",
+    "State of each circuit breaker (0 closed, 1 half-open, 2 open)",
+    ("breaker",),
+    multiprocess_mode="liveall",
+)
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import aio_pika
+
+logger = logging.getLogger(__name__)
+
+# Called with the queue name, the seconds an attempt took and whether it failed
+PublishObserver = Callable[[str, float, bool], None]
+
+
+class Publisher:
+    """Publishes persistent messages to durable queues over one confirm-mode channel.
+
+    Queues are declared once per connection instead of on every publish, and
+    publishes are not serialized: up to ``max_in_flight`` messages may be waiting
+    for their broker confirms at the same time. The messages of one call are
+    sent, and resent after a failure, in order.
+    """
+
+    def __init__(
+        self, max_in_flight: int, retry_backoff: float, observer: Optional[PublishObserver] = None
+    ) -> None:
+        self._connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self._channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self._channel_lock = asyncio.Lock()
+        self._declared: Set[str] = set()
+        self._declare_lock = asyncio.Lock()
+        self._arguments: Dict[str, Dict[str, Any]] = {}
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._retry_backoff = retry_backoff
+        self._pending: Set[asyncio.Task] = set()
+        self._observer = observer
+
+    def bind(self, connection: aio_pika.abc.AbstractRobustConnection) -> None:
+        self._connection = connection
+        self._channel = None
+        self._declared.clear()
+        connection.reconnect_callbacks.add(self._on_reconnect)
+
+    def _on_reconnect(self, *args: Any) -> None:
+        self._declared.clear()
+
+    async def _get_channel(self) -> aio_pika.abc.AbstractChannel:
+        if self._connection is None:
+            raise RuntimeError("Publisher not bound to a connection. Please use .connect() before publishing")
+        if self._channel is None or self._channel.is_closed:
+            async with self._channel_lock:
+                if self._channel is None or self._channel.is_closed:
+                    self._channel = await self._connection.channel(publisher_confirms=True)
+                    self._declared.clear()
+        return self._channel
+
+    def set_queue_arguments(self, queue_name: str, arguments: Dict[str, Any]) -> None:
+        """Declare ``queue_name`` with these x-arguments whenever it is published to."""
+        self._arguments[queue_name] = arguments
+
+    async def _ensure_queue(self, channel: aio_pika.abc.AbstractChannel, queue_name: str) -> None:
+        if queue_name in self._declared:
+            return
+        # Concurrent first publishes declare the queue once
+        async with self._declare_lock:
+            if queue_name not in self._declared:
+                await channel.declare_queue(queue_name, durable=True, arguments=self._arguments.get(queue_name))
+                self._declared.add(queue_name)
+
+    async def queue_depth(self, queue_name: str) -> Optional[int]:
+        """Return the number of ready messages in a queue, or None when it does not exist.
+
+        The passive declare runs on a channel of its own: declaring a missing queue
+        closes the channel, which must not be the one publishes are waiting on.
+        """
+        if self._connection is None:
+            raise RuntimeError("Publisher not bound to a connection. Please use .connect() before publishing")
+        async with await self._connection.channel(publisher_confirms=False) as channel:
+            try:
+                queue = await channel.declare_queue(queue_name, passive=True)
+            except aio_pika.exceptions.ChannelClosed:
+                return None
+            return queue.declaration_result.message_count
+
+    async def publish(
+        self,
+        queue_name: str,
+        message: str | bytes,
+        headers: Optional[Dict[str, Any]] = None,
+        retries: int = 3,
+    ) -> None:
+        """Publish one message and wait until the broker confirms it.
+
+        Failed attempts are retried on a fresh channel with exponential backoff.
+        """
+        await self._publish_in_order(queue_name, [message], headers, retries)
+
+    async def publish_many(self, queue_name: str, messages: Iterable[str | bytes], retries: int = 3) -> None:
+        """Publish several messages in order with their confirms outstanding at once."""
+        await self._publish_in_order(queue_name, list(messages), None, retries)
+
+    async def _send(
+        self, channel: aio_pika.abc.AbstractChannel, queue_name: str, body: bytes, headers: Optional[Dict[str, Any]]
+    ) -> None:
+        try:
+            msg = aio_pika.Message(body=body, headers=headers, delivery_mode=aio_pika.DeliveryMode.PERSISTENT)
+            await channel.default_exchange.publish(msg, routing_key=queue_name)
+        finally:
+            self._slots.release()
+
+    async def _publish_in_order(
+        self, queue_name: str, messages: List[str | bytes], headers: Optional[Dict[str, Any]], retries: int
+    ) -> None:
+        """Send messages in order, then wait for all their confirms.
+
+        The channel writes publishes in the order they are started. When a message
+        is not confirmed, it and every message after it are sent again in order
+        after a backoff, so no message overtakes an earlier one that failed.
+        """
+        bodies = [message.encode() if isinstance(message, str) else message for message in messages]
+        confirmed = 0
+        for attempt in range(1, retries + 1):
+            started = time.perf_counter()
+            sends: List[asyncio.Future] = []
+            try:
+                channel = await self._get_channel()
+                await self._ensure_queue(channel, queue_name)
+                for body in bodies[confirmed:]:
+                    await self._slots.acquire()
+                    sends.append(asyncio.ensure_future(self._send(channel, queue_name, body, headers)))
+            except (aio_pika.exceptions.AMQPError, ConnectionError) as e:
+                sends.append(asyncio.get_running_loop().create_future())
+                sends[-1].set_exception(e)
+
+            results = await asyncio.gather(*sends, return_exceptions=True)
+            elapsed = time.perf_counter() - started
+            failed_at = None
+            for index, result in enumerate(results):
+                if isinstance(result, (aio_pika.exceptions.AMQPError, ConnectionError)):
+                    failed_at = index
+                    break
+                if isinstance(result, BaseException):
+                    raise result
+            if self._observer:
+                for index in range(len(results)):
+                    self._observer(queue_name, elapsed, failed_at is not None and index >= failed_at)
+            if failed_at is None:
+                logger.debug(f"Published {len(bodies)} messages to '{queue_name}'")
+                return
+
+            confirmed += failed_at
+            logger.warning(
+                f"Publish attempt {attempt} to '{queue_name}' failed: {results[failed_at]}; "
+                f"resending {len(bodies) - confirmed} messages"
+            )
+            self._declared.discard(queue_name)
+            if attempt < retries:
+                await asyncio.sleep(self._retry_backoff * 2 ** (attempt - 1))
+        raise RuntimeError(f"Failed to publish to '{queue_name}' after {retries} attempts.")
+
+    def publish_nowait(self, queue_name: str, messages: Iterable[str | bytes]) -> asyncio.Task:
+        """Schedule a batch publish without waiting for it; failures are logged.
+
+        The returned task can still be awaited, and ``flush`` waits for all of them.
+        """
+        task = asyncio.create_task(self.publish_many(queue_name, messages))
+        self._pending.add(task)
+        task.add_done_callback(self._on_background_done)
+        return task
+
+    def _on_background_done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Background publish failed: {task.exception()}")
+
+    async def flush(self) -> None:
+        """Wait for background publishes scheduled with ``publish_nowait``."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
@@ -1,21 +1,45 @@
 import asyncio
+import functools
 import json
 import aio_pika
 from aio_pika.exceptions import AMQPConnectionError, AMQPChannelError
 import logging
-from typing import Callable, Awaitable, Dict, List, Optional
+import time
+from typing import Any, Callable, Awaitable, Dict, Iterable, List, Optional, Tuple
 from config import settings
+from dependencies.flow_control import FlowController, flow_controller
+from dependencies.dispatchers import BatchDispatcher, ShardedDispatcher, ShardKey
+from dependencies.metrics import MESSAGES_IN_FLIGHT, MESSAGES_SETTLED, QUEUE_DEPTH
+from dependencies.publisher import Publisher
+from dependencies.retry import RetryScheduler, dead_letter_queue
 
 logger = logging.getLogger(__name__)
 
 class RabbitMQClient:
-    def __init__(self, url: str, pool_size: int = 5):
+    def __init__(self, url: str, pool_size: int = 5, flow: Optional[FlowController] = None):
         self.url = url
         self.pool_size = pool_size
         self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
         self.channel_pool: Optional[asyncio.Queue[aio_pika.abc.AbstractChannel]] = None
         self.consumers: Dict[str, Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]]] = {}
         self.consumer_tasks: List[asyncio.Task] = []
+        self.shard_keys: Dict[str, Optional[ShardKey]] = {}
+        self.batch_consumers: Dict[str, Tuple[int, float]] = {}
+        self.dispatchers: Dict[str, ShardedDispatcher | BatchDispatcher] = {}
+        self.flow = flow
+        self.publisher = Publisher(
+            max_in_flight=settings.PUBLISH_MAX_IN_FLIGHT,
+            retry_backoff=settings.PUBLISH_RETRY_BACKOFF,
+            observer=flow.observe_publish if flow else None,
+        )
+        self.retries: Optional[RetryScheduler] = None
+        if settings.RETRY_ENABLED:
+            self.retries = RetryScheduler(
+                self.publisher,
+                max_attempts=settings.RETRY_MAX_ATTEMPTS,
+                base_delay_ms=settings.RETRY_BASE_DELAY_MS,
+                max_delay_ms=settings.RETRY_MAX_DELAY_MS,
+            )
 
     async def connect(self):
         self.connection = await aio_pika.connect_robust(self.url)
@@ -23,25 +47,116 @@ class RabbitMQClient:
 
         for _ in range(self.pool_size):
             channel = await self.connection.channel()
-            await channel.set_qos(prefetch_count=10)
+            await channel.set_qos(prefetch_count=self._consumer_prefetch())
             await self.channel_pool.put(channel)
+        self.publisher.bind(self.connection)
+        if self.retries:
+            self.retries.bind(self.connection)
         logger.info("Connected and initialized channel pool")
 
+    def _consumer_prefetch(self) -> int:
+        # With flow control the adaptive limit is channel-wide, so the per-consumer one is lifted
+        return 0 if self.flow else settings.CONSUMER_PREFETCH_COUNT
+
     async def close(self):
+        # Stop intake first, then let already accepted messages finish on open channels
+        if self.flow and self.consumers:
+            await self.flow.stop()
         for task in self.consumer_tasks:
             task.cancel()
             try:
                 await task
             except asyncio.CancelledError:
                 pass
+        for dispatcher in self.dispatchers.values():
+            await dispatcher.drain(settings.CONSUMER_DRAIN_TIMEOUT)
+        await self.publisher.flush()
         if self.connection:
             await self.connection.close()
             logger.info("Connection closed")
 
-    def register_consumer(self, queue_name: str, handler: Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]]):
+    def register_consumer(
+        self,
+        queue_name: str,
+        handler: Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]],
+        shard_key: Optional[ShardKey] = None,
+    ):
+        if queue_name in self.consumers:
+            raise ValueError(f"Consumer for queue '{queue_name}' already registered.")
+        self.consumers[queue_name] = handler
+        self.shard_keys[queue_name] = shard_key
+
+    def register_batch_consumer(
+        self,
+        queue_name: str,
+        handler: Callable[[List[aio_pika.abc.AbstractIncomingMessage]], Awaitable[None]],
+        batch_size: int,
+        linger_ms: int,
+    ):
         if queue_name in self.consumers:
             raise ValueError(f"Consumer for queue '{queue_name}' already registered.")
         self.consumers[queue_name] = handler
+        self.batch_consumers[queue_name] = (batch_size, linger_ms / 1000)
+
+    async def _handle_message(
+        self,
+        queue_name: str,
+        handler: Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]],
+        message: aio_pika.abc.AbstractIncomingMessage,
+    ):
+        started = time.perf_counter()
+        failed = True
+        try:
+            await handler(message)
+            failed = False
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"Invalid message format in queue '{queue_name}': {e}")
+            await message.reject(requeue=False)
+            MESSAGES_SETTLED.labels(queue_name, "reject").inc()
+        except (AMQPConnectionError, AMQPChannelError) as e:
+            logger.error(f"RabbitMQ connection error in queue '{queue_name}': {e}")
+            await self.retry_later(queue_name, [message], f"{type(e).__name__}: {e}")
+        except Exception as e:
+            logger.exception(f"Unexpected error handling a message from queue '{queue_name}'")
+            await self.retry_later(queue_name, [message], f"{type(e).__name__}: {e}")
+        finally:
+            MESSAGES_IN_FLIGHT.labels(queue_name).dec()
+            if self.flow:
+                self.flow.observe_handler(time.perf_counter() - started, failed)
+
+    async def _handle_batch(
+        self,
+        queue_name: str,
+        handler: Callable[[List[aio_pika.abc.AbstractIncomingMessage]], Awaitable[None]],
+        messages: List[aio_pika.abc.AbstractIncomingMessage],
+    ):
+        started = time.perf_counter()
+        failed = True
+        try:
+            await handler(messages)
+            failed = False
+        except (AMQPConnectionError, AMQPChannelError) as e:
+            logger.error(f"RabbitMQ connection error in queue '{queue_name}': {e}")
+            await self.retry_later(queue_name, messages, f"{type(e).__name__}: {e}")
+        except Exception as e:
+            logger.exception(f"Unexpected error handling a batch from queue '{queue_name}'")
+            await self.retry_later(queue_name, messages, f"{type(e).__name__}: {e}")
+        finally:
+            MESSAGES_IN_FLIGHT.labels(queue_name).dec(len(messages))
+            if self.flow:
+                self.flow.observe_handler(time.perf_counter() - started, failed)
+
+    async def retry_later(
+        self, queue_name: str, messages: List[aio_pika.abc.AbstractIncomingMessage], reason: str
+    ):
+        """Settle failed messages for a delayed redelivery, or requeue them at once when retries are disabled"""
+        if self.retries:
+            await self.retries.schedule(queue_name, messages, reason)
+            return
+        unsettled = [message for message in messages if not message.processed]
+        for message in unsettled:
+            await message.nack(requeue=True)
+        MESSAGES_SETTLED.labels(queue_name, "nack").inc(len(unsettled))
 
     async def _consume(self, queue_name: str, handler: Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]]):
         if self.channel_pool is None:
@@ -50,18 +165,25 @@ class RabbitMQClient:
         while True:
             channel = await self.channel_pool.get()
             try:
+                # Let the broker deliver enough messages to fill a batch
+                batch_size = self.batch_consumers[queue_name][0] if queue_name in self.batch_consumers else 0
+                if self.flow:
+                    await self.flow.attach(queue_name, channel, floor=batch_size)
+                elif batch_size:
+                    await channel.set_qos(prefetch_count=max(settings.CONSUMER_PREFETCH_COUNT, batch_size))
                 queue = await channel.declare_queue(queue_name, durable=True)
                 logger.info(f"Starting consumer for '{queue_name}'")
+                dispatcher = self.dispatchers.get(queue_name)
+                in_flight = MESSAGES_IN_FLIGHT.labels(queue_name)
                 async with queue.iterator() as queue_iter:
                     async for message in queue_iter:
-                        try:
-                            await handler(message)
-                        except (json.JSONDecodeError, ValueError) as e:
-                            logger.error(f"Invalid message format in queue '{queue_name}': {e}")
-                            await message.reject(requeue=False)
-                        except (AMQPConnectionError, AMQPChannelError) as e:
-                            logger.error(f"RabbitMQ connection error in queue '{queue_name}': {e}")
-                            await message.nack(requeue=True)
+                        if self.flow:
+                            await self.flow.wait_until_resumed()
+                        in_flight.inc()
+                        if dispatcher:
+                            await dispatcher.submit(message)
+                        else:
+                            await self._handle_message(queue_name, handler, message)
             except (AMQPConnectionError, AMQPChannelError) as e:
                 logger.error(f"Consumer for queue '{queue_name}' failed: {e}. Retrying in 5 seconds...")
                 await asyncio.sleep(5)
@@ -69,13 +191,15 @@ class RabbitMQClient:
                 logger.error(f"Configuration error in consumer for queue '{queue_name}': {e}. Retrying in 5 seconds...")
                 await asyncio.sleep(5)
             finally:
+                if self.flow:
+                    self.flow.detach(queue_name)
                 if not channel.is_closed:
                     await self.channel_pool.put(channel)
                 else:
                     # Replace closed channel
                     try:
                         new_channel = await self.connection.channel()
-                        await new_channel.set_qos(prefetch_count=10)
+                        await new_channel.set_qos(prefetch_count=self._consumer_prefetch())
                         await self.channel_pool.put(new_channel)
                         logger.info("Replaced closed channel in pool")
                     except (AMQPConnectionError, AMQPChannelError) as ex:
@@ -85,7 +209,29 @@ class RabbitMQClient:
 
     async def start_consumers(self):
         logger.info(f"Starting {len(self.consumers)} consumers: {list(self.consumers.keys())}")
+        if self.flow and self.consumers:
+            self.flow.start()
         for queue_name, handler in self.consumers.items():
+            if queue_name in self.batch_consumers and queue_name not in self.dispatchers:
+                batch_size, linger = self.batch_consumers[queue_name]
+                dispatcher = BatchDispatcher(
+                    queue_name,
+                    functools.partial(self._handle_batch, queue_name, handler),
+                    batch_size=batch_size,
+                    linger=linger,
+                )
+                dispatcher.start()
+                self.dispatchers[queue_name] = dispatcher
+            elif settings.CONSUMER_CONCURRENCY > 1 and queue_name not in self.dispatchers:
+                dispatcher = ShardedDispatcher(
+                    queue_name,
+                    functools.partial(self._handle_message, queue_name, handler),
+                    self.shard_keys.get(queue_name),
+                    shards=settings.CONSUMER_CONCURRENCY,
+                    max_in_flight=settings.CONSUMER_MAX_IN_FLIGHT,
+                )
+                dispatcher.start()
+                self.dispatchers[queue_name] = dispatcher
             try:
                 task = asyncio.create_task(self._consume(queue_name, handler))
                 self.consumer_tasks.append(task)
@@ -94,44 +240,75 @@ class RabbitMQClient:
                 logger.error(f"Failed to create consumer task for queue '{queue_name}': {e}")
                 raise
 
-    async def publish(self, queue_name: str, message: str | bytes, retries: int = 3):
-        """Safe publishing method with connection retries"""
-        if self.channel_pool is None:
-            raise RuntimeError("Channel pool not initialized. Please use .connect() before publishing")
-        attempt = 0
-        channel = await self.channel_pool.get()
-        while attempt < retries:
+    async def queue_depths(self) -> Dict[str, int]:
+        """Sample the ready message count of every consumed queue into the queue depth gauge"""
+        depths = {}
+        if self.connection is None:
+            return depths
+        for queue_name in self.consumers:
             try:
-                await channel.declare_queue(queue_name, durable=True)  # idempotent
-
-                body = message.encode() if isinstance(message, str) else message
-                msg = aio_pika.Message(body=body, delivery_mode=aio_pika.DeliveryMode.PERSISTENT)
-                await channel.default_exchange.publish(msg, routing_key=queue_name)
-                logger.info(f"Published message to '{queue_name}'")
-                await self.channel_pool.put(channel)
-                return
-            except (aio_pika.exceptions.AMQPError, ConnectionError) as e:
-                logger.warning(f"Publish attempt {attempt+1} failed: {e}")
-                if 'channel' in locals():
-                    await self.channel_pool.put(channel)
-                attempt += 1
-                await asyncio.sleep(2)
-        raise RuntimeError(f"Failed to publish to '{queue_name}' after {retries} attempts.")
+                depth = await self.publisher.queue_depth(queue_name)
+            except (AMQPConnectionError, AMQPChannelError) as e:
+                logger.warning(f"Could not read depth of queue '{queue_name}': {e}")
+                continue
+            if depth is not None:
+                QUEUE_DEPTH.labels(queue_name).set(depth)
+                depths[queue_name] = depth
+        return depths
+
+    async def dead_letter_depths(self) -> Dict[str, int]:
+        """Return the number of quarantined messages of every consumed queue"""
+        depths = {}
+        if self.connection is None or self.retries is None:
+            return depths
+        for queue_name in self.consumers:
+            try:
+                depth = await self.publisher.queue_depth(dead_letter_queue(queue_name))
+            except (AMQPConnectionError, AMQPChannelError) as e:
+                logger.warning(f"Could not read depth of queue '{dead_letter_queue(queue_name)}': {e}")
+                continue
+            depths[queue_name] = depth or 0
+        return depths
+
+    async def publish(
+        self,
+        queue_name: str,
+        message: str | bytes,
+        retries: int = 3,
+        headers: Optional[Dict[str, Any]] = None,
+    ):
+        """Safe publishing method with connection retries, waiting for the broker confirm"""
+        await self.publisher.publish(queue_name, message, headers=headers, retries=retries)
 
+    async def publish_many(self, queue_name: str, messages: Iterable[str | bytes]):
+        """Publish several messages with their confirms pipelined"""
+        await self.publisher.publish_many(queue_name, messages)
 
-def data_consumer(queue_name: str):
+    def publish_nowait(self, queue_name: str, messages: Iterable[str | bytes]) -> asyncio.Task:
+        """Fire-and-forget batched publish, flushed on close"""
+        return self.publisher.publish_nowait(queue_name, messages)
+
+
+def data_consumer(queue_name: str, shard_key: Optional[ShardKey] = None):
     def decorator(func: Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]]):
-        data_mq_client.register_consumer(queue_name, func)
+        data_mq_client.register_consumer(queue_name, func, shard_key)
         logger.info(f"Data consumer '{func.__name__}' registered for queue '{queue_name}'")
         return func
     return decorator
 
-def services_consumer(queue_name: str):
+def data_batch_consumer(queue_name: str, batch_size: int, linger_ms: int):
+    def decorator(func: Callable[[List[aio_pika.abc.AbstractIncomingMessage]], Awaitable[None]]):
+        data_mq_client.register_batch_consumer(queue_name, func, batch_size, linger_ms)
+        logger.info(f"Data batch consumer '{func.__name__}' registered for queue '{queue_name}'")
+        return func
+    return decorator
+
+def services_consumer(queue_name: str, shard_key: Optional[ShardKey] = None):
     def decorator(func: Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]]):
-        services_mq_client.register_consumer(queue_name, func)
+        services_mq_client.register_consumer(queue_name, func, shard_key)
         logger.info(f"Services consumer '{func.__name__}' registered for queue '{queue_name}'")
         return func
     return decorator
 
-data_mq_client = RabbitMQClient(url=settings.DATA_RABBITMQ_URL)
-services_mq_client = RabbitMQClient(url=settings.SERVICES_RABBITMQ_URL)
+data_mq_client = RabbitMQClient(url=settings.DATA_RABBITMQ_URL, flow=flow_controller)
+services_mq_client = RabbitMQClient(url=settings.SERVICES_RABBITMQ_URL, flow=flow_controller)
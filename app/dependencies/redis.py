@@ -3,4 +3,7 @@ from config import settings
 
 redis_client = Redis.from_url(
     settings.REDIS_URL, encoding="utf-8", decode_responses=True
-) 
\ No newline at end of file
+)
+
+# Binary-safe client for values that may be stored compressed
+redis_binary_client = Redis.from_url(settings.REDIS_URL)
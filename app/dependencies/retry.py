@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import aio_pika
+
+from dependencies.metrics import MESSAGES_SETTLED
+from dependencies.publisher import Publisher
+
+logger = logging.getLogger(__name__)
+
+# Failed delivery attempts so far, set on every copy the scheduler publishes
+RETRY_COUNT_HEADER = "x-retry-count"
+FAILURE_REASON_HEADER = "x-failure-reason"
+FAILED_AT_HEADER = "x-failed-at"
+ORIGINAL_QUEUE_HEADER = "x-original-queue"
+_SCHEDULER_HEADERS = (RETRY_COUNT_HEADER, FAILURE_REASON_HEADER, FAILED_AT_HEADER, ORIGINAL_QUEUE_HEADER)
+# Appended by the broker on every dead-lettering; not carried over to our copies
+_BROKER_HEADERS = ("x-death", "x-first-death-exchange", "x-first-death-queue", "x-first-death-reason")
+
+DEAD_LETTER_SUFFIX = ".dead"
+
+
+def retry_count(message: aio_pika.abc.AbstractMessage) -> int:
+    try:
+        return int((message.headers or {}).get(RETRY_COUNT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_redelivery(message: aio_pika.abc.AbstractIncomingMessage) -> bool:
+    """Tell whether an earlier delivery of the message may have been partly processed."""
+    return message.redelivered or RETRY_COUNT_HEADER in (message.headers or {})
+
+
+def dead_letter_queue(queue_name: str) -> str:
+    return f"{queue_name}{DEAD_LETTER_SUFFIX}"
+
+
+def _copy_headers(message: aio_pika.abc.AbstractMessage, drop: tuple) -> Dict[str, Any]:
+    return {key: value for key, value in (message.headers or {}).items() if key not in drop}
+
+
+class RetryScheduler:
+    """Delays failed messages on TTL'd retry queues and quarantines them after ``max_attempts``.
+
+    A failed message is republished, with its attempt count in ``x-retry-count``, to
+    ``<queue>.retry.<delay ms>``: a queue without consumers whose message TTL is the
+    backoff delay and whose expired messages the broker dead-letters back to
+    ``<queue>`` through the default exchange. The delay doubles with every attempt up
+    to ``max_delay_ms``; every delay has its own queue, so messages expire in order.
+    A message that failed ``max_attempts`` times goes to ``<queue>.dead`` instead,
+    with the last failure reason, until it is replayed.
+
+    The original delivery is acked only once its copy is confirmed, so a failure in
+    between duplicates the message rather than losing it.
+    """
+
+    def __init__(self, publisher: Publisher, max_attempts: int, base_delay_ms: int, max_delay_ms: int) -> None:
+        self._publisher = publisher
+        self._max_attempts = max_attempts
+        self._base_delay_ms = base_delay_ms
+        self._max_delay_ms = max_delay_ms
+        self._connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+
+    def bind(self, connection: aio_pika.abc.AbstractRobustConnection) -> None:
+        self._connection = connection
+
+    def delay_ms(self, attempt: int) -> int:
+        return min(self._base_delay_ms * 2 ** (attempt - 1), self._max_delay_ms)
+
+    def _retry_queue(self, queue_name: str, delay_ms: int) -> str:
+        retry_queue = f"{queue_name}.retry.{delay_ms}"
+        self._publisher.set_queue_arguments(retry_queue, {
+            "x-message-ttl": delay_ms,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": queue_name,
+        })
+        return retry_queue
+
+    async def _reschedule(self, queue_name: str, message: aio_pika.abc.AbstractIncomingMessage, reason: str) -> str:
+        """Publish a delayed or quarantined copy of the message and return the settlement outcome."""
+        attempt = retry_count(message) + 1
+        headers = _copy_headers(message, _BROKER_HEADERS)
+        headers.update({
+            RETRY_COUNT_HEADER: attempt,
+            FAILURE_REASON_HEADER: reason[:1024],
+            FAILED_AT_HEADER: datetime.now(timezone.utc).isoformat(),
+            ORIGINAL_QUEUE_HEADER: queue_name,
+        })
+        if attempt >= self._max_attempts:
+            await self._publisher.publish(dead_letter_queue(queue_name), message.body, headers=headers)
+            logger.error(f"Message quarantined in '{dead_letter_queue(queue_name)}' after {attempt} attempts: {reason}")
+            return "dead_letter"
+        delay_ms = self.delay_ms(attempt)
+        await self._publisher.publish(self._retry_queue(queue_name, delay_ms), message.body, headers=headers)
+        logger.warning(f"Message from '{queue_name}' retried in {delay_ms} ms (attempt {attempt}): {reason}")
+        return "retry"
+
+    async def schedule(self, queue_name: str, messages: List[aio_pika.abc.AbstractIncomingMessage], reason: str) -> None:
+        """Retry the unsettled messages later, or quarantine them; requeue those that could not be copied."""
+        messages = [message for message in messages if not message.processed]
+        outcomes = await asyncio.gather(
+            *(self._reschedule(queue_name, message, reason) for message in messages), return_exceptions=True
+        )
+        for message, outcome in zip(messages, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Could not schedule a retry for a message from '{queue_name}': {outcome}")
+                await message.nack(requeue=True)
+                MESSAGES_SETTLED.labels(queue_name, "nack").inc()
+            else:
+                await message.ack()
+                MESSAGES_SETTLED.labels(queue_name, outcome).inc()
+
+    async def _get_dead_letters(
+        self, channel: aio_pika.abc.AbstractChannel, queue_name: str, limit: int
+    ) -> List[aio_pika.abc.AbstractIncomingMessage]:
+        queue = await channel.declare_queue(dead_letter_queue(queue_name), durable=True)
+        messages = []
+        while len(messages) < limit:
+            message = await queue.get(no_ack=False, fail=False)
+            if message is None:
+                break
+            messages.append(message)
+        return messages
+
+    async def _channel(self) -> aio_pika.abc.AbstractChannel:
+        if self._connection is None:
+            raise RuntimeError("Retry scheduler not bound to a connection. Please use .connect() first")
+        return await self._connection.channel(publisher_confirms=False)
+
+    async def inspect(self, queue_name: str, limit: int, body_bytes: int) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` quarantined messages of a queue, oldest first, leaving them in place."""
+        async with await self._channel() as channel:
+            messages = await self._get_dead_letters(channel, queue_name, limit)
+            entries = [
+                {
+                    "attempts": retry_count(message),
+                    "failure_reason": (message.headers or {}).get(FAILURE_REASON_HEADER),
+                    "failed_at": (message.headers or {}).get(FAILED_AT_HEADER),
+                    "size": len(message.body),
+                    "body": message.body[:body_bytes].decode(errors="replace"),
+                    "body_truncated": len(message.body) > body_bytes,
+                }
+                for message in messages
+            ]
+            if messages:
+                await messages[-1].nack(multiple=True, requeue=True)
+        return entries
+
+    async def replay(self, queue_name: str, limit: int) -> int:
+        """Move up to ``limit`` quarantined messages back to their queue with a fresh attempt count."""
+        async with await self._channel() as channel:
+            messages = await self._get_dead_letters(channel, queue_name, limit)
+            results = await asyncio.gather(
+                *(
+                    self._publisher.publish(
+                        queue_name, message.body, headers=_copy_headers(message, _SCHEDULER_HEADERS + _BROKER_HEADERS)
+                    )
+                    for message in messages
+                ),
+                return_exceptions=True,
+            )
+            replayed = 0
+            for message, result in zip(messages, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Could not replay a message to '{queue_name}': {result}")
+                    await message.nack(requeue=True)
+                else:
+                    await message.ack()
+                    replayed += 1
+        logger.info(f"Replayed {replayed} of {len(messages)} quarantined messages to '{queue_name}'")
+        return replayed
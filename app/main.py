@@ -1,29 +1,20 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from config import settings
-from dependencies.rabbitmq import data_mq_client, services_mq_client
 from routes import router as api_router
+from runtime import pipeline
 import logging
 from contextlib import asynccontextmanager
 
-import services.data_ingestor
-
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        await data_mq_client.connect()
-        await services_mq_client.connect()
-        await data_mq_client.start_consumers()
-        await services_mq_client.start_consumers()
-        logger.info("RabbitMQ clients initialized successfully")
+    async with pipeline(run_consumers=settings.RUN_CONSUMERS):
+        if not settings.RUN_CONSUMERS:
+            logger.info("Consumers disabled in the API process; run worker.py to ingest data")
         yield
-    finally:
-        await data_mq_client.close()
-        await services_mq_client.close()
-        logger.info("RabbitMQ clients closed")
 
 
 app = FastAPI(lifespan=lifespan)
@@ -2,8 +2,16 @@ from fastapi import APIRouter
 from .health import router as health_router
 from .cache import router as cache_router
 from .wrapper_routes import router as wrapper_router
+from .metrics import router as metrics_router
+from .flow_control import router as flow_control_router
+from .live import router as live_router
+from .dead_letters import router as dead_letters_router
 
 router = APIRouter()
 router.include_router(health_router, prefix="/health", tags=["Health"])
 router.include_router(cache_router, prefix="/cache", tags=["Cache"])
 router.include_router(wrapper_router, prefix="/wrapper", tags=["Wrappers"])
+router.include_router(live_router, prefix="/live", tags=["Live"])
+router.include_router(flow_control_router, prefix="/flow-control", tags=["Flow Control"])
+router.include_router(dead_letters_router, prefix="/dead-letters", tags=["Dead Letters"])
+router.include_router(metrics_router, tags=["Metrics"])
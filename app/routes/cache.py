@@ -1,21 +1,52 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, Response
+from routes.responses import cached_payload_response, parse_if_none_match
 from services.cache_service import CacheService
+from services.cache_writer import cache_write_buffer
+from services.compression import compression_stats
+from services.response_cache import response_cache
 from typing import Dict, Any, Optional
 from schemas.wrapper_message import WrapperMessage
 
 router = APIRouter()
 cache_service = CacheService()
 
-@router.get("/last-message")
-async def get_last_message() -> Optional[WrapperMessage]:
+@router.get("/last-message", response_model=Optional[WrapperMessage])
+async def get_last_message(if_none_match: Optional[str] = Header(None)) -> Response:
     """
-    Get the last message received by the data collector
+    Get the last message received by the data collector, as stored and with an ETag
     """
-    return await cache_service.get_last_message()
+    etags = parse_if_none_match(if_none_match)
+    entry = await cache_service.get_last_message_payload(etags)
+    if entry is None:
+        return Response(content=b"null", media_type="application/json")
+    return cached_payload_response(entry, etags)
 
 @router.get("/last-message-metadata")
 async def get_last_message_metadata() -> Optional[Dict[str, Any]]:
     """
     Get metadata about the last message received by the data collector
     """
-    return await cache_service.get_last_message_metadata() 
+    return await cache_service.get_last_message_metadata()
+
+@router.get("/compression")
+async def get_compression_stats() -> Dict[str, Any]:
+    """
+    Get raw and stored byte totals of cached payloads written by this process
+    """
+    return compression_stats.snapshot()
+
+@router.get("/responses")
+async def get_response_cache_stats() -> Dict[str, Any]:
+    """
+    Get size and hit counters of the in-process response cache of the last-message routes
+    """
+    return response_cache.snapshot()
+
+@router.get("/write-behind")
+async def get_write_behind_stats() -> Dict[str, Any]:
+    """
+    Get the pending keys and circuit breaker state of this process's cache write buffer
+    """
+    if cache_write_buffer is None:
+        return {"enabled": False}
+    return cache_write_buffer.snapshot()
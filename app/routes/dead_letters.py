@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, List
+from dependencies.rabbitmq import RabbitMQClient, data_mq_client, services_mq_client
+
+router = APIRouter()
+
+
+def _client_for(queue_name: str) -> RabbitMQClient:
+    for client in (data_mq_client, services_mq_client):
+        if queue_name in client.consumers:
+            if client.retries is None:
+                raise HTTPException(status_code=404, detail="Retries and dead-lettering are disabled")
+            if client.connection is None:
+                raise HTTPException(status_code=503, detail="Consumers are not running in this process")
+            return client
+    raise HTTPException(status_code=404, detail=f"No consumer for queue {queue_name}")
+
+
+@router.get("/")
+async def get_dead_letter_depths() -> Dict[str, int]:
+    """Get the number of quarantined messages of every queue consumed by this process"""
+    return {**await data_mq_client.dead_letter_depths(), **await services_mq_client.dead_letter_depths()}
+
+@router.get("/{queue_name}")
+async def inspect_dead_letters(
+    queue_name: str,
+    limit: int = Query(20, ge=1, le=1000),
+    body_bytes: int = Query(1024, ge=0, description="Bytes of each message body to return"),
+) -> List[Dict[str, Any]]:
+    """Get the oldest quarantined messages of a queue with their last failure, without removing them"""
+    client = _client_for(queue_name)
+    return await client.retries.inspect(queue_name, limit, body_bytes)
+
+@router.post("/{queue_name}/replay")
+async def replay_dead_letters(queue_name: str, limit: int = Query(100, ge=1, le=10000)) -> Dict[str, int]:
+    """Move the oldest quarantined messages of a queue back to it for another round of attempts"""
+    client = _client_for(queue_name)
+    return {"replayed": await client.retries.replay(queue_name, limit)}
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from typing import Dict, Any
+from dependencies.flow_control import flow_controller
+
+router = APIRouter()
+
+@router.get("/")
+async def get_flow_control() -> Dict[str, Any]:
+    """
+    Get the current adaptive prefetch limits and pause state of this process's consumers
+    """
+    if flow_controller is None:
+        return {"enabled": False}
+    return flow_controller.snapshot()
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+
+from config import settings
+from services.live_feed import Subscriber, live_feed
+from services.serialization import dumps
+
+router = APIRouter()
+
+
+async def _events(request: Request, subscriber: Subscriber) -> AsyncIterator[bytes]:
+    try:
+        while not await request.is_disconnected():
+            try:
+                payload = await asyncio.wait_for(subscriber.queue.get(), settings.LIVE_FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            dropped = subscriber.take_dropped()
+            if dropped:
+                yield b"event: dropped\ndata: " + dumps({"count": dropped}) + b"\n\n"
+            yield b"event: message\ndata: " + payload + b"\n\n"
+    finally:
+        live_feed.unsubscribe(subscriber)
+
+
+@router.get("/")
+async def stream_live_data(
+    request: Request,
+    wrapper_id: Optional[List[str]] = Query(None, description="Only stream these wrappers; repeat for several"),
+) -> StreamingResponse:
+    """
+    Stream validated messages as Server-Sent Events while they are ingested.
+    A 'dropped' event reports messages skipped because the client read too slowly
+    """
+    subscriber = live_feed.subscribe(wrapper_id)
+    return StreamingResponse(
+        _events(request, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/subscribers")
+async def get_live_feed_stats() -> Dict[str, Any]:
+    """
+    Get the number of live subscribers of this process and messages delivered to them
+    """
+    return live_feed.snapshot()
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from dependencies.metrics import CONTENT_TYPE, render
+from dependencies.rabbitmq import data_mq_client, services_mq_client
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=Response)
+async def get_metrics() -> Response:
+    """
+    Expose ingestion metrics in the Prometheus text format
+    """
+    await data_mq_client.queue_depths()
+    await services_mq_client.queue_depths()
+    return Response(render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,26 @@
+from typing import Optional, Set
+
+from fastapi import Response
+
+from services.response_cache import CachedPayload
+
+
+def parse_if_none_match(header: Optional[str]) -> Set[str]:
+    """Extract the entity tags of an If-None-Match header, ignoring weak markers and quotes."""
+    if not header:
+        return set()
+    tags = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tags.add(tag.strip('"'))
+    return tags
+
+
+def cached_payload_response(entry: CachedPayload, if_none_match: Set[str]) -> Response:
+    """Serve stored JSON as is, or a 304 when the client already has this version."""
+    headers = {"ETag": f'"{entry.etag}"', "Cache-Control": "no-cache"}
+    if entry.etag in if_none_match or "*" in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.payload, media_type="application/json", headers=headers)
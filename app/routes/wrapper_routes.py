@@ -1,12 +1,54 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from routes.responses import cached_payload_response, parse_if_none_match
 from services.validation_service import ValidationService
 from services.cache_service import CacheService
-from schemas.wrapper_message import WrapperStatistics, WrapperMessage
-from typing import Optional
+from services.history_service import HistoryService, parse_bound
+from services.schema_profile import schema_profiles
+from services.stats_cache import wrapper_stats_cache
+from schemas.wrapper_message import (
+    WrapperIdsRequest,
+    WrapperMessage,
+    WrapperProfile,
+    WrapperStatistics,
+    WrapperStatisticsPage,
+    XValueType,
+)
+from typing import Any, Dict, Optional
 
 router = APIRouter()
 validation_service = ValidationService()
 cache_service = CacheService()
+history_service = HistoryService()
+
+@router.get("/statistics-cache")
+async def get_statistics_cache_info() -> Dict[str, Any]:
+    """Get size and hit/miss counters of the in-process cache of wrapper X value types"""
+    return wrapper_stats_cache.snapshot()
+
+@router.get("/")
+async def list_wrappers(
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    x_value_type: Optional[XValueType] = Query(None),
+    stale_after: Optional[float] = Query(None, ge=0, description="Only wrappers silent for at least this many seconds"),
+    active_within: Optional[float] = Query(None, ge=0, description="Only wrappers with a message in this many seconds"),
+) -> WrapperStatisticsPage:
+    """List known wrappers with their statistics, in wrapper_id order"""
+    wrappers, next_cursor = await validation_service.list_wrapper_stats(
+        cursor, limit, x_value_type, stale_after, active_within
+    )
+    return WrapperStatisticsPage(wrappers=wrappers, next_cursor=next_cursor)
+
+@router.post("/statistics/bulk")
+async def get_wrappers_statistics(request: WrapperIdsRequest) -> Dict[str, Optional[WrapperStatistics]]:
+    """Get statistics for several wrappers at once; unknown wrappers map to null"""
+    return await validation_service.get_wrapper_stats_many(request.wrapper_ids)
+
+@router.post("/last-messages/bulk", response_model=Dict[str, Dict[str, Optional[WrapperMessage]]])
+async def get_wrappers_last_messages(request: WrapperIdsRequest) -> Response:
+    """Get the last message of several wrappers at once; wrappers without messages map to null"""
+    content = await cache_service.get_wrapper_last_messages_json(request.wrapper_ids)
+    return Response(content=content, media_type="application/json")
 
 @router.get("/{wrapper_id}/statistics")
 async def get_wrapper_statistics(wrapper_id: str) -> WrapperStatistics:
@@ -16,10 +58,37 @@ async def get_wrapper_statistics(wrapper_id: str) -> WrapperStatistics:
         raise HTTPException(status_code=404, detail=f"No statistics found for wrapper {wrapper_id}")
     return stats
 
-@router.get("/{wrapper_id}/last-message")
-async def get_wrapper_last_message(wrapper_id: str) -> WrapperMessage:
-    """Get the last message received from a specific wrapper"""
-    message = await cache_service.get_wrapper_last_message(wrapper_id)
-    if not message:
+@router.get("/{wrapper_id}/profile")
+async def get_wrapper_profile(wrapper_id: str) -> WrapperProfile:
+    """Get the data profile learned for a specific wrapper"""
+    if schema_profiles is None:
+        raise HTTPException(status_code=404, detail="Schema profiles are disabled")
+    profile = await schema_profiles.get_profile(wrapper_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail=f"No profile found for wrapper {wrapper_id}")
+    return profile
+
+@router.get("/{wrapper_id}/last-message", response_model=WrapperMessage)
+async def get_wrapper_last_message(wrapper_id: str, if_none_match: Optional[str] = Header(None)) -> Response:
+    """Get the last message received from a specific wrapper, as stored and with an ETag"""
+    etags = parse_if_none_match(if_none_match)
+    entry = await cache_service.get_wrapper_last_message_payload(wrapper_id, etags)
+    if entry is None:
         raise HTTPException(status_code=404, detail=f"No messages found for wrapper {wrapper_id}")
-    return message
\ No newline at end of file
+    return cached_payload_response(entry, etags)
+
+@router.get("/{wrapper_id}/history")
+async def get_wrapper_history(
+    wrapper_id: str,
+    start: Optional[str] = Query(None, alias="from", description="Lower X bound: number or ISO datetime"),
+    end: Optional[str] = Query(None, alias="to", description="Upper X bound: number or ISO datetime"),
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+) -> Response:
+    """Get a page of stored data points for a wrapper within an X range"""
+    try:
+        start_score, end_score = parse_bound(start), parse_bound(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid range bound: {e}")
+    content = await history_service.get_history_json(wrapper_id, start_score, end_score, limit, offset)
+    return Response(content=content, media_type="application/json")
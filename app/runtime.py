@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from aio_pika.exceptions import AMQPChannelError, AMQPConnectionError
+
+from config import settings
+from dependencies.rabbitmq import data_mq_client, services_mq_client
+from dependencies.redis import redis_client
+from services.cache_writer import cache_write_buffer
+from services.error_reporter import error_reporter
+from services.live_feed import live_feed
+from services.stats_cache import wrapper_stats_cache
+from services.validation_service import ValidationService
+
+import services.data_ingestor
+
+logger = logging.getLogger(__name__)
+
+
+async def _connect_for_api() -> None:
+    """Connect the AMQP clients without consuming, for the dead-letter and queue depth routes.
+
+    The API keeps serving when a broker is down; those routes then answer 503.
+    """
+    for client in (data_mq_client, services_mq_client):
+        try:
+            await client.connect()
+        except (AMQPConnectionError, AMQPChannelError, OSError) as e:
+            logger.warning(f"Could not connect to {client.url.rsplit('@', 1)[-1]}, dead-letter routes are unavailable: {e}")
+
+
+@asynccontextmanager
+async def pipeline(run_consumers: bool = True):
+    """Run the shared background pieces of a process, optionally with the AMQP consumers.
+
+    On exit consumers stop taking messages, drain what they already accepted, and
+    pending publishes are flushed before the connections close.
+    """
+    stats_listener = asyncio.create_task(
+        wrapper_stats_cache.listen_for_invalidations(redis_client, settings.WRAPPER_STATS_INVALIDATION_CHANNEL)
+    )
+    try:
+        await ValidationService().ensure_wrapper_index()
+        if run_consumers:
+            await data_mq_client.connect()
+            await services_mq_client.connect()
+        else:
+            await _connect_for_api()
+        if run_consumers:
+            await data_mq_client.start_consumers()
+            await services_mq_client.start_consumers()
+            error_reporter.start()
+            if cache_write_buffer is not None:
+                cache_write_buffer.start()
+            logger.info("RabbitMQ clients initialized successfully")
+        yield
+    finally:
+        if run_consumers:
+            await data_mq_client.close()
+            if cache_write_buffer is not None:
+                await cache_write_buffer.close()
+            await services.data_ingestor.collected_envelope_writer.close()
+            await error_reporter.close()
+            await services_mq_client.close()
+            logger.info("RabbitMQ clients closed")
+        else:
+            for client in (data_mq_client, services_mq_client):
+                if client.connection is not None:
+                    await client.close()
+        await live_feed.close()
+        stats_listener.cancel()
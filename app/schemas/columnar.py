@@ -0,0 +1,146 @@
+from array import array
+from json.encoder import encode_basestring
+from math import isfinite
+from typing import Any, Dict, Iterator, List, Sequence, Union
+
+from pydantic_core import to_json
+
+from schemas.wrapper_message import DataPoint
+
+XValue = Union[str, float, int]
+
+
+def _coerce_x(value: Any) -> XValue:
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (str, int, float)):
+        return value
+    raise ValueError(f"Invalid x value {value!r}: expected a datetime string, number, or category string")
+
+
+def _coerce_y(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid y value {value!r}: expected a number")
+
+
+def _float_json(value: float) -> str:
+    return repr(value) if isfinite(value) else "null"
+
+
+def _x_json(value: XValue) -> str:
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if isinstance(value, int):
+        return str(value)
+    return _float_json(value)
+
+
+class _PointsView(Sequence):
+    """Read-only sequence of DataPoint views over the columns, built on access."""
+
+    __slots__ = ("_x", "_y")
+
+    def __init__(self, x: List[XValue], y: "array[float]") -> None:
+        self._x = x
+        self._y = y
+
+    def __len__(self) -> int:
+        return len(self._x)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[DataPoint, List[DataPoint]]:
+        if isinstance(index, slice):
+            return [DataPoint.model_construct(x=x, y=y) for x, y in zip(self._x[index], self._y[index])]
+        return DataPoint.model_construct(x=self._x[index], y=self._y[index])
+
+    def __iter__(self) -> Iterator[DataPoint]:
+        for x, y in zip(self._x, self._y):
+            yield DataPoint.model_construct(x=x, y=y)
+
+
+class ColumnarWrapperMessage:
+    """Validated wrapper message with its data points stored column-wise.
+
+    X values live in one list and Y values in a contiguous ``array('d')``, so a
+    message costs two containers instead of one model instance per point. It
+    exposes the attributes the ingest pipeline reads from ``WrapperMessage``
+    (``wrapper_id``, ``data``, ``metadata``, ``model_dump``) and serializes to the
+    same JSON document.
+    """
+
+    __slots__ = ("wrapper_id", "x", "y", "metadata")
+
+    def __init__(self, wrapper_id: str, x: List[XValue], y: "array[float]", metadata: Dict[str, Any]) -> None:
+        self.wrapper_id = wrapper_id
+        self.x = x
+        self.y = y
+        self.metadata = metadata
+
+    @classmethod
+    def from_raw(cls, raw_data: Dict[str, Any]) -> "ColumnarWrapperMessage":
+        """Validate a decoded message into columns in a single pass over its points.
+
+        Repeated x values with the same y are dropped, keeping the first occurrence;
+        repeated x values with different y values are rejected, as in WrapperMessage.
+        """
+        wrapper_id = raw_data["wrapper_id"]
+        points = raw_data["data"]
+        metadata = raw_data["metadata"]
+        if not isinstance(wrapper_id, str):
+            raise ValueError("wrapper_id must be a string")
+        if not isinstance(points, list):
+            raise ValueError("data must be an array")
+        if not isinstance(metadata, dict):
+            raise ValueError("metadata must be an object")
+
+        xs: List[XValue] = []
+        ys = array("d")
+        first_index: Dict[XValue, int] = {}
+        for point in points:
+            x = _coerce_x(point["x"])
+            y = _coerce_y(point["y"])
+            index = first_index.get(x)
+            if index is None:
+                first_index[x] = len(xs)
+                xs.append(x)
+                ys.append(y)
+            elif ys[index] != y:
+                raise ValueError(f"Conflicting y values {[ys[index], y]} for x={x}")
+
+        return cls(wrapper_id, xs, ys, metadata)
+
+    @property
+    def data(self) -> _PointsView:
+        return _PointsView(self.x, self.y)
+
+    def to_json(self) -> bytes:
+        """Serialize straight from the columns to the WrapperMessage JSON layout."""
+        points = ",".join(
+            f'{{"x":{_x_json(x)},"y":{_float_json(y)}}}' for x, y in zip(self.x, self.y)
+        )
+        return (
+            f'{{"wrapper_id":{encode_basestring(self.wrapper_id)},"data":[{points}],"metadata":'.encode()
+            + to_json(self.metadata)
+            + b"}"
+        )
+
+    def model_dump(self, mode: str = "python") -> Dict[str, Any]:
+        return {
+            "wrapper_id": self.wrapper_id,
+            "data": [{"x": x, "y": y} for x, y in zip(self.x, self.y)],
+            "metadata": self.metadata,
+        }
+
+    def take(self, positions: Sequence[int], metadata: Dict[str, Any]) -> "ColumnarWrapperMessage":
+        """Return a message with only the points at ``positions`` and the given metadata."""
+        return ColumnarWrapperMessage(
+            self.wrapper_id,
+            [self.x[position] for position in positions],
+            array("d", (self.y[position] for position in positions)),
+            metadata,
+        )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Optional, Union
 from datetime import datetime
 from enum import Enum
 
@@ -62,10 +62,44 @@ class WrapperStatistics(BaseModel):
     total_messages: int
     x_value_type: XValueType
     last_data_count: int
+
+class WrapperProfile(BaseModel):
+    wrapper_id: str
+    x_value_type: XValueType
+    datetime_format: Optional[str] = Field(None, description="Layout of datetime X values, 'mixed' when it varies")
+    y_min: float
+    y_max: float
+    point_count_min: int
+    point_count_max: int
+    point_count_mean: float
+    monotonic_x: bool = Field(..., description="X increased within every learned message")
+    learned_messages: int
+    complete: bool = Field(..., description="Learning is over and messages are checked against the profile")
+
+class WrapperIdsRequest(BaseModel):
+    wrapper_ids: List[str] = Field(..., min_length=1, max_length=1000, description="Wrapper IDs to look up")
+
+class WrapperStatisticsPage(BaseModel):
+    wrappers: List[WrapperStatistics]
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page; null on the last page")
     
 class ValidationError(BaseModel):
     wrapper_id: str
     error_type: str
     error_message: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
-    original_data: Dict[str, Any] = Field(default_factory=dict)
\ No newline at end of file
+    original_data: Dict[str, Any] = Field(default_factory=dict)
+    original_size: Optional[int] = Field(None, description="Size in bytes of the original data as JSON")
+    original_hash: Optional[str] = Field(None, description="Hash of the original data as JSON")
+    original_truncated: bool = Field(False, description="original_data only holds a sample of the original")
+
+class ValidationErrorSummary(BaseModel):
+    wrapper_id: str
+    error_type: str
+    count: int = Field(..., description="Errors of this type for the wrapper within the window")
+    published: int = Field(..., description="Errors among them published individually")
+    first_seen: datetime
+    last_seen: datetime
+    window_start: datetime
+    window_end: datetime
+    last_error_message: str
@@ -1,14 +1,27 @@
-import json
 from datetime import datetime, UTC
-from typing import Optional, Dict, Any
+from hashlib import blake2b
+from typing import Optional, Dict, Any, Collection, List
+
+from redis.asyncio.client import Pipeline
 
 from schemas.wrapper_message import WrapperMessage
-from dependencies.redis import redis_client
+from dependencies.redis import redis_binary_client, redis_client
+from services.cache_writer import cache_write_buffer
+from services.compression import compress_payload, decompress_payload
+from services.response_cache import CachedPayload, response_cache
+from services.serialization import dumps, encode_wrapper_message, loads
 
 
 LAST_MESSAGE_KEY = "last_message"
 LAST_MESSAGE_METADATA_KEY = "last_message_metadata"
 WRAPPER_LAST_MESSAGE_PREFIX = "wrapper_last_message:"
+LAST_MESSAGE_ETAG_KEY = "last_message_etag"
+WRAPPER_LAST_MESSAGE_ETAG_PREFIX = "wrapper_last_message_etag:"
+
+
+def content_etag(payload: bytes) -> str:
+    """Hash of a message's canonical JSON, stored next to it and served as its ETag."""
+    return blake2b(payload, digest_size=16).hexdigest()
 
 
 class CacheService:
@@ -16,39 +29,99 @@ class CacheService:
 
     def __init__(self) -> None:
         self._redis = redis_client
+        self._binary_redis = redis_binary_client
         self._last_message_key = LAST_MESSAGE_KEY
         self._last_message_metadata_key = LAST_MESSAGE_METADATA_KEY
         self._wrapper_last_message_prefix = WRAPPER_LAST_MESSAGE_PREFIX
+        self._last_message_etag_key = LAST_MESSAGE_ETAG_KEY
+        self._wrapper_last_message_etag_prefix = WRAPPER_LAST_MESSAGE_ETAG_PREFIX
+        self._responses = response_cache
+        self._write_buffer = cache_write_buffer
 
-    async def store_message(self, message: WrapperMessage) -> None:
-        """Store wrapper message in Redis with global and per-wrapper keys."""
-        await self._redis.set(
-            self._last_message_key,
-            message.model_dump_json()
-        )
-
-        metadata = {
+    def _metadata(self, message: WrapperMessage, payload: bytes, stored: bytes) -> bytes:
+        return dumps({
             "timestamp": datetime.now(UTC).isoformat(),
             "wrapper_id": message.wrapper_id,
-            "data_points_count": len(message.data)
+            "data_points_count": len(message.data),
+            "payload_bytes": len(payload),
+            "stored_bytes": len(stored)
+        })
+
+    async def store_message(self, message: WrapperMessage, payload: Optional[bytes] = None) -> None:
+        """Store wrapper message in Redis with global and per-wrapper keys.
+
+        ``payload`` is the message's canonical JSON when the caller already encoded it.
+        """
+        payload = payload if payload is not None else encode_wrapper_message(message)
+        stored = compress_payload(payload)
+        etag = content_etag(payload)
+        if self._write_buffer is not None:
+            self._write_buffer.put(f"{self._wrapper_last_message_prefix}{message.wrapper_id}", {
+                f"{self._wrapper_last_message_prefix}{message.wrapper_id}": stored,
+                f"{self._wrapper_last_message_etag_prefix}{message.wrapper_id}": etag,
+            })
+            self._write_buffer.put(self._last_message_key, {
+                self._last_message_key: stored,
+                self._last_message_etag_key: etag,
+                self._last_message_metadata_key: self._metadata(message, payload, stored),
+            })
+            return
+        async with self._binary_redis.pipeline(transaction=False) as pipe:
+            # Payloads and their hashes go in one MSET so readers never pair them up wrongly
+            pipe.mset({
+                self._last_message_key: stored,
+                self._last_message_etag_key: etag,
+                f"{self._wrapper_last_message_prefix}{message.wrapper_id}": stored,
+                f"{self._wrapper_last_message_etag_prefix}{message.wrapper_id}": etag,
+            })
+            pipe.set(self._last_message_metadata_key, self._metadata(message, payload, stored))
+            await pipe.execute()
+
+    def store_messages(
+        self, messages: List[WrapperMessage], pipe: Pipeline, payloads: Optional[List[bytes]] = None
+    ) -> None:
+        """Queue cache writes for a batch of messages on a pipeline, one write per key.
+
+        With write-behind enabled they go to the write buffer instead of ``pipe``.
+        """
+        if not messages:
+            return
+        if payloads is None:
+            payloads = [encode_wrapper_message(message) for message in messages]
+
+        latest_by_wrapper = {message.wrapper_id: index for index, message in enumerate(messages)}
+        stored_by_index = {index: compress_payload(payloads[index]) for index in latest_by_wrapper.values()}
+        etag_by_index = {index: content_etag(payloads[index]) for index in latest_by_wrapper.values()}
+        entries = {}
+        for wrapper_id, index in latest_by_wrapper.items():
+            entries[f"{self._wrapper_last_message_prefix}{wrapper_id}"] = {
+                f"{self._wrapper_last_message_prefix}{wrapper_id}": stored_by_index[index],
+                f"{self._wrapper_last_message_etag_prefix}{wrapper_id}": etag_by_index[index],
+            }
+
+        # The last message is always the latest one of its wrapper
+        last_index = len(messages) - 1
+        last_message = {
+            self._last_message_key: stored_by_index[last_index],
+            self._last_message_etag_key: etag_by_index[last_index],
         }
-        await self._redis.set(
-            self._last_message_metadata_key,
-            json.dumps(metadata)
-        )
-
-        await self._redis.set(
-            f"{self._wrapper_last_message_prefix}{message.wrapper_id}",
-            message.model_dump_json()
-        )
+        metadata = self._metadata(messages[-1], payloads[-1], stored_by_index[last_index])
+        if self._write_buffer is not None:
+            for entry, values in entries.items():
+                self._write_buffer.put(entry, values)
+            self._write_buffer.put(self._last_message_key, {**last_message, self._last_message_metadata_key: metadata})
+            return
+        values = {key: value for entry in entries.values() for key, value in entry.items()}
+        pipe.mset({**values, **last_message})
+        pipe.set(self._last_message_metadata_key, metadata)
 
     async def get_last_message(self) -> Optional[WrapperMessage]:
         """Retrieve the most recent message from any wrapper."""
-        data = await self._redis.get(self._last_message_key)
+        data = await self._binary_redis.get(self._last_message_key)
         if not data:
             return None
 
-        return WrapperMessage.model_validate_json(data)
+        return WrapperMessage.model_validate_json(decompress_payload(data))
 
     async def get_last_message_metadata(self) -> Optional[Dict[str, Any]]:
         """Retrieve metadata for the most recent message."""
@@ -56,13 +129,76 @@ class CacheService:
         if not data:
             return None
 
-        return json.loads(data)
+        return loads(data)
 
     async def get_wrapper_last_message(self, wrapper_id: str) -> Optional[WrapperMessage]:
         """Retrieve the most recent message from a specific wrapper."""
-        data = await self._redis.get(f"{self._wrapper_last_message_prefix}{wrapper_id}")
+        data = await self._binary_redis.get(f"{self._wrapper_last_message_prefix}{wrapper_id}")
         if not data:
             return None
 
-        return WrapperMessage.model_validate_json(data)
+        return WrapperMessage.model_validate_json(decompress_payload(data))
+
+    async def get_wrapper_last_messages_json(self, wrapper_ids: List[str]) -> bytes:
+        """Return the last message of each wrapper as one JSON object, read with a single MGET.
 
+        Stored payloads are embedded as they are; wrappers without messages map to null.
+        """
+        stored = await self._binary_redis.mget(
+            [f"{self._wrapper_last_message_prefix}{wrapper_id}" for wrapper_id in wrapper_ids]
+        )
+        entries = b",".join(
+            dumps(wrapper_id) + b":" + (decompress_payload(data) if data is not None else b"null")
+            for wrapper_id, data in zip(wrapper_ids, stored)
+        )
+        return b'{"messages":{' + entries + b"}}"
+
+    async def _get_cached_payload(
+        self, key: str, etag_key: str, if_none_match: Collection[str] = ()
+    ) -> Optional[CachedPayload]:
+        """Return a stored payload and its ETag, reading Redis as little as possible.
+
+        A fresh response cache entry is returned without any Redis call. An expired
+        entry, or a client ETag, is checked against the stored hash first; the payload
+        itself is only read when it changed. When the client's ETag is current the
+        returned payload is None.
+        """
+        cached = self._responses.get(key)
+        if cached is not None and cached.fresh:
+            return cached.entry
+
+        if cached is not None or if_none_match:
+            stored_etag = await self._binary_redis.get(etag_key)
+            if stored_etag is not None:
+                etag = stored_etag.decode()
+                if cached is not None and cached.entry.etag == etag:
+                    self._responses.put(key, cached.entry)
+                    return cached.entry
+                if etag in if_none_match:
+                    return CachedPayload(None, etag)
+
+        stored, stored_etag = await self._binary_redis.mget(key, etag_key)
+        if stored is None:
+            self._responses.invalidate(key)
+            return None
+
+        payload = decompress_payload(stored)
+        # Messages cached before hashes were stored get theirs computed on read
+        etag = stored_etag.decode() if stored_etag is not None else content_etag(payload)
+        entry = CachedPayload(payload, etag)
+        self._responses.put(key, entry)
+        return entry
+
+    async def get_last_message_payload(self, if_none_match: Collection[str] = ()) -> Optional[CachedPayload]:
+        """Retrieve the stored JSON of the most recent message without decoding it."""
+        return await self._get_cached_payload(self._last_message_key, self._last_message_etag_key, if_none_match)
+
+    async def get_wrapper_last_message_payload(
+        self, wrapper_id: str, if_none_match: Collection[str] = ()
+    ) -> Optional[CachedPayload]:
+        """Retrieve the stored JSON of a wrapper's most recent message without decoding it."""
+        return await self._get_cached_payload(
+            f"{self._wrapper_last_message_prefix}{wrapper_id}",
+            f"{self._wrapper_last_message_etag_prefix}{wrapper_id}",
+            if_none_match,
+        )
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from redis.exceptions import RedisError
+
+from config import settings
+from dependencies.circuit_breaker import CircuitBreaker
+from dependencies.metrics import (
+    CACHE_WRITE_BUFFER_ENTRIES,
+    CACHE_WRITE_FLUSHES,
+    CACHE_WRITES_COALESCED,
+    CACHE_WRITES_DROPPED,
+)
+from dependencies.redis import redis_binary_client
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWriteBuffer:
+    """Write-behind buffer for the last-message cache keys.
+
+    Writes are kept in memory per entry, the keys of one wrapper or the global
+    last-message keys, so an entry rewritten many times between flushes costs one
+    write, and are flushed every ``interval`` seconds as a single MSET. Ingestion
+    never waits for Redis: a flush that fails or takes longer than ``timeout`` puts
+    its entries back under any newer ones and counts against a circuit breaker,
+    which skips flushes while open.
+
+    The buffer holds at most ``max_entries`` entries; beyond that the least
+    recently written ones are dropped whole, so a payload never loses its ETag.
+    """
+
+    def __init__(self, interval: float, max_entries: int, timeout: float, breaker: CircuitBreaker) -> None:
+        self._redis = redis_binary_client
+        self._interval = interval
+        self._max_entries = max_entries
+        self._timeout = timeout
+        self.breaker = breaker
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._depth = CACHE_WRITE_BUFFER_ENTRIES
+        self._task: Optional[asyncio.Task] = None
+
+    def _trim(self) -> None:
+        pending = self._pending
+        while len(pending) > self._max_entries:
+            del pending[next(iter(pending))]
+            CACHE_WRITES_DROPPED.inc()
+
+    def put(self, entry: str, values: Dict[str, Any]) -> None:
+        """Buffer the values of an entry's keys, replacing a pending write of the same entry."""
+        if self._pending.pop(entry, None) is not None:
+            CACHE_WRITES_COALESCED.inc()
+        self._pending[entry] = values
+        self._trim()
+        self._depth.set(len(self._pending))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write the buffered values in one MSET unless the breaker is open."""
+        if not self._pending:
+            return
+        if not self.breaker.allow():
+            CACHE_WRITE_FLUSHES.labels("skipped").inc()
+            return
+
+        entries, self._pending = self._pending, {}
+        values = {key: value for entry in entries.values() for key, value in entry.items()}
+        try:
+            await asyncio.wait_for(self._redis.mset(values), self._timeout)
+        except (RedisError, asyncio.TimeoutError) as e:
+            self.breaker.record_failure()
+            CACHE_WRITE_FLUSHES.labels("failed").inc()
+            logger.warning(f"Could not flush {len(entries)} buffered cache entries: {e!r}")
+            # Entries written during the flush are newer and win; the oldest go first when full
+            for entry in self._pending:
+                entries.pop(entry, None)
+            entries.update(self._pending)
+            self._pending = entries
+            self._trim()
+        else:
+            self.breaker.record_success()
+            CACHE_WRITE_FLUSHES.labels("ok").inc()
+        finally:
+            self._depth.set(len(self._pending))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.warning(f"{len(self._pending)} buffered cache entries were not flushed")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "pending_entries": len(self._pending),
+            "max_entries": self._max_entries,
+            "breaker": self.breaker.snapshot(),
+        }
+
+
+cache_write_buffer: Optional[CacheWriteBuffer] = None
+if settings.CACHE_WRITE_BEHIND_ENABLED:
+    cache_write_buffer = CacheWriteBuffer(
+        interval=settings.CACHE_WRITE_BEHIND_INTERVAL_MS / 1000,
+        max_entries=settings.CACHE_WRITE_BEHIND_MAX_ENTRIES,
+        timeout=settings.CACHE_WRITE_BEHIND_TIMEOUT,
+        breaker=CircuitBreaker(
+            "redis_writes",
+            failure_threshold=settings.CACHE_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.CACHE_BREAKER_RESET_SECONDS,
+        ),
+    )
@@ -0,0 +1,80 @@
+import logging
+import zlib
+from typing import Any, Dict
+
+from config import settings
+from exceptions import CacheException
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional codec
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+# Compressed values start with a marker; plain JSON never starts with a NUL byte,
+# so entries written before compression was enabled stay readable.
+ZLIB_MARKER = b"\x00z1"
+ZSTD_MARKER = b"\x00zs"
+
+
+class CompressionStats:
+    """Running totals of payload bytes before and after compression in this process."""
+
+    def __init__(self) -> None:
+        self.writes = 0
+        self.compressed_writes = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def record(self, raw_size: int, stored_size: int) -> None:
+        self.writes += 1
+        if stored_size != raw_size:
+            self.compressed_writes += 1
+        self.raw_bytes += raw_size
+        self.stored_bytes += stored_size
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "algorithm": settings.CACHE_COMPRESSION,
+            "writes": self.writes,
+            "compressed_writes": self.compressed_writes,
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": self.stored_bytes,
+            "ratio": self.stored_bytes / self.raw_bytes if self.raw_bytes else 1.0,
+        }
+
+
+compression_stats = CompressionStats()
+
+if settings.CACHE_COMPRESSION == "zstd" and zstandard is None:
+    logger.warning("zstandard is not installed, cached payloads will be compressed with zlib")
+
+_zstd_compressor = zstandard.ZstdCompressor(level=settings.CACHE_COMPRESSION_LEVEL) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def compress_payload(payload: bytes) -> bytes:
+    """Compress a payload for storage when enabled and above the size threshold."""
+    algorithm = settings.CACHE_COMPRESSION
+    if algorithm == "none" or len(payload) < settings.CACHE_COMPRESSION_MIN_BYTES:
+        stored = payload
+    elif algorithm == "zstd" and _zstd_compressor is not None:
+        stored = ZSTD_MARKER + _zstd_compressor.compress(payload)
+    else:
+        stored = ZLIB_MARKER + zlib.compress(payload, min(settings.CACHE_COMPRESSION_LEVEL, 9))
+
+    compression_stats.record(len(payload), len(stored))
+    return stored
+
+
+def decompress_payload(stored: bytes) -> bytes:
+    """Return the plain payload for a stored value, compressed or not."""
+    if stored.startswith(ZLIB_MARKER):
+        return zlib.decompress(stored[len(ZLIB_MARKER):])
+    if stored.startswith(ZSTD_MARKER):
+        if _zstd_decompressor is None:
+            raise CacheException("Cached payload is zstd-compressed but zstandard is not installed")
+        return _zstd_decompressor.decompress(stored[len(ZSTD_MARKER):])
+    return stored
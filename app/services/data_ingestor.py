@@ -1,7 +1,30 @@
+import asyncio
 import json
+import re
+from typing import List, Optional
 import aio_pika
-from dependencies.rabbitmq import data_consumer, services_mq_client
-from services.cache_service import CacheService
+from dependencies.metrics import (
+    DELTA_MESSAGES_SUPPRESSED,
+    DELTA_POINTS_SUPPRESSED,
+    DUPLICATES_SKIPPED,
+    INGEST_BATCH_STAGE_SECONDS,
+    INGEST_STAGE_SECONDS,
+    MESSAGES_SETTLED,
+    VALIDATION_ERRORS,
+)
+from dependencies.rabbitmq import data_batch_consumer, data_consumer, data_mq_client, services_mq_client
+from dependencies.redis import redis_client
+from dependencies.retry import is_redelivery
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from services.cache_service import CacheService, content_etag
+from services.dedup_service import dedup_service
+from services.delta_service import delta_service
+from services.envelope import EnvelopeWriter
+from services.error_reporter import error_reporter
+from services.history_service import HistoryService
+from services.live_feed import live_feed
+from services.segmenter import SEGMENT_METADATA_KEY, SegmentPlan, payload_segmenter
+from services.serialization import encode_wrapper_message, loads
 from services.validation_service import ValidationService
 from config import settings
 import logging
@@ -10,42 +33,321 @@ logger = logging.getLogger(__name__)
 
 cache_service = CacheService()
 validation_service = ValidationService()
+history_service = HistoryService()
+collected_envelope_writer = EnvelopeWriter(
+    services_mq_client,
+    settings.COLLECTED_DATA_QUEUE,
+    max_messages=settings.COLLECTED_ENVELOPE_MAX_MESSAGES,
+    max_bytes=settings.COLLECTED_ENVELOPE_MAX_BYTES,
+    linger=settings.COLLECTED_ENVELOPE_LINGER_MS / 1000,
+    compress=settings.COLLECTED_ENVELOPE_COMPRESS,
+)
+
+# wrapper_id as the first key of the body, where it is sure to be the top-level field
+_WRAPPER_ID_PATTERN = re.compile(rb'\s*\{\s*"wrapper_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# Failures of the brokers or of Redis, worth retrying the message after a delay
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, RedisConnectionError, RedisTimeoutError)
+
+
+def body_wrapper_id(body: bytes) -> Optional[str]:
+    """Extract wrapper_id from a raw body without decoding the whole JSON document.
+
+    Producers put wrapper_id first, so only the start of the body is matched. The
+    body is decoded after all when wrapper_id is not its first key, is not a
+    string, or has escapes.
+    """
+    match = _WRAPPER_ID_PATTERN.match(body)
+    if match is not None and b"\\" not in match.group(1):
+        return match.group(1).decode(errors="replace")
+    try:
+        raw_data = loads(body)
+    except ValueError:
+        return None
+    wrapper_id = raw_data.get("wrapper_id") if isinstance(raw_data, dict) else None
+    return wrapper_id if isinstance(wrapper_id, str) else None
+
+
+def wrapper_shard_key(message: aio_pika.abc.AbstractIncomingMessage) -> Optional[str]:
+    return body_wrapper_id(message.body)
+
+
+async def forward_collected(payloads: List[bytes]):
+    """Forward encoded validated messages to the services queue, enveloped when enabled"""
+    if settings.COLLECTED_ENVELOPE_ENABLED:
+        await collected_envelope_writer.add_many(payloads)
+    else:
+        await services_mq_client.publish_many(settings.COLLECTED_DATA_QUEUE, payloads)
+
+
+async def delta_payloads(messages: List, payloads: List[bytes], redelivered: List[bool]) -> List[bytes]:
+    """Reduce the payloads of delta-enabled wrappers to their new points, dropping unchanged messages"""
+    reduced_messages = await delta_service.deltas(messages, redelivered)
+    forwarded = []
+    for message, payload, reduced in zip(messages, payloads, reduced_messages):
+        if reduced is None:
+            DELTA_MESSAGES_SUPPRESSED.inc()
+            DELTA_POINTS_SUPPRESSED.inc(len(message.data))
+        elif reduced is message:
+            forwarded.append(payload)
+        else:
+            DELTA_POINTS_SUPPRESSED.inc(len(message.data) - len(reduced.data))
+            forwarded.append(encode_wrapper_message(reduced))
+    return forwarded
+
+
+async def forget_attempt(dedup_keys: List[str], wrapper_ids: List[str]):
+    """Undo the dedup claims and delta indexes of messages that are going to be redelivered"""
+    if dedup_keys:
+        await dedup_service.release(*dedup_keys)
+    if wrapper_ids and delta_service is not None:
+        await delta_service.reset(wrapper_ids)
+
+
+async def forward_segments(message: aio_pika.abc.AbstractIncomingMessage, plan: SegmentPlan):
+    """Validate an oversized message chunk by chunk, then forward it as ordered segments.
+
+    Nothing is stored or forwarded until every segment is valid. Segments are then
+    decoded again one at a time, so only one chunk's objects are alive at once.
+    """
+    body = message.body
+    with INGEST_STAGE_SECONDS.labels("validate").time():
+        points, validation_error = await validation_service.validate_segments(body, plan)
+    if validation_error:
+        VALIDATION_ERRORS.labels(validation_error.error_type).inc()
+        await error_reporter.report([validation_error])
+        logger.warning(f"Validation error for wrapper {plan.wrapper_id}: {validation_error.error_message}")
+        await message.ack()
+        MESSAGES_SETTLED.labels(settings.DATA_QUEUE, "ack").inc()
+        return
+
+    segment_id = await asyncio.to_thread(content_etag, body)
+    count = len(plan.spans)
+    for index in range(count):
+        segment = payload_segmenter.decode_segment(body, plan, index)
+        # Points repeated from an earlier segment were forwarded with it
+        positions = points.owned_positions(segment, index)
+        if len(positions) < len(segment.x):
+            segment = segment.take(positions, segment.metadata)
+        segment.metadata[SEGMENT_METADATA_KEY] = {
+            "id": segment_id, "index": index, "count": count, "points": points.points
+        }
+        payload = encode_wrapper_message(segment)
+        if settings.HISTORY_ENABLED:
+            await history_service.append(segment)
+        if settings.LIVE_FEED_ENABLED:
+            live_feed.announce(plan.wrapper_id, payload)
+        with INGEST_STAGE_SECONDS.labels("publish").time():
+            await forward_collected([payload])
+
+    # The last segment holds the latest points and stands for the message in the cache
+    await cache_service.store_message(segment, payload)
+    logger.info(
+        f"Oversized message forwarded in {count} segments: wrapper_id={plan.wrapper_id}, points={points.points}"
+    )
+    await message.ack()
+    MESSAGES_SETTLED.labels(settings.DATA_QUEUE, "ack").inc()
+
+
+async def skip_duplicate(message: aio_pika.abc.AbstractIncomingMessage):
+    """Ack and skip a message whose body was recently ingested for the same wrapper.
+
+    Redelivered and retried messages are always processed, since their first
+    delivery may not have completed.
+    """
+    await message.ack()
+    DUPLICATES_SKIPPED.inc()
+    MESSAGES_SETTLED.labels(settings.DATA_QUEUE, "ack").inc()
+    logger.debug(f"Skipped duplicate message {message.delivery_tag}")
+
 
-@data_consumer(settings.DATA_QUEUE)
 async def handle_data_message(message: aio_pika.abc.AbstractIncomingMessage):
     """Handle incoming raw data messages from wrappers"""
     try:
-        # Parse raw message
-        raw_data = json.loads(message.body.decode())
-        
-        # Validate message
-        validated_message, validation_error = await validation_service.validate_message(raw_data)
+        await ingest_message(message)
+    except TRANSIENT_ERRORS as e:
+        logger.error(f"Connection error while processing message: {str(e)}")
+        await data_mq_client.retry_later(settings.DATA_QUEUE, [message], f"{type(e).__name__}: {e}")
+
+
+async def ingest_message(message: aio_pika.abc.AbstractIncomingMessage):
+    """Ingest one message, leaving transient failures to the caller to settle"""
+    dedup_keys = []
+    delta_wrapper_ids = []
+    if dedup_service is not None:
+        dedup_key, is_new = await dedup_service.claim(wrapper_shard_key(message) or "unknown", message.body)
+        if not is_new and not is_redelivery(message):
+            await skip_duplicate(message)
+            return
+        dedup_keys.append(dedup_key)
+
+    try:
+        if payload_segmenter is not None and payload_segmenter.applies_to(message.body):
+            plan = await payload_segmenter.plan(message.body)
+            if plan is not None:
+                await forward_segments(message, plan)
+                return
+
+        # Decode and validate message
+        validated_message, validation_error = await validation_service.validate_body(message.body)
         
         if validation_error:
             # Send validation error to services-mq
-            await services_mq_client.publish(
-                settings.VALIDATION_ERROR_QUEUE, 
-                validation_error.model_dump_json()
-            )
+            VALIDATION_ERRORS.labels(validation_error.error_type).inc()
+            await error_reporter.report([validation_error])
             logger.warning(f"Validation error for wrapper {validation_error.wrapper_id}: {validation_error.error_message}")
             await message.ack()
+            MESSAGES_SETTLED.labels(settings.DATA_QUEUE, "ack").inc()
             return
         
+        # Encode once for both the cache and the services queue
+        payload = encode_wrapper_message(validated_message)
+
         # Store validated message in cache
-        await cache_service.store_message(validated_message)
+        with INGEST_STAGE_SECONDS.labels("cache").time():
+            await cache_service.store_message(validated_message, payload)
+        if settings.HISTORY_ENABLED:
+            with INGEST_STAGE_SECONDS.labels("history").time():
+                await history_service.append(validated_message)
+        if settings.LIVE_FEED_ENABLED:
+            live_feed.announce(validated_message.wrapper_id, payload)
         
+        forwarded = [payload]
+        if delta_service is not None and delta_service.enabled_for(validated_message.wrapper_id):
+            delta_wrapper_ids.append(validated_message.wrapper_id)
+            with INGEST_STAGE_SECONDS.labels("delta").time():
+                forwarded = await delta_payloads([validated_message], forwarded, [is_redelivery(message)])
+
         # Forward validated message to services queue
-        await services_mq_client.publish(
-            settings.COLLECTED_DATA_QUEUE, 
-            validated_message.model_dump_json()
-        )
+        if forwarded:
+            with INGEST_STAGE_SECONDS.labels("publish").time():
+                await forward_collected(forwarded)
         
         logger.info(f"Message validated and forwarded: wrapper_id={validated_message.wrapper_id}")
         await message.ack()
+        MESSAGES_SETTLED.labels(settings.DATA_QUEUE, "ack").inc()
         
     except (json.JSONDecodeError, ValueError) as e:
         logger.error(f"Invalid message format: {str(e)}")
         await message.reject(requeue=False)
-    except (ConnectionError, TimeoutError) as e:
-        logger.error(f"Connection error while processing message: {str(e)}")
-        await message.nack(requeue=True)
\ No newline at end of file
+        MESSAGES_SETTLED.labels(settings.DATA_QUEUE, "reject").inc()
+    except Exception:
+        # Whoever settles the message schedules its retry, so it must not count as seen
+        await forget_attempt(dedup_keys, delta_wrapper_ids)
+        raise
+
+
+async def handle_data_batch(messages: List[aio_pika.abc.AbstractIncomingMessage]):
+    """Handle a batch of raw data messages in delivery order.
+
+    Runs of regular messages go through ``ingest_batch``; an oversized message
+    first flushes the run before it and is then segmented on its own, so no
+    message overtakes an earlier one of the same wrapper. Every message is settled
+    on its own, and when a run or an oversized message fails, it is retried together
+    with all the messages after it; on other errors the consumer retries exactly the
+    messages left unsettled, which are the same ones.
+    """
+    start = 0
+    try:
+        for index, message in enumerate(messages):
+            if payload_segmenter is not None and payload_segmenter.applies_to(message.body):
+                await ingest_batch(messages[start:index])
+                start = index
+                await ingest_message(message)
+                start = index + 1
+        await ingest_batch(messages[start:])
+    except TRANSIENT_ERRORS as e:
+        logger.error(f"Connection error while processing batch: {str(e)}")
+        await data_mq_client.retry_later(settings.DATA_QUEUE, messages[start:], f"{type(e).__name__}: {e}")
+
+
+async def ingest_batch(messages: List[aio_pika.abc.AbstractIncomingMessage]):
+    """Ingest regular messages with one Redis pipeline, acking each once all are stored and forwarded"""
+    if not messages:
+        return
+
+    dedup_keys = []
+    delta_wrapper_ids = []
+    if dedup_service is not None:
+        claims = await dedup_service.claim_many(
+            [(wrapper_shard_key(message) or "unknown", message.body) for message in messages]
+        )
+        fresh_messages = []
+        for message, (key, is_new) in zip(messages, claims):
+            if is_new or is_redelivery(message):
+                fresh_messages.append(message)
+                if is_new:
+                    dedup_keys.append(key)
+            else:
+                await skip_duplicate(message)
+        messages = fresh_messages
+
+    decoded_messages = []
+    decoded_items = []
+    for message in messages:
+        try:
+            decoded_items.append(validation_service.decode_body(message.body))
+            decoded_messages.append(message)
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"Invalid message format: {str(e)}")
+            await message.reject(requeue=False)
+            MESSAGES_SETTLED.labels(settings.DATA_QUEUE, "reject").inc()
+
+    if not decoded_messages:
+        return
+
+    try:
+        with INGEST_BATCH_STAGE_SECONDS.labels("validate").time():
+            results = await validation_service.validate_batch(decoded_items)
+        validated_messages = [validated for validated, _ in results if validated]
+        redelivered = [is_redelivery(message) for message, (validated, _) in zip(decoded_messages, results) if validated]
+        payloads = [encode_wrapper_message(validated) for validated in validated_messages]
+        with INGEST_BATCH_STAGE_SECONDS.labels("cache").time():
+            async with redis_client.pipeline(transaction=False) as pipe:
+                cache_service.store_messages(validated_messages, pipe, payloads)
+                if settings.HISTORY_ENABLED:
+                    for validated in validated_messages:
+                        await history_service.append(validated, pipe)
+                if settings.LIVE_FEED_ENABLED:
+                    live_feed.announce_many(pipe, (validated.wrapper_id for validated in validated_messages), payloads)
+                await pipe.execute()
+            if settings.HISTORY_ENABLED:
+                await history_service.downsample_messages(validated_messages)
+
+        forwarded = payloads
+        if delta_service is not None:
+            delta_wrapper_ids = [
+                validated.wrapper_id for validated in validated_messages if delta_service.enabled_for(validated.wrapper_id)
+            ]
+            if delta_wrapper_ids:
+                with INGEST_BATCH_STAGE_SECONDS.labels("delta").time():
+                    forwarded = await delta_payloads(validated_messages, payloads, redelivered)
+
+        validation_errors = [error for _, error in results if error]
+        with INGEST_BATCH_STAGE_SECONDS.labels("publish").time():
+            await asyncio.gather(
+                error_reporter.report(validation_errors),
+                forward_collected(forwarded),
+            )
+
+        for error in validation_errors:
+            VALIDATION_ERRORS.labels(error.error_type).inc()
+            logger.warning(f"Validation error for wrapper {error.wrapper_id}: {error.error_message}")
+        logger.info(
+            f"Batch processed: {len(validated_messages)} forwarded, {len(validation_errors)} rejected"
+        )
+        # One ack per message: a multiple ack would leave the earlier ones looking unsettled
+        for message in decoded_messages:
+            await message.ack()
+        MESSAGES_SETTLED.labels(settings.DATA_QUEUE, "ack").inc(len(decoded_messages))
+
+    except Exception:
+        # Whoever settles the messages schedules their retry, so they must not count as seen
+        await forget_attempt(dedup_keys, delta_wrapper_ids)
+        raise
+
+
+if settings.DATA_BATCH_SIZE > 1:
+    data_batch_consumer(settings.DATA_QUEUE, settings.DATA_BATCH_SIZE, settings.DATA_BATCH_LINGER_MS)(handle_data_batch)
+else:
+    data_consumer(settings.DATA_QUEUE, shard_key=wrapper_shard_key)(handle_data_message)
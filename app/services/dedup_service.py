@@ -0,0 +1,103 @@
+import logging
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from config import settings
+from dependencies.redis import redis_client
+
+
+logger = logging.getLogger(__name__)
+
+DEDUP_PREFIX = "dedup:"
+
+
+class DedupService:
+    """Recognizes message bodies already ingested for a wrapper within a time window.
+
+    A message is claimed by the hash of its raw body under its wrapper_id, first in
+    a bounded in-process LRU and, with ``use_redis``, with SET NX PX so replicas and
+    worker processes share the window. Claims of messages that fail and are
+    requeued are released so that the retry is processed. Redis errors fail open:
+    the message is treated as new.
+    """
+
+    def __init__(self, max_size: int, ttl: float, use_redis: bool) -> None:
+        self._redis = redis_client
+        self._dedup_prefix = DEDUP_PREFIX
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        # In milliseconds, so a sub-second TTL does not become an expiry of 0, which Redis rejects
+        self._ttl_ms = max(1, round(ttl * 1000))
+        self._use_redis = use_redis
+
+    def _key(self, wrapper_id: str, body: bytes) -> str:
+        return f"{self._dedup_prefix}{wrapper_id}:{blake2b(body, digest_size=16).hexdigest()}"
+
+    def _claim_local(self, key: str, now: float) -> bool:
+        expires = self._entries.get(key)
+        if expires is not None and expires >= now:
+            return False
+        self._entries[key] = now + self._ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+        return True
+
+    async def claim(self, wrapper_id: str, body: bytes) -> Tuple[str, bool]:
+        """Claim a message body; returns its key and False when it is a duplicate."""
+        key = self._key(wrapper_id, body)
+        if not self._claim_local(key, time.monotonic()):
+            return key, False
+        if self._use_redis:
+            try:
+                if not await self._redis.set(key, 1, nx=True, px=self._ttl_ms):
+                    return key, False
+            except RedisError as e:
+                logger.warning(f"Dedup claim failed, processing message anyway: {e}")
+        return key, True
+
+    async def claim_many(self, items: List[Tuple[str, bytes]]) -> List[Tuple[str, bool]]:
+        """Claim several ``(wrapper_id, body)`` pairs with at most one Redis round trip."""
+        now = time.monotonic()
+        results = []
+        for wrapper_id, body in items:
+            key = self._key(wrapper_id, body)
+            results.append((key, self._claim_local(key, now)))
+
+        pending = [index for index, (_, is_new) in enumerate(results) if is_new]
+        if self._use_redis and pending:
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for index in pending:
+                        pipe.set(results[index][0], 1, nx=True, px=self._ttl_ms)
+                    claimed = await pipe.execute()
+                for index, was_set in zip(pending, claimed):
+                    if not was_set:
+                        results[index] = (results[index][0], False)
+            except RedisError as e:
+                logger.warning(f"Dedup claim failed, processing batch anyway: {e}")
+        return results
+
+    async def release(self, *keys: str) -> None:
+        """Forget claims of messages that are going to be redelivered."""
+        for key in keys:
+            self._entries.pop(key, None)
+        if self._use_redis and keys:
+            try:
+                await self._redis.delete(*keys)
+            except RedisError as e:
+                logger.warning(f"Dedup release failed, retries may be skipped until the claim expires: {e}")
+
+
+dedup_service: Optional[DedupService] = None
+if settings.DEDUP_ENABLED:
+    dedup_service = DedupService(
+        max_size=settings.DEDUP_CACHE_SIZE,
+        ttl=settings.DEDUP_TTL_SECONDS,
+        use_redis=settings.DEDUP_REDIS_ENABLED,
+    )
@@ -0,0 +1,151 @@
+import logging
+from typing import Any, List, Optional, Sequence
+
+from redis.exceptions import RedisError
+
+from config import settings
+from dependencies.redis import redis_client
+from schemas.columnar import ColumnarWrapperMessage
+from schemas.wrapper_message import WrapperMessage
+from services.serialization import dumps
+
+
+logger = logging.getLogger(__name__)
+
+X_INDEX_PREFIX = "wrapper_x_index:"
+# Metadata entry added to forwarded deltas: {"total_points": N, "new_points": n}
+DELTA_METADATA_KEY = "collector_delta"
+
+# Compares a message's points with the wrapper's previous message and replaces the
+# stored index with the new points.
+# KEYS: x index hash. ARGV: ttl seconds, then x/y pairs.
+# Returns the 0-based positions of points that are new or whose y changed.
+DIFF_POINTS_SCRIPT = """
+local key = KEYS[1]
+local changed = {}
+local known = redis.call('EXISTS', key) == 1
+for i = 2, #ARGV, 2 do
+    if not known or redis.call('HGET', key, ARGV[i]) ~= ARGV[i + 1] then
+        changed[#changed + 1] = (i - 2) / 2
+    end
+end
+redis.call('DEL', key)
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', key, ARGV[i], ARGV[i + 1])
+end
+if #ARGV > 1 then
+    redis.call('EXPIRE', key, ARGV[1])
+end
+return changed
+"""
+
+Message = WrapperMessage | ColumnarWrapperMessage
+
+
+def x_field(x: Any) -> bytes:
+    """Return the index field of an X value; equal numbers such as 1 and 1.0 share one."""
+    if isinstance(x, float) and x.is_integer() and abs(x) < 2 ** 63:
+        x = int(x)
+    return dumps(x)
+
+
+class DeltaService:
+    """Reduces messages of opted-in wrappers to the points they did not send last time.
+
+    Each wrapper's previous points are kept in a hash of X to Y next to its last
+    message. A message is diffed against it and the hash replaced in one script
+    call, so the forwarded delta holds only new X values and X values whose Y
+    changed, with ``collector_delta`` metadata. Messages with nothing new are not
+    forwarded at all. The first message of a wrapper, and any redelivered message,
+    is forwarded in full.
+    """
+
+    def __init__(self, wrapper_ids: str, ttl: int) -> None:
+        self._redis = redis_client
+        self._index_prefix = X_INDEX_PREFIX
+        self._diff_script = self._redis.register_script(DIFF_POINTS_SCRIPT)
+        ids = {wrapper_id.strip() for wrapper_id in wrapper_ids.split(",") if wrapper_id.strip()}
+        self._all_wrappers = "*" in ids
+        self._wrapper_ids = ids - {"*"}
+        self._ttl = ttl
+
+    def enabled_for(self, wrapper_id: str) -> bool:
+        return self._all_wrappers or wrapper_id in self._wrapper_ids
+
+    def _key(self, wrapper_id: str) -> str:
+        return f"{self._index_prefix}{wrapper_id}"
+
+    def _script_args(self, message: Message) -> List[Any]:
+        if isinstance(message, ColumnarWrapperMessage):
+            points = zip(message.x, message.y)
+        else:
+            points = ((point.x, point.y) for point in message.data)
+        args: List[Any] = [self._ttl]
+        for x, y in points:
+            args.append(x_field(x))
+            args.append(repr(float(y)))
+        return args
+
+    def _take(self, message: Message, positions: Sequence[int]) -> Message:
+        metadata = {
+            **message.metadata,
+            DELTA_METADATA_KEY: {"total_points": len(message.data), "new_points": len(positions)},
+        }
+        if isinstance(message, ColumnarWrapperMessage):
+            return message.take(positions, metadata)
+        return WrapperMessage.model_construct(
+            wrapper_id=message.wrapper_id,
+            data=[message.data[position] for position in positions],
+            metadata=metadata,
+        )
+
+    def _result(self, message: Message, changed: List[int], full: bool) -> Optional[Message]:
+        if full:
+            return message
+        if not changed:
+            return None
+        return self._take(message, [int(position) for position in changed])
+
+    async def delta(self, message: Message, full: bool = False) -> Optional[Message]:
+        """Return the message to forward for ``message``, or None when nothing changed.
+
+        With ``full`` the index is still updated but the whole message is returned.
+        """
+        changed = await self._diff_script(keys=[self._key(message.wrapper_id)], args=self._script_args(message))
+        return self._result(message, changed, full)
+
+    async def deltas(self, messages: List[Message], full: Sequence[bool]) -> List[Optional[Message]]:
+        """Like ``delta`` for a batch, with one Redis round trip for the opted-in messages.
+
+        Messages of wrappers that did not opt in are returned unchanged.
+        """
+        results: List[Optional[Message]] = list(messages)
+        pending = [index for index, message in enumerate(messages) if self.enabled_for(message.wrapper_id)]
+        if not pending:
+            return results
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for index in pending:
+                message = messages[index]
+                await self._diff_script(
+                    keys=[self._key(message.wrapper_id)], args=self._script_args(message), client=pipe
+                )
+            changed_lists = await pipe.execute()
+        for index, changed in zip(pending, changed_lists):
+            results[index] = self._result(messages[index], changed, full[index])
+        return results
+
+    async def reset(self, wrapper_ids: Sequence[str]) -> None:
+        """Forget the points of wrappers whose delta was not forwarded, so their next message goes out in full."""
+        keys = {self._key(wrapper_id) for wrapper_id in wrapper_ids if self.enabled_for(wrapper_id)}
+        if not keys:
+            return
+        try:
+            await self._redis.delete(*keys)
+        except RedisError as e:
+            logger.warning(f"Could not reset delta index, the next delta may miss points: {e}")
+
+
+delta_service: Optional[DeltaService] = None
+if settings.DELTA_FORWARDING_WRAPPERS:
+    delta_service = DeltaService(settings.DELTA_FORWARDING_WRAPPERS, settings.DELTA_INDEX_TTL_SECONDS)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import zlib
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from dependencies.rabbitmq import RabbitMQClient
+from services.serialization import loads
+
+
+logger = logging.getLogger(__name__)
+
+ENVELOPE_COUNT_HEADER = "x-envelope-count"
+ENVELOPE_ENCODING_HEADER = "x-envelope-encoding"
+ENCODING_JSON = "json"
+ENCODING_JSON_ZLIB = "json+zlib"
+
+
+def pack_envelope(payloads: List[bytes], compress: bool = False) -> Tuple[bytes, Dict[str, Any]]:
+    """Pack encoded messages into one envelope body (a JSON array) and its AMQP headers."""
+    body = b"[" + b",".join(payloads) + b"]"
+    encoding = ENCODING_JSON
+    if compress:
+        body = zlib.compress(body)
+        encoding = ENCODING_JSON_ZLIB
+    return body, {ENVELOPE_COUNT_HEADER: len(payloads), ENVELOPE_ENCODING_HEADER: encoding}
+
+
+def unpack_envelope(body: bytes, headers: Optional[Mapping[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Return the messages carried by a collected data message, enveloped or not.
+
+    Consumers pass the AMQP body and headers; a message without envelope headers
+    is returned as a single-item list.
+    """
+    headers = headers or {}
+    if ENVELOPE_COUNT_HEADER not in headers:
+        return [loads(body)]
+
+    encoding = headers.get(ENVELOPE_ENCODING_HEADER, ENCODING_JSON)
+    if encoding == ENCODING_JSON_ZLIB:
+        body = zlib.decompress(body)
+    elif encoding != ENCODING_JSON:
+        raise ValueError(f"Unsupported envelope encoding '{encoding}'")
+
+    messages = loads(body)
+    if len(messages) != headers[ENVELOPE_COUNT_HEADER]:
+        raise ValueError(
+            f"Envelope declares {headers[ENVELOPE_COUNT_HEADER]} messages but contains {len(messages)}"
+        )
+    return messages
+
+
+class _Envelope:
+    __slots__ = ("payloads", "size", "confirmed")
+
+    def __init__(self, confirmed: asyncio.Future) -> None:
+        self.payloads: List[bytes] = []
+        self.size = 0
+        self.confirmed = confirmed
+
+
+class EnvelopeWriter:
+    """Buffers encoded messages for a queue and publishes them as envelopes.
+
+    An envelope is flushed when it reaches ``max_messages`` or ``max_bytes``, or
+    ``linger`` seconds after its first message was added. ``add_many`` returns once
+    every envelope carrying the given messages is confirmed by the broker, so
+    callers ack their inputs afterwards exactly as they would after a publish.
+    """
+
+    def __init__(
+        self,
+        client: RabbitMQClient,
+        queue_name: str,
+        max_messages: int,
+        max_bytes: int,
+        linger: float,
+        compress: bool = False,
+    ) -> None:
+        self._client = client
+        self._queue_name = queue_name
+        self._max_messages = max_messages
+        self._max_bytes = max_bytes
+        self._linger = linger
+        self._compress = compress
+        self._current: Optional[_Envelope] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def add_many(self, payloads: List[bytes]) -> None:
+        """Add encoded messages and wait until the envelopes carrying them are confirmed."""
+        if not payloads:
+            return
+        loop = asyncio.get_running_loop()
+        waiting: List[asyncio.Future] = []
+        for payload in payloads:
+            if self._current is None:
+                self._current = _Envelope(loop.create_future())
+                self._timer = loop.call_later(self._linger, self._flush_current)
+            envelope = self._current
+            envelope.payloads.append(payload)
+            envelope.size += len(payload)
+            if not waiting or waiting[-1] is not envelope.confirmed:
+                waiting.append(envelope.confirmed)
+            if len(envelope.payloads) >= self._max_messages or envelope.size >= self._max_bytes:
+                self._flush_current()
+        await asyncio.gather(*waiting)
+
+    async def add(self, payload: bytes) -> None:
+        await self.add_many([payload])
+
+    def _flush_current(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        envelope, self._current = self._current, None
+        if envelope is None:
+            return
+        task = asyncio.create_task(self._publish(envelope))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _publish(self, envelope: _Envelope) -> None:
+        body, headers = pack_envelope(envelope.payloads, self._compress)
+        try:
+            await self._client.publish(self._queue_name, body, headers=headers)
+            logger.debug(f"Published envelope of {len(envelope.payloads)} messages to '{self._queue_name}'")
+            envelope.confirmed.set_result(None)
+        except Exception as e:
+            envelope.confirmed.set_exception(e)
+
+    async def close(self) -> None:
+        """Publish the partially filled envelope and wait for outstanding envelopes."""
+        self._flush_current()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from hashlib import blake2b
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from dependencies.metrics import VALIDATION_ERRORS_SUPPRESSED
+from dependencies.rabbitmq import RabbitMQClient, services_mq_client
+from schemas.wrapper_message import ValidationError, ValidationErrorSummary
+from services.serialization import dumps
+
+
+logger = logging.getLogger(__name__)
+
+# Wrappers beyond the group limit of a window are summarized under this wrapper_id
+OVERFLOW_WRAPPER_ID = "*"
+
+
+def bound_original_data(error: ValidationError, max_bytes: int, sample_points: int) -> ValidationError:
+    """Return the error with the size and hash of its original data, sampled when over ``max_bytes``.
+
+    The sample keeps every top-level field but ``data``, of which only the first
+    ``sample_points`` points remain; if that is still too large only wrapper_id is kept.
+    """
+    original = error.original_data
+    encoded = dumps(original)
+    update: Dict[str, Any] = {
+        "original_size": len(encoded),
+        "original_hash": blake2b(encoded, digest_size=16).hexdigest(),
+    }
+    if max_bytes > 0 and len(encoded) > max_bytes:
+        sample = {key: value for key, value in original.items() if key != "data"}
+        if isinstance(original.get("data"), list):
+            sample["data"] = original["data"][:sample_points]
+        if len(dumps(sample)) > max_bytes:
+            sample = {"wrapper_id": error.wrapper_id}
+        update["original_data"] = sample
+        update["original_truncated"] = True
+    return error.model_copy(update=update)
+
+
+def _utc(timestamp: datetime) -> datetime:
+    # ValidationError timestamps are naive UTC
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+
+class _ErrorGroup:
+    __slots__ = ("count", "published", "first_seen", "last_seen", "last_error_message")
+
+    def __init__(self, error: ValidationError) -> None:
+        self.count = 0
+        self.published = 0
+        self.first_seen = error.timestamp
+        self.last_seen = error.timestamp
+        self.last_error_message = error.error_message
+
+
+class ErrorReporter:
+    """Publishes validation errors with bounded size and rate, and summarizes them per window.
+
+    Errors are grouped by wrapper_id and error type over ``window`` seconds. Each
+    wrapper gets at most ``wrapper_limit`` errors published individually per window,
+    with their original data bounded by ``bound_original_data``; the others are
+    only counted. When a window closes one summary per group goes to
+    ``summary_queue``, so a wrapper sending broken messages at a high rate costs a
+    few messages per window instead of one per failure.
+    """
+
+    def __init__(
+        self,
+        client: RabbitMQClient,
+        queue_name: str,
+        summary_queue: str,
+        window: float,
+        wrapper_limit: int,
+        max_original_bytes: int,
+        sample_points: int,
+        max_groups: int = 10000,
+    ) -> None:
+        self._client = client
+        self._queue_name = queue_name
+        self._summary_queue = summary_queue
+        self._window = window
+        self._wrapper_limit = wrapper_limit
+        self._max_original_bytes = max_original_bytes
+        self._sample_points = sample_points
+        self._max_groups = max_groups
+        self._groups: Dict[Tuple[str, str], _ErrorGroup] = {}
+        self._published_by_wrapper: Dict[str, int] = {}
+        self._window_start = datetime.now(timezone.utc)
+        self._task: Optional[asyncio.Task] = None
+
+    def _admit(self, error: ValidationError) -> bool:
+        """Count an error in its group and tell whether it may be published individually."""
+        key = (error.wrapper_id, error.error_type)
+        group = self._groups.get(key)
+        if group is None:
+            if len(self._groups) >= self._max_groups:
+                key = (OVERFLOW_WRAPPER_ID, error.error_type)
+                group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _ErrorGroup(error)
+        group.count += 1
+        group.last_seen = error.timestamp
+        group.last_error_message = error.error_message
+
+        published = self._published_by_wrapper.get(error.wrapper_id, 0)
+        if self._wrapper_limit and published >= self._wrapper_limit:
+            VALIDATION_ERRORS_SUPPRESSED.labels(error.error_type).inc()
+            return False
+        self._published_by_wrapper[error.wrapper_id] = published + 1
+        group.published += 1
+        return True
+
+    async def report(self, errors: List[ValidationError]) -> None:
+        """Publish the errors the per-wrapper limit admits and count all of them for the summaries."""
+        payloads = [
+            bound_original_data(error, self._max_original_bytes, self._sample_points).model_dump_json()
+            for error in errors
+            if self._admit(error)
+        ]
+        if payloads:
+            await self._client.publish_many(self._queue_name, payloads)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._window)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Close the current window and publish its summaries."""
+        groups, self._groups = self._groups, {}
+        self._published_by_wrapper = {}
+        window_start, self._window_start = self._window_start, datetime.now(timezone.utc)
+        if not groups:
+            return
+
+        summaries = [
+            ValidationErrorSummary(
+                wrapper_id=wrapper_id,
+                error_type=error_type,
+                count=group.count,
+                published=group.published,
+                first_seen=_utc(group.first_seen),
+                last_seen=_utc(group.last_seen),
+                window_start=window_start,
+                window_end=self._window_start,
+                last_error_message=group.last_error_message,
+            ).model_dump_json()
+            for (wrapper_id, error_type), group in groups.items()
+        ]
+        try:
+            await self._client.publish_many(self._summary_queue, summaries)
+        except Exception as e:
+            logger.warning(f"Could not publish {len(summaries)} validation error summaries: {e}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+error_reporter = ErrorReporter(
+    services_mq_client,
+    settings.VALIDATION_ERROR_QUEUE,
+    settings.VALIDATION_ERROR_SUMMARY_QUEUE,
+    window=settings.VALIDATION_ERROR_WINDOW_SECONDS,
+    wrapper_limit=settings.VALIDATION_ERROR_WRAPPER_LIMIT,
+    max_original_bytes=settings.VALIDATION_ERROR_MAX_ORIGINAL_BYTES,
+    sample_points=settings.VALIDATION_ERROR_SAMPLE_POINTS,
+)
@@ -0,0 +1,249 @@
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from redis.asyncio.client import Pipeline
+
+from config import settings
+from dependencies.redis import redis_client
+from schemas.columnar import ColumnarWrapperMessage
+from schemas.wrapper_message import WrapperMessage, XValueType
+from services.serialization import dumps
+from services.validation_service import detect_x_type
+
+
+HISTORY_PREFIX = "wrapper_history:"
+HISTORY_SEQUENCE_PREFIX = "wrapper_history_seq:"
+
+# Members are a hex sequence number from the wrapper's sequence key, ':' and the point's
+# JSON, so equal points stored at different times stay distinct. Members written
+# before the sequence number was added are the JSON alone.
+
+# Appends points to a wrapper's history sorted set and applies retention.
+# KEYS: history key, sequence key. ARGV: max points (0 = unlimited), oldest score to
+# keep ('-inf' = no age limit), '1' to replace points sharing a score, then score/point
+# JSON pairs. Returns the number of points kept.
+APPEND_HISTORY_SCRIPT = """
+local key = KEYS[1]
+local replace = ARGV[3] == '1'
+local seq = redis.call('INCRBY', KEYS[2], (#ARGV - 3) / 2) - (#ARGV - 3) / 2
+for i = 4, #ARGV, 2 do
+    if replace then
+        redis.call('ZREMRANGEBYSCORE', key, ARGV[i], ARGV[i])
+    end
+    seq = seq + 1
+    redis.call('ZADD', key, ARGV[i], string.format('%x:', seq) .. ARGV[i + 1])
+end
+if ARGV[2] ~= '-inf' then
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', '(' .. ARGV[2])
+end
+local max_points = tonumber(ARGV[1])
+if max_points > 0 then
+    redis.call('ZREMRANGEBYRANK', key, 0, -max_points - 1)
+end
+return redis.call('ZCARD', key)
+"""
+
+# Averages the points scored in [start, cutoff) into fixed time buckets in one atomic
+# call, so concurrent runs of several processes cannot lose or double points.
+# KEYS: history key, sequence key. ARGV: start score, cutoff score, bucket seconds.
+# Returns the number of buckets written.
+DOWNSAMPLE_HISTORY_SCRIPT = """
+local function iso_utc(timestamp)
+    local days = math.floor(timestamp / 86400)
+    local seconds = timestamp - days * 86400
+    local z = days + 719468
+    local era = math.floor(z / 146097)
+    local doe = z - era * 146097
+    local yoe = math.floor((doe - math.floor(doe / 1460) + math.floor(doe / 36524) - math.floor(doe / 146096)) / 365)
+    local doy = doe - (365 * yoe + math.floor(yoe / 4) - math.floor(yoe / 100))
+    local mp = math.floor((5 * doy + 2) / 153)
+    local day = doy - math.floor((153 * mp + 2) / 5) + 1
+    local month = mp < 10 and mp + 3 or mp - 9
+    local year = yoe + era * 400 + (month <= 2 and 1 or 0)
+    return string.format('%04d-%02d-%02dT%02d:%02d:%02d+00:00', year, month, day,
+        math.floor(seconds / 3600), math.floor(seconds % 3600 / 60), seconds % 60)
+end
+
+local key = KEYS[1]
+local members = redis.call('ZRANGEBYSCORE', key, ARGV[1], '(' .. ARGV[2], 'WITHSCORES')
+if #members == 0 then
+    return 0
+end
+local bucket_size = tonumber(ARGV[3])
+local totals, counts, buckets = {}, {}, {}
+for i = 1, #members, 2 do
+    local point = cjson.decode(string.match(members[i], '^%x+:(.*)$') or members[i])
+    local count = point['n'] or 1
+    local bucket = math.floor(tonumber(members[i + 1]) / bucket_size) * bucket_size
+    if not totals[bucket] then
+        totals[bucket], counts[bucket] = 0, 0
+        buckets[#buckets + 1] = bucket
+    end
+    totals[bucket] = totals[bucket] + point['y'] * count
+    counts[bucket] = counts[bucket] + count
+end
+
+redis.call('ZREMRANGEBYSCORE', key, ARGV[1], '(' .. ARGV[2])
+local seq = redis.call('INCRBY', KEYS[2], #buckets) - #buckets
+for _, bucket in ipairs(buckets) do
+    seq = seq + 1
+    local mean = totals[bucket] / counts[bucket]
+    -- The shortest of these that reads back as the same double
+    local y = string.format('%.15g', mean)
+    if tonumber(y) ~= mean then
+        y = string.format('%.16g', mean)
+        if tonumber(y) ~= mean then
+            y = string.format('%.17g', mean)
+        end
+    end
+    redis.call('ZADD', key, string.format('%d', bucket),
+        string.format('%x:{"x":"%s","y":%s,"n":%d}', seq, iso_utc(bucket), y, counts[bucket]))
+end
+return #buckets
+"""
+
+
+def _datetime_score(x_value: str) -> float:
+    parsed = datetime.fromisoformat(x_value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def point_json(member: str) -> str:
+    """Return the point JSON of a history member, without its sequence number."""
+    return member if member.startswith("{") else member.partition(":")[2]
+
+
+def parse_bound(value: Optional[str]) -> Optional[float]:
+    """Convert a range bound (number or ISO datetime) to a history score."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return _datetime_score(value)
+
+
+class HistoryService:
+    """Service for per-wrapper time-ordered history of validated data points.
+
+    Each wrapper's points live in a sorted set scored by X: the value itself for
+    numbers, the UTC timestamp for datetimes, and the arrival time for category
+    strings (which have no order of their own). For numbers and datetimes a new
+    point replaces any stored point with the same X.
+    """
+
+    def __init__(self) -> None:
+        self._redis = redis_client
+        self._history_prefix = HISTORY_PREFIX
+        self._sequence_prefix = HISTORY_SEQUENCE_PREFIX
+        self._append_script = self._redis.register_script(APPEND_HISTORY_SCRIPT)
+        self._downsample_script = self._redis.register_script(DOWNSAMPLE_HISTORY_SCRIPT)
+        self._last_downsample: Dict[str, float] = {}
+
+    def _key(self, wrapper_id: str) -> str:
+        return f"{self._history_prefix}{wrapper_id}"
+
+    def _keys(self, wrapper_id: str) -> List[str]:
+        return [self._key(wrapper_id), f"{self._sequence_prefix}{wrapper_id}"]
+
+    def _points(self, message: WrapperMessage | ColumnarWrapperMessage) -> Iterator[Tuple[Any, float]]:
+        if isinstance(message, ColumnarWrapperMessage):
+            return zip(message.x, message.y)
+        return ((point.x, point.y) for point in message.data)
+
+    def _script_args(self, message: WrapperMessage | ColumnarWrapperMessage, x_type: XValueType) -> List[Any]:
+        now = time.time()
+        oldest = "-inf"
+        if x_type == XValueType.DATETIME and settings.HISTORY_MAX_AGE_SECONDS > 0:
+            oldest = repr(now - settings.HISTORY_MAX_AGE_SECONDS)
+
+        args: List[Any] = [settings.HISTORY_MAX_POINTS, oldest, "0" if x_type == XValueType.STRING else "1"]
+        for index, (x, y) in enumerate(self._points(message)):
+            if x_type == XValueType.NUMBER:
+                score = float(x)
+            elif x_type == XValueType.DATETIME:
+                score = _datetime_score(x)
+            else:
+                # Keep the message order among points that arrived together
+                score = now + index * 1e-6
+            args.append(repr(score))
+            args.append(dumps({"x": x, "y": y}))
+        return args
+
+    async def append(
+        self, message: WrapperMessage | ColumnarWrapperMessage, pipe: Optional[Pipeline] = None
+    ) -> None:
+        """Append a validated message's points to its wrapper history.
+
+        With ``pipe`` the write is only queued on the pipeline.
+        """
+        if not message.data:
+            return
+
+        x_type = detect_x_type(message.data[0].x)
+        await self._append_script(
+            keys=self._keys(message.wrapper_id),
+            args=self._script_args(message, x_type),
+            client=pipe or self._redis,
+        )
+        if x_type == XValueType.DATETIME and pipe is None:
+            await self.downsample_if_due(message.wrapper_id)
+
+    async def downsample_messages(self, messages: List[WrapperMessage | ColumnarWrapperMessage]) -> None:
+        """Run due downsampling for the datetime-keyed wrappers of messages appended through a pipeline."""
+        latest_by_wrapper = {message.wrapper_id: message for message in messages if message.data}
+        for wrapper_id, message in latest_by_wrapper.items():
+            if detect_x_type(message.data[0].x) == XValueType.DATETIME:
+                await self.downsample_if_due(wrapper_id)
+
+    async def downsample_if_due(self, wrapper_id: str) -> None:
+        """Average points older than HISTORY_DOWNSAMPLE_AFTER_SECONDS into fixed time buckets.
+
+        Runs at most once per HISTORY_DOWNSAMPLE_INTERVAL_SECONDS per wrapper and only
+        revisits points that became old since the previous run in this process.
+        """
+        if settings.HISTORY_DOWNSAMPLE_AFTER_SECONDS <= 0:
+            return
+        now = time.time()
+        previous_run = self._last_downsample.get(wrapper_id)
+        if previous_run is not None and now - previous_run < settings.HISTORY_DOWNSAMPLE_INTERVAL_SECONDS:
+            return
+
+        cutoff = now - settings.HISTORY_DOWNSAMPLE_AFTER_SECONDS
+        self._last_downsample[wrapper_id] = now
+        bucket_size = settings.HISTORY_DOWNSAMPLE_BUCKET_SECONDS
+        # Start at a bucket boundary so partially compacted buckets are recomputed whole
+        start = "-inf"
+        if previous_run is not None:
+            previous_cutoff = previous_run - settings.HISTORY_DOWNSAMPLE_AFTER_SECONDS
+            start = repr(previous_cutoff // bucket_size * bucket_size)
+        await self._downsample_script(
+            keys=self._keys(wrapper_id), args=[start, repr(cutoff), bucket_size], client=self._redis
+        )
+
+    async def get_history_json(
+        self,
+        wrapper_id: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: int = 1000,
+        offset: int = 0,
+    ) -> bytes:
+        """Return a page of history points as a JSON document, without decoding stored points."""
+        members = await self._redis.zrangebyscore(
+            self._key(wrapper_id),
+            "-inf" if start is None else repr(start),
+            "+inf" if end is None else repr(end),
+            start=offset,
+            num=limit + 1,
+        )
+        next_offset = offset + limit if len(members) > limit else None
+        points = ",".join(point_json(member) for member in members[:limit])
+        return (
+            b'{"wrapper_id":' + dumps(wrapper_id)
+            + b',"points":[' + points.encode()
+            + b'],"next_offset":' + dumps(next_offset) + b"}"
+        )
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError
+
+from config import settings
+from dependencies.metrics import LIVE_FEED_SKIPPED
+from dependencies.redis import redis_binary_client
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """Bounded buffer of encoded messages for one live connection.
+
+    When the buffer is full the oldest message is dropped, so a slow client sees
+    the most recent data and never holds up the fan-out.
+    """
+
+    def __init__(self, wrapper_ids: Optional[Set[str]], buffer_size: int) -> None:
+        self.wrapper_ids = wrapper_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, payload: bytes) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class LiveFeed:
+    """Pushes validated messages to live subscribers of every replica through Redis pub/sub.
+
+    Ingesting processes publish ``wrapper_id`` and the encoded message on one
+    channel; processes with subscribers listen on it and fan each message out to
+    the matching subscriber buffers.
+
+    Nothing is published while the channel had no subscribers at the last count,
+    taken at most every ``listener_check_interval`` seconds, and at most
+    ``max_in_flight`` single-message publishes wait for Redis at a time.
+    """
+
+    def __init__(
+        self, channel: str, buffer_size: int, max_in_flight: int, listener_check_interval: float
+    ) -> None:
+        self._redis = redis_binary_client
+        self._channel = channel
+        self._buffer_size = buffer_size
+        self._max_in_flight = max_in_flight
+        self._listener_check_interval = listener_check_interval
+        self._listeners = 0
+        self._listeners_checked_at = float("-inf")
+        self._listener_check: Optional[asyncio.Task] = None
+        self._by_wrapper: Dict[str, Set[Subscriber]] = {}
+        self._unfiltered: Set[Subscriber] = set()
+        self._listener: Optional[asyncio.Task] = None
+        self._announcements: Set[asyncio.Task] = set()
+        self.delivered = 0
+
+    def _frame(self, wrapper_id: str, payload: bytes) -> bytes:
+        return wrapper_id.encode() + b"\n" + payload
+
+    def _listening(self) -> bool:
+        """Tell whether any process listened at the last count, starting a new count when it is stale."""
+        now = time.monotonic()
+        if now - self._listeners_checked_at >= self._listener_check_interval:
+            self._listeners_checked_at = now
+            if self._listener_check is None or self._listener_check.done():
+                self._listener_check = asyncio.create_task(self._count_listeners())
+        return self._listeners > 0
+
+    async def _count_listeners(self) -> None:
+        try:
+            counts = await self._redis.pubsub_numsub(self._channel)
+        except RedisError as e:
+            logger.warning(f"Could not count live feed subscribers: {e}")
+            return
+        self._listeners = int(counts[0][1]) if counts else 0
+
+    def announce(self, wrapper_id: str, payload: bytes) -> None:
+        """Publish a validated message without making the caller wait for Redis."""
+        if not self._listening():
+            LIVE_FEED_SKIPPED.labels("no_listeners").inc()
+            return
+        if len(self._announcements) >= self._max_in_flight:
+            LIVE_FEED_SKIPPED.labels("in_flight").inc()
+            return
+        task = asyncio.create_task(self._redis.publish(self._channel, self._frame(wrapper_id, payload)))
+        self._announcements.add(task)
+        task.add_done_callback(self._on_announced)
+
+    def _on_announced(self, task: asyncio.Task) -> None:
+        self._announcements.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Could not publish to live feed: {task.exception()}")
+
+    def announce_many(self, pipe: Pipeline, wrapper_ids: Iterable[str], payloads: Iterable[bytes]) -> None:
+        """Queue live feed publishes for a batch on an existing pipeline."""
+        if not self._listening():
+            LIVE_FEED_SKIPPED.labels("no_listeners").inc()
+            return
+        for wrapper_id, payload in zip(wrapper_ids, payloads):
+            pipe.publish(self._channel, self._frame(wrapper_id, payload))
+
+    def subscribe(self, wrapper_ids: Optional[List[str]] = None) -> Subscriber:
+        subscriber = Subscriber(set(wrapper_ids) if wrapper_ids else None, self._buffer_size)
+        if subscriber.wrapper_ids is None:
+            self._unfiltered.add(subscriber)
+        else:
+            for wrapper_id in subscriber.wrapper_ids:
+                self._by_wrapper.setdefault(wrapper_id, set()).add(subscriber)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        # Count again on the next publish instead of waiting out the interval
+        self._listeners_checked_at = float("-inf")
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._unfiltered.discard(subscriber)
+        for wrapper_id in subscriber.wrapper_ids or ():
+            subscribers = self._by_wrapper.get(wrapper_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_wrapper[wrapper_id]
+
+    def dispatch(self, frame: bytes) -> None:
+        wrapper_id, _, payload = frame.partition(b"\n")
+        for subscriber in self._unfiltered:
+            subscriber.offer(payload)
+            self.delivered += 1
+        for subscriber in self._by_wrapper.get(wrapper_id.decode(), ()):
+            subscriber.offer(payload)
+            self.delivered += 1
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self._channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.dispatch(message["data"])
+            except RedisConnectionError as e:
+                logger.warning(f"Live feed subscription lost: {e}. Retrying in 1 second...")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._listener_check is not None:
+            self._listener_check.cancel()
+            await asyncio.gather(self._listener_check, return_exceptions=True)
+            self._listener_check = None
+        if self._announcements:
+            await asyncio.gather(*self._announcements, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        subscribers = set(self._unfiltered)
+        for wrapper_subscribers in self._by_wrapper.values():
+            subscribers.update(wrapper_subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "filtered_wrappers": len(self._by_wrapper),
+            "listening": self._listener is not None and not self._listener.done(),
+            "delivered": self.delivered,
+            "announcing": len(self._announcements),
+            "channel_subscribers": self._listeners,
+            "buffer_size": self._buffer_size,
+        }
+
+
+live_feed = LiveFeed(
+    settings.LIVE_FEED_CHANNEL,
+    settings.LIVE_FEED_BUFFER_SIZE,
+    settings.LIVE_FEED_MAX_IN_FLIGHT,
+    settings.LIVE_FEED_LISTENER_CHECK_SECONDS,
+)
@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from config import settings
+
+
+class CachedPayload(NamedTuple):
+    # None when only the ETag was checked and the client already holds the payload
+    payload: Optional[bytes]
+    etag: str
+
+
+class CacheLookup(NamedTuple):
+    entry: CachedPayload
+    fresh: bool
+
+
+class ResponseCache:
+    """Bounded in-process LRU of stored payloads served by the read routes.
+
+    Fresh entries are served without touching Redis. Expired entries are kept so
+    that they can be revalidated against the stored ETag instead of re-read.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._entries: "OrderedDict[str, Tuple[float, CachedPayload]]" = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CacheLookup]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        fresh = entry[0] >= time.monotonic()
+        if fresh:
+            self.hits += 1
+        else:
+            self.revalidations += 1
+        return CacheLookup(entry[1], fresh)
+
+    def put(self, key: str, entry: CachedPayload) -> None:
+        self._entries[key] = (time.monotonic() + self._ttl, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Evict one key, or every entry when no key is given."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_size": self._max_size,
+            "ttl_seconds": self._ttl,
+            "hits": self.hits,
+            "revalidations": self.revalidations,
+            "misses": self.misses,
+        }
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL)
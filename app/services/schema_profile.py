@@ -0,0 +1,372 @@
+import re
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from math import inf
+from operator import lt
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import settings
+from dependencies.redis import redis_client
+from schemas.columnar import ColumnarWrapperMessage
+from schemas.wrapper_message import WrapperMessage, WrapperProfile, XValueType
+
+
+PROFILE_PREFIX = "wrapper_profile:"
+# Metadata entry listing the anomalies found in a message, e.g. ["y_out_of_range"]
+ANOMALIES_METADATA_KEY = "collector_anomalies"
+
+# Datetime layouts recognized by shape instead of trial parsing, in the order tried
+DATETIME_FORMATS = {
+    "date": re.compile(r"\d{4}-\d{2}-\d{2}"),
+    "seconds": re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}"),
+    "seconds_utc": re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z"),
+    "fraction": re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+"),
+    "fraction_utc": re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z"),
+    "offset": re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?[+-]\d{2}:\d{2}"),
+}
+# Fixed-width layouts without offsets, whose strings sort in time order, with
+# every digit shown as 0
+LEXICAL_FORMATS = {
+    "date": b"0000-00-00",
+    "seconds": b"0000-00-00T00:00:00",
+    "seconds_utc": b"0000-00-00T00:00:00Z",
+}
+_DIGITS_AS_ZERO = bytes(ord("0") if chr(byte).isdigit() else byte for byte in range(256))
+OTHER_DATETIME_FORMAT = "other"
+MIXED_DATETIME_FORMAT = "mixed"
+
+# Merges one message's observation into a wrapper profile until it has learned
+# from enough messages; afterwards the profile is left as it is.
+# KEYS: profile hash. ARGV: messages to learn from, x_value_type, datetime format,
+# y min, y max, point count, '1' when X was increasing.
+# Returns {1 when the observation was merged, profile hash as a flat field/value list}.
+LEARN_PROFILE_SCRIPT = """
+local key = KEYS[1]
+local learned = tonumber(redis.call('HGET', key, 'learned_messages') or '0')
+local merged = 1
+if learned == 0 then
+    redis.call('HSET', key,
+        'x_value_type', ARGV[2], 'datetime_format', ARGV[3],
+        'y_min', ARGV[4], 'y_max', ARGV[5],
+        'point_count_min', ARGV[6], 'point_count_max', ARGV[6], 'point_count_total', ARGV[6],
+        'monotonic_x', ARGV[7], 'learned_messages', 1)
+elseif learned < tonumber(ARGV[1]) then
+    local profile = redis.call('HGETALL', key)
+    local stored = {}
+    for i = 1, #profile, 2 do
+        stored[profile[i]] = profile[i + 1]
+    end
+    local count = tonumber(ARGV[6])
+    local datetime_format = stored['datetime_format']
+    if datetime_format ~= ARGV[3] then
+        datetime_format = 'mixed'
+    end
+    redis.call('HSET', key,
+        'datetime_format', datetime_format,
+        'y_min', tostring(math.min(tonumber(stored['y_min']), tonumber(ARGV[4]))),
+        'y_max', tostring(math.max(tonumber(stored['y_max']), tonumber(ARGV[5]))),
+        'point_count_min', math.min(tonumber(stored['point_count_min']), count),
+        'point_count_max', math.max(tonumber(stored['point_count_max']), count),
+        'point_count_total', tonumber(stored['point_count_total']) + count,
+        'monotonic_x', (stored['monotonic_x'] == '1' and ARGV[7] == '1') and '1' or '0',
+        'learned_messages', learned + 1)
+else
+    merged = 0
+end
+return {merged, redis.call('HGETALL', key)}
+"""
+
+
+def detect_x_type(x_value: Any) -> XValueType:
+    """Detect X value type: NUMBER, DATETIME, or STRING."""
+    if isinstance(x_value, (int, float)):
+        return XValueType.NUMBER
+    elif isinstance(x_value, str):
+        try:
+            datetime.fromisoformat(x_value.replace('Z', '+00:00'))
+            return XValueType.DATETIME
+        except (ValueError, TypeError):
+            return XValueType.STRING
+    return XValueType.STRING
+
+
+def detect_datetime_format(x_value: str) -> str:
+    for name, pattern in DATETIME_FORMATS.items():
+        if pattern.fullmatch(x_value):
+            return name
+    return OTHER_DATETIME_FORMAT
+
+
+class PointScan(NamedTuple):
+    """What a single pass over a message's points found."""
+
+    mismatch: Optional[int]
+    count: int
+    y_min: float
+    y_max: float
+    monotonic: bool
+    reformatted: bool
+
+
+_NUMBER_TYPES = {int, float}
+
+
+def _is_number(x_value: Any) -> bool:
+    return isinstance(x_value, (int, float))
+
+
+def _is_string(x_value: Any) -> bool:
+    return isinstance(x_value, str)
+
+
+def _is_datetime(x_value: Any) -> bool:
+    return detect_x_type(x_value) == XValueType.DATETIME
+
+
+def _layout_matcher(pattern: "re.Pattern[str]") -> Callable[[Any], Any]:
+    fullmatch = pattern.fullmatch
+    return lambda x_value: isinstance(x_value, str) and fullmatch(x_value)
+
+
+def _all_numbers(xs: Sequence[Any]) -> bool:
+    return set(map(type, xs)) <= _NUMBER_TYPES
+
+
+def _all_strings(xs: Sequence[Any]) -> bool:
+    return set(map(type, xs)) <= {str}
+
+
+def _all_fixed_width(template: bytes) -> Callable[[Sequence[Any]], bool]:
+    width = len(template)
+
+    def check(xs: Sequence[Any]) -> bool:
+        # Masking the digits of all values at once is far cheaper than a regex per value
+        try:
+            if set(map(len, xs)) != {width}:
+                return False
+            joined = "".join(xs).encode("ascii")
+        except (TypeError, UnicodeEncodeError):
+            return False
+        return joined.translate(_DIGITS_AS_ZERO) == template * len(xs)
+    return check
+
+
+def _all_matching(pattern: "re.Pattern[str]") -> Callable[[Sequence[Any]], bool]:
+    fullmatch = pattern.fullmatch
+
+    def check(xs: Sequence[Any]) -> bool:
+        try:
+            return all(map(fullmatch, xs))
+        except TypeError:
+            return False
+    return check
+
+
+class PointValidator:
+    """Checks every point of a message against the X layout of its first point.
+
+    Datetimes are matched against the regular expression of the first point's
+    layout instead of trial parsing. Conforming messages are checked with builtins
+    that loop in C; only messages that fail that check are walked point by point,
+    to find the offending point and accept datetimes in another layout.
+    """
+
+    def __init__(self, x_type: XValueType, datetime_format: Optional[str]) -> None:
+        self.x_type = x_type
+        self.datetime_format = datetime_format
+        self._matches: Callable[[Any], Any]
+        self._all_match: Optional[Callable[[Sequence[Any]], bool]] = None
+        if x_type == XValueType.NUMBER:
+            self._matches = _is_number
+            self._all_match = _all_numbers
+        elif x_type == XValueType.DATETIME:
+            pattern = DATETIME_FORMATS.get(datetime_format)
+            self._matches = _layout_matcher(pattern) if pattern else _is_datetime
+            if datetime_format in LEXICAL_FORMATS:
+                self._all_match = _all_fixed_width(LEXICAL_FORMATS[datetime_format])
+            else:
+                self._all_match = _all_matching(pattern) if pattern else None
+        else:
+            self._matches = _is_string
+            self._all_match = _all_strings
+        self._ordered = x_type == XValueType.NUMBER or datetime_format in LEXICAL_FORMATS
+
+    def scan(self, xs: Sequence[Any], ys: Sequence[float]) -> PointScan:
+        if self._all_match is None or not xs or not self._all_match(xs):
+            return self._scan_points(xs, ys)
+        monotonic = self._ordered and all(map(lt, xs, islice(xs, 1, None)))
+        return PointScan(None, len(xs), min(ys), max(ys), monotonic, False)
+
+    def _scan_points(self, xs: Sequence[Any], ys: Sequence[float]) -> PointScan:
+        matches = self._matches
+        monotonic = self._ordered
+        reformatted = False
+        y_min, y_max = inf, -inf
+        previous = None
+        count = 0
+        for index, (x, y) in enumerate(zip(xs, ys)):
+            if not matches(x):
+                if self.x_type != XValueType.DATETIME or not _is_datetime(x):
+                    return PointScan(index, count, y_min, y_max, False, reformatted)
+                # Datetimes in another layout do not compare as strings
+                reformatted = True
+                monotonic = False
+            if y < y_min:
+                y_min = y
+            if y > y_max:
+                y_max = y
+            if monotonic and previous is not None and not x > previous:
+                monotonic = False
+            previous = x
+            count += 1
+        return PointScan(None, count, y_min, y_max, monotonic, reformatted)
+
+
+@lru_cache(maxsize=None)
+def point_validator(x_type: XValueType, datetime_format: Optional[str]) -> PointValidator:
+    return PointValidator(x_type, datetime_format)
+
+
+def message_columns(message: WrapperMessage | ColumnarWrapperMessage) -> Tuple[Sequence[Any], Sequence[float]]:
+    if isinstance(message, ColumnarWrapperMessage):
+        return message.x, message.y
+    return [point.x for point in message.data], [point.y for point in message.data]
+
+
+def scan_message(message: WrapperMessage | ColumnarWrapperMessage) -> Tuple[XValueType, Optional[str], PointScan]:
+    """Detect the X layout from the first point and check every point against it in one pass."""
+    first_x = message.data[0].x
+    x_type = detect_x_type(first_x)
+    datetime_format = detect_datetime_format(first_x) if x_type == XValueType.DATETIME else None
+    return x_type, datetime_format, point_validator(x_type, datetime_format).scan(*message_columns(message))
+
+
+class SchemaProfiles:
+    """Learns each wrapper's data profile from its first messages and flags messages that depart from it.
+
+    Profiles live in a hash per wrapper next to its statistics. Until a profile has
+    seen ``learn_messages`` messages every message is merged into it by a script;
+    complete profiles are kept in a bounded in-process cache and only read.
+    Messages outside a complete profile are flagged, not rejected: Y beyond the
+    learned range by more than ``y_tolerance`` times its span, a point count
+    outside half the smallest to twice the largest seen, X no longer increasing,
+    or a different datetime layout.
+    """
+
+    def __init__(self, learn_messages: int, y_tolerance: float, max_size: int) -> None:
+        self._redis = redis_client
+        self._profile_prefix = PROFILE_PREFIX
+        self._learn_script = self._redis.register_script(LEARN_PROFILE_SCRIPT)
+        self._learn_messages = learn_messages
+        self._y_tolerance = y_tolerance
+        self._max_size = max_size
+        self._complete: "OrderedDict[str, WrapperProfile]" = OrderedDict()
+
+    def _profile_from_hash(self, wrapper_id: str, data: Dict[str, str]) -> WrapperProfile:
+        learned = int(data["learned_messages"])
+        return WrapperProfile(
+            wrapper_id=wrapper_id,
+            x_value_type=XValueType(data["x_value_type"]),
+            datetime_format=data["datetime_format"] or None,
+            y_min=float(data["y_min"]),
+            y_max=float(data["y_max"]),
+            point_count_min=int(data["point_count_min"]),
+            point_count_max=int(data["point_count_max"]),
+            point_count_mean=int(data["point_count_total"]) / learned,
+            monotonic_x=data["monotonic_x"] == "1",
+            learned_messages=learned,
+            complete=learned >= self._learn_messages,
+        )
+
+    def _cached(self, wrapper_id: str) -> Optional[WrapperProfile]:
+        profile = self._complete.get(wrapper_id)
+        if profile is not None:
+            self._complete.move_to_end(wrapper_id)
+        return profile
+
+    def _cache(self, profile: WrapperProfile) -> None:
+        self._complete[profile.wrapper_id] = profile
+        while len(self._complete) > self._max_size:
+            self._complete.popitem(last=False)
+
+    async def get_profile(self, wrapper_id: str) -> Optional[WrapperProfile]:
+        profile = self._cached(wrapper_id)
+        if profile is not None:
+            return profile
+        data = await self._redis.hgetall(f"{self._profile_prefix}{wrapper_id}")
+        return self._profile_from_hash(wrapper_id, data) if data else None
+
+    def anomalies(self, profile: WrapperProfile, datetime_format: Optional[str], scan: PointScan) -> List[str]:
+        found = []
+        margin = (profile.y_max - profile.y_min) * self._y_tolerance
+        if scan.y_min < profile.y_min - margin or scan.y_max > profile.y_max + margin:
+            found.append("y_out_of_range")
+        if scan.count < profile.point_count_min // 2 or scan.count > profile.point_count_max * 2:
+            found.append("point_count")
+        if profile.monotonic_x and not scan.monotonic:
+            found.append("non_monotonic_x")
+        if profile.datetime_format not in (None, MIXED_DATETIME_FORMAT) and (
+            scan.reformatted or datetime_format != profile.datetime_format
+        ):
+            found.append("datetime_format")
+        return found
+
+    def _learn_args(self, x_type: XValueType, datetime_format: Optional[str], scan: PointScan) -> List[Any]:
+        return [
+            self._learn_messages,
+            x_type.value,
+            MIXED_DATETIME_FORMAT if scan.reformatted else datetime_format or "",
+            repr(scan.y_min),
+            repr(scan.y_max),
+            scan.count,
+            "1" if scan.monotonic else "0",
+        ]
+
+    async def check_many(
+        self, items: List[Tuple[WrapperMessage | ColumnarWrapperMessage, XValueType, Optional[str], PointScan]]
+    ) -> List[List[str]]:
+        """Return the anomalies of each scanned message, learning from those whose profile is incomplete.
+
+        Messages of wrappers without a complete cached profile are merged into their
+        profiles in one pipelined round trip.
+        """
+        results: List[List[str]] = [[] for _ in items]
+        learning = []
+        for index, (message, x_type, datetime_format, scan) in enumerate(items):
+            profile = self._cached(message.wrapper_id)
+            if profile is not None:
+                results[index] = self.anomalies(profile, datetime_format, scan)
+            else:
+                learning.append(index)
+        if not learning:
+            return results
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for index in learning:
+                message, x_type, datetime_format, scan = items[index]
+                await self._learn_script(
+                    keys=[f"{self._profile_prefix}{message.wrapper_id}"],
+                    args=self._learn_args(x_type, datetime_format, scan),
+                    client=pipe,
+                )
+            profiles = await pipe.execute()
+        for index, (merged, flat) in zip(learning, profiles):
+            message, _, datetime_format, scan = items[index]
+            profile = self._profile_from_hash(message.wrapper_id, dict(zip(flat[::2], flat[1::2])))
+            if profile.complete:
+                self._cache(profile)
+                # Messages merged into the profile are not checked against it
+                if not int(merged):
+                    results[index] = self.anomalies(profile, datetime_format, scan)
+        return results
+
+
+schema_profiles: Optional[SchemaProfiles] = None
+if settings.SCHEMA_PROFILE_ENABLED:
+    schema_profiles = SchemaProfiles(
+        learn_messages=settings.SCHEMA_PROFILE_LEARN_MESSAGES,
+        y_tolerance=settings.SCHEMA_PROFILE_Y_TOLERANCE,
+        max_size=settings.SCHEMA_PROFILE_CACHE_SIZE,
+    )
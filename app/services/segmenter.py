@@ -0,0 +1,173 @@
+import asyncio
+import re
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config import settings
+from schemas.columnar import ColumnarWrapperMessage, XValue
+from services.serialization import loads
+
+
+# Metadata entry of forwarded segments: {"id", "index", "count", "points"}
+SEGMENT_METADATA_KEY = "collector_segment"
+
+# A data point object; its strings may hold braces, nested objects are not points
+_POINT = rb'\{(?:[^{}"]|"(?:[^"\\]|\\.)*")*\}'
+_DATA_KEY = re.compile(rb'"data"\s*:\s*\[')
+_FIRST_POINT = re.compile(rb'\s*' + _POINT)
+_ARRAY_END = re.compile(rb'\s*\]')
+_SEPARATORS = b", \t\r\n"
+
+
+@lru_cache(maxsize=16)
+def _points_pattern(count: int) -> "re.Pattern[bytes]":
+    """Match exactly ``count`` comma-separated points in one call."""
+    return re.compile(rb'(?:\s*,\s*' + _POINT + rb'){%d}' % count)
+
+
+class SegmentPlan(NamedTuple):
+    """Where the chunks of an oversized message's data array are in its body."""
+
+    wrapper_id: str
+    metadata: Dict[str, Any]
+    spans: List[Tuple[int, int]]
+    points: int
+
+
+class SegmentPoints:
+    """First occurrence of every X value across the segments of one message.
+
+    Applies the rules of ``ColumnarWrapperMessage.from_raw`` to the message as a
+    whole: a repeated X value with the same Y is kept only in the segment where
+    it first appears, and one with a different Y is a conflict.
+    """
+
+    def __init__(self) -> None:
+        self._first: Dict[XValue, int] = {}
+        self._y = array("d")
+        self._segment = array("I")
+
+    @property
+    def points(self) -> int:
+        return len(self._first)
+
+    def add(self, segment: ColumnarWrapperMessage, index: int) -> Optional[str]:
+        """Index the points of segment ``index``, or return a message describing a conflicting Y value."""
+        first, ys, segments = self._first, self._y, self._segment
+        for x, y in zip(segment.x, segment.y):
+            position = first.get(x)
+            if position is None:
+                first[x] = len(ys)
+                ys.append(y)
+                segments.append(index)
+            elif ys[position] != y:
+                return f"Conflicting y values {[ys[position], y]} for x={x}"
+        return None
+
+    def owned_positions(self, segment: ColumnarWrapperMessage, index: int) -> List[int]:
+        """Positions of the points of segment ``index`` whose X value first appears in it."""
+        first, segments = self._first, self._segment
+        return [position for position, x in enumerate(segment.x) if segments[first[x]] == index]
+
+
+class PayloadSegmenter:
+    """Splits oversized wrapper messages into chunks of data points without decoding them whole.
+
+    A first pass over the raw body finds the top-level ``data`` array and the byte
+    range of every ``chunk_points`` points, matching a whole chunk per regular
+    expression call and yielding to the event loop between chunks. The rest of the
+    document is decoded with the array left empty. Chunks are then decoded one at
+    a time, so only one chunk's objects are alive at once.
+    """
+
+    def __init__(self, threshold_bytes: int, chunk_points: int) -> None:
+        self._threshold_bytes = threshold_bytes
+        self._chunk_points = chunk_points
+
+    def applies_to(self, body: bytes) -> bool:
+        return len(body) > self._threshold_bytes
+
+    async def _scan_points(self, body: bytes, pos: int) -> Optional[Tuple[List[Tuple[int, int]], int, int]]:
+        """Return the chunk spans, the end of the array and the point count, or None when it is not an array of points."""
+        first = _FIRST_POINT.match(body, pos)
+        if first is None:
+            return None
+
+        chunk_points = self._chunk_points
+        single = _points_pattern(1)
+        spans = []
+        start, pos = first.start(), first.end()
+        in_chunk = points = 1
+        tail = False
+        while True:
+            if in_chunk == chunk_points:
+                spans.append((start, pos))
+                start, in_chunk = pos, 0
+                await asyncio.sleep(0)
+            if not tail:
+                match = _points_pattern(chunk_points - in_chunk).match(body, pos)
+                if match is not None:
+                    pos = match.end()
+                    points += chunk_points - in_chunk
+                    in_chunk = chunk_points
+                    continue
+                # Fewer points than a chunk are left, walk them one by one
+                tail = True
+            match = single.match(body, pos)
+            if match is None:
+                break
+            pos = match.end()
+            in_chunk += 1
+            points += 1
+        if in_chunk:
+            spans.append((start, pos))
+
+        end = _ARRAY_END.match(body, pos)
+        if end is None:
+            return None
+        return spans, end.end(), points
+
+    async def plan(self, body: bytes) -> Optional[SegmentPlan]:
+        """Locate the chunks of a message, or return None when it should be handled as a whole.
+
+        That is the case for bodies that are not a wrapper message with a non-empty
+        array of point objects; the regular path then reports what is wrong with them.
+        """
+        pos = 0
+        while True:
+            key = _DATA_KEY.search(body, pos)
+            if key is None:
+                return None
+            pos = key.end()
+            scanned = await self._scan_points(body, pos)
+            if scanned is None:
+                continue
+            spans, end, points = scanned
+            try:
+                envelope = loads(body[:pos - 1] + b"[]" + body[end:])
+            except ValueError:
+                return None
+            # A "data" key nested in metadata leaves the top-level array untouched
+            if not isinstance(envelope, dict) or envelope.get("data") != []:
+                continue
+            wrapper_id, metadata = envelope.get("wrapper_id"), envelope.get("metadata")
+            if not isinstance(wrapper_id, str) or not isinstance(metadata, dict):
+                return None
+            return SegmentPlan(wrapper_id, metadata, spans, points)
+
+    def decode_segment(self, body: bytes, plan: SegmentPlan, index: int) -> ColumnarWrapperMessage:
+        """Decode and validate one chunk into a message carrying the original metadata.
+
+        Raises ValueError, TypeError or KeyError for points that are not valid.
+        """
+        start, end = plan.spans[index]
+        points = loads(b"[" + body[start:end].lstrip(_SEPARATORS) + b"]")
+        return ColumnarWrapperMessage.from_raw(
+            {"wrapper_id": plan.wrapper_id, "data": points, "metadata": dict(plan.metadata)}
+        )
+
+
+payload_segmenter: Optional[PayloadSegmenter] = None
+if settings.SEGMENT_THRESHOLD_BYTES:
+    payload_segmenter = PayloadSegmenter(settings.SEGMENT_THRESHOLD_BYTES, settings.SEGMENT_CHUNK_POINTS)
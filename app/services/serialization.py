@@ -0,0 +1,47 @@
+import json
+from typing import Any
+
+from pydantic_core import to_json
+
+from schemas.columnar import ColumnarWrapperMessage
+from schemas.wrapper_message import WrapperMessage
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional fast codec
+    orjson = None
+
+
+def loads(data: bytes | str) -> Any:
+    """Decode JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode plain JSON-compatible data to bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def decode_wrapper_message(body: bytes) -> WrapperMessage:
+    """Parse and validate a message body straight from bytes, without an intermediate str.
+
+    orjson followed by model validation beats pydantic's own JSON parser for this
+    schema, so it is used when available.
+    """
+    if orjson is not None:
+        return WrapperMessage.model_validate(orjson.loads(body))
+    return WrapperMessage.model_validate_json(body)
+
+
+def encode_wrapper_message(message: WrapperMessage | ColumnarWrapperMessage) -> bytes:
+    """Produce the canonical JSON bytes for a validated message.
+
+    Callers encode once and reuse the result for every cache write and publish.
+    """
+    if isinstance(message, ColumnarWrapperMessage):
+        return message.to_json()
+    return to_json(message)
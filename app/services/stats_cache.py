@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from config import settings
+from schemas.wrapper_message import XValueType
+
+
+logger = logging.getLogger(__name__)
+
+
+class WrapperStatsCache:
+    """Bounded in-process LRU cache of wrapper X value types with a per-entry TTL.
+
+    Only the X value type is cached, for coherence checks: it never changes once
+    stored, while counters change with every message and are always read from
+    Redis. Entries are refreshed from this process's own writes and evicted when
+    another replica announces that a wrapper's statistics were created, which
+    covers statistics deleted and created again with another type.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._entries: "OrderedDict[str, Tuple[float, XValueType]]" = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self.instance_id = uuid.uuid4().hex
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, wrapper_id: str) -> Optional[XValueType]:
+        """Return the cached X value type of a wrapper, or None when missing or expired."""
+        entry = self._entries.get(wrapper_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[wrapper_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(wrapper_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, wrapper_id: str, x_value_type: XValueType) -> None:
+        self._entries[wrapper_id] = (time.monotonic() + self._ttl, x_value_type)
+        self._entries.move_to_end(wrapper_id)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, wrapper_id: Optional[str] = None) -> None:
+        """Evict one wrapper, or every entry when no wrapper_id is given."""
+        if wrapper_id is None:
+            self._entries.clear()
+        elif self._entries.pop(wrapper_id, None) is None:
+            return
+        self.invalidations += 1
+
+    def invalidation_message(self, wrapper_id: str) -> str:
+        return f"{self.instance_id}:{wrapper_id}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self._max_size,
+            "ttl_seconds": self._ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    async def listen_for_invalidations(self, redis: Redis, channel: str) -> None:
+        """Evict entries written by other replicas until cancelled."""
+        while True:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(channel)
+                logger.info(f"Listening for wrapper stats invalidations on '{channel}'")
+                async for message in pubsub.listen():
+                    origin, _, wrapper_id = message["data"].partition(":")
+                    if origin != self.instance_id:
+                        self.invalidate(wrapper_id)
+            except RedisConnectionError as e:
+                # Invalidations may have been missed while disconnected
+                logger.error(f"Wrapper stats invalidation listener failed: {e}. Retrying in 5 seconds...")
+                self.invalidate()
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
+
+
+wrapper_stats_cache = WrapperStatsCache(
+    max_size=settings.WRAPPER_STATS_CACHE_SIZE, ttl=settings.WRAPPER_STATS_CACHE_TTL
+)
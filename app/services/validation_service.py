@@ -1,44 +1,109 @@
+import asyncio
 import logging
-from datetime import datetime, timezone
-from typing import Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
 
+from pydantic import ValidationError as PydanticValidationError
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from schemas.columnar import ColumnarWrapperMessage
 from schemas.wrapper_message import WrapperMessage, WrapperStatistics, XValueType, ValidationError
+from services.serialization import decode_wrapper_message, loads, orjson
+from dependencies.metrics import INGEST_STAGE_SECONDS, SCHEMA_ANOMALIES, STATS_NOT_RECORDED
 from dependencies.redis import redis_client
+from services.schema_profile import (
+    ANOMALIES_METADATA_KEY,
+    PointScan,
+    detect_x_type,
+    message_columns,
+    point_validator,
+    scan_message,
+    schema_profiles,
+)
+from services.cache_writer import cache_write_buffer
+from services.segmenter import SegmentPlan, SegmentPoints, payload_segmenter
+from services.stats_cache import wrapper_stats_cache
+from config import settings
 
 
 logger = logging.getLogger(__name__)
 
 STATS_PREFIX = "wrapper_stats:"
 COUNTER_PREFIX = "wrapper_count:"
+# Sorted set of every wrapper_id with statistics, all scored 0 so it pages by ID
+WRAPPER_INDEX_KEY = "wrapper_index"
+WRAPPER_INDEX_BUILT_KEY = "wrapper_index_built"
+# Failures that make recording degrade to the cached X value types under the write breaker
+_RECORD_ERRORS = (RedisConnectionError, RedisTimeoutError, asyncio.TimeoutError)
+
+# Checks the stored X value type and records the message in a single atomic call.
+# KEYS: stats hash, counter, wrapper index. ARGV: wrapper_id, x_value_type, timestamp,
+# data count, invalidation channel, invalidation message.
+# Returns {1, total_messages} when accepted or {0, stored x_value_type} when rejected.
+# Replicas cache only the X value type, which never changes once stored, so
+# invalidations are only published when a wrapper's statistics are created.
+RECORD_STATS_SCRIPT = """
+local stored_type = redis.call('HGET', KEYS[1], 'x_value_type')
+if stored_type and stored_type ~= ARGV[2] then
+    return {0, stored_type}
+end
+if not stored_type then
+    redis.call('ZADD', KEYS[3], 0, ARGV[1])
+    redis.call('PUBLISH', ARGV[5], ARGV[6])
+end
+local total = redis.call('INCR', KEYS[2])
+redis.call('HSET', KEYS[1],
+    'wrapper_id', ARGV[1],
+    'last_message_timestamp', ARGV[3],
+    'total_messages', tostring(total),
+    'x_value_type', ARGV[2],
+    'last_data_count', ARGV[4])
+return {1, total}
+"""
+
+
+def _raw_wrapper_id(raw_data: dict) -> str:
+    wrapper_id = raw_data.get("wrapper_id")
+    return wrapper_id if isinstance(wrapper_id, str) else "unknown"
 
 
 class ValidationService:
-    """Service for validating wrapper messages and tracking wrapper statistics."""
+    """Service for validating wrapper messages and tracking wrapper statistics.
 
-    def __init__(self) -> None:
+    A ``read_only`` service checks coherence against the stored X value types
+    without recording statistics or learning profiles. The types of wrappers it
+    has not seen stored are remembered in process instead.
+
+    With write-behind enabled, recording shares the cache writes' circuit breaker:
+    while Redis writes fail, messages are checked against the X value types known
+    in process and accepted without recording statistics.
+    """
+
+    def __init__(self, read_only: bool = False) -> None:
         self._redis = redis_client
+        self._read_only = read_only
+        self._seen_types: Dict[str, XValueType] = {}
         self._stats_prefix = STATS_PREFIX
         self._counter_prefix = COUNTER_PREFIX
+        self._index_key = WRAPPER_INDEX_KEY
+        self._record_script = self._redis.register_script(RECORD_STATS_SCRIPT)
+        self._stats_cache = wrapper_stats_cache
+        self._profiles = None if read_only else schema_profiles
+        self._breaker = None if read_only or cache_write_buffer is None else cache_write_buffer.breaker
     
     def _detect_x_type(self, x_value: Any) -> XValueType:
         """Detect X value type: NUMBER, DATETIME, or STRING."""
-        if isinstance(x_value, (int, float)):
-            return XValueType.NUMBER
-        elif isinstance(x_value, str):
-            try:
-                datetime.fromisoformat(x_value.replace('Z', '+00:00'))
-                return XValueType.DATETIME
-            except (ValueError, TypeError):
-                return XValueType.STRING
-        return XValueType.STRING
+        return detect_x_type(x_value)
 
     async def get_wrapper_stats(self, wrapper_id: str) -> Optional[WrapperStatistics]:
         """Retrieve accumulated statistics for a specific wrapper."""
-        stats_key = f"{self._stats_prefix}{wrapper_id}"
-        data = await self._redis.hgetall(stats_key)
-        if not data:
-            return None
+        data = await self._redis.hgetall(f"{self._stats_prefix}{wrapper_id}")
+        return self._stats_from_hash(data) if data else None
 
+    def _stats_from_hash(self, data: Dict[str, str]) -> WrapperStatistics:
+        """Build statistics from their stored hash, refreshing the cached X value type."""
+        self._stats_cache.put(data["wrapper_id"], XValueType(data["x_value_type"]))
         return WrapperStatistics(
             wrapper_id=data["wrapper_id"],
             last_message_timestamp=datetime.fromisoformat(data["last_message_timestamp"]),
@@ -47,96 +112,482 @@ class ValidationService:
             last_data_count=int(data["last_data_count"])
         )
 
-    async def update_wrapper_stats(self, wrapper_id: str, message: WrapperMessage, x_type: XValueType) -> None:
-        """Update wrapper statistics with atomic operations."""
-        total_messages = await self._redis.incr(f"{self._counter_prefix}{wrapper_id}")
-
-        stats_key = f"{self._stats_prefix}{wrapper_id}"
-        await self._redis.hset(stats_key, mapping={
-            "wrapper_id": wrapper_id,
-            "last_message_timestamp": datetime.now(timezone.utc).isoformat(),
-            "total_messages": str(total_messages),
-            "x_value_type": x_type.value,
-            "last_data_count": str(len(message.data))
-        })
-    
-    async def validate_message(self, raw_data: dict) -> Tuple[Optional[WrapperMessage], Optional[ValidationError]]:
-        """Validate wrapper message structure, types, and coherence with historical data."""
-        wrapper_id = raw_data.get("wrapper_id", "unknown")
-        
+    async def get_wrapper_stats_many(self, wrapper_ids: List[str]) -> Dict[str, Optional[WrapperStatistics]]:
+        """Retrieve statistics for several wrappers in one pipeline."""
+        if not wrapper_ids:
+            return {}
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for wrapper_id in wrapper_ids:
+                pipe.hgetall(f"{self._stats_prefix}{wrapper_id}")
+            hashes = await pipe.execute()
+        return {
+            wrapper_id: self._stats_from_hash(data) if data else None
+            for wrapper_id, data in zip(wrapper_ids, hashes)
+        }
+
+    async def list_wrapper_stats(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        x_value_type: Optional[XValueType] = None,
+        stale_after: Optional[float] = None,
+        active_within: Optional[float] = None,
+    ) -> Tuple[List[WrapperStatistics], Optional[str]]:
+        """Page through known wrappers in wrapper_id order, optionally filtered.
+
+        ``stale_after`` keeps wrappers without messages for at least that many seconds,
+        ``active_within`` those with a message in the last that many seconds. Returns
+        the page and the cursor of the next one, or None when there are no more.
+        """
+        now = datetime.now(timezone.utc)
+        stale_before = now - timedelta(seconds=stale_after) if stale_after is not None else None
+        active_since = now - timedelta(seconds=active_within) if active_within is not None else None
+
+        page: List[WrapperStatistics] = []
+        start = f"({cursor}" if cursor else "-"
+        while True:
+            wrapper_ids = await self._redis.zrangebylex(self._index_key, start, "+", start=0, num=limit)
+            if not wrapper_ids:
+                return page, None
+
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for wrapper_id in wrapper_ids:
+                    pipe.hgetall(f"{self._stats_prefix}{wrapper_id}")
+                hashes = await pipe.execute()
+
+            for wrapper_id, data in zip(wrapper_ids, hashes):
+                if not data:
+                    continue
+                stats = self._stats_from_hash(data)
+                if x_value_type is not None and stats.x_value_type != x_value_type:
+                    continue
+                timestamp = stats.last_message_timestamp
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
+                if stale_before is not None and timestamp > stale_before:
+                    continue
+                if active_since is not None and timestamp < active_since:
+                    continue
+                page.append(stats)
+                if len(page) == limit:
+                    return page, wrapper_id
+
+            if len(wrapper_ids) < limit:
+                return page, None
+            start = f"({wrapper_ids[-1]}"
+
+    async def ensure_wrapper_index(self) -> None:
+        """Index wrappers recorded before the index existed, once per Redis database."""
+        if await self._redis.exists(WRAPPER_INDEX_BUILT_KEY):
+            return
+        indexed = 0
+        chunk: Dict[str, int] = {}
+        async for stats_key in self._redis.scan_iter(match=f"{self._stats_prefix}*", count=1000):
+            chunk[stats_key[len(self._stats_prefix):]] = 0
+            if len(chunk) == 1000:
+                await self._redis.zadd(self._index_key, chunk)
+                indexed += len(chunk)
+                chunk = {}
+        if chunk:
+            await self._redis.zadd(self._index_key, chunk)
+            indexed += len(chunk)
+        await self._redis.set(WRAPPER_INDEX_BUILT_KEY, datetime.now(timezone.utc).isoformat())
+        logger.info(f"Indexed {indexed} existing wrappers")
+
+    async def update_wrapper_stats(
+        self,
+        wrapper_id: str,
+        message: WrapperMessage,
+        x_type: XValueType,
+        pipe: Optional[Pipeline] = None,
+        recorded_at: Optional[datetime] = None,
+        data_count: Optional[int] = None,
+    ) -> Optional[XValueType]:
+        """Atomically check X value type coherence and update wrapper statistics.
+
+        Returns the stored X value type when it conflicts with ``x_type`` (nothing is
+        recorded), otherwise None. With ``pipe`` the call is only queued on the pipeline
+        and the caller passes the result to ``_apply_record_result``. ``data_count``
+        overrides the point count of ``message``, e.g. for one segment of a larger one.
+        """
+        if self._read_only:
+            stats_key = f"{self._stats_prefix}{wrapper_id}"
+            if pipe is not None:
+                pipe.hget(stats_key, "x_value_type")
+                return None
+            return self._check_stored_type(wrapper_id, x_type, await self._redis.hget(stats_key, "x_value_type"))
+
+        data_count = data_count if data_count is not None else len(message.data)
+        recorded_at = recorded_at or datetime.now(timezone.utc)
+        if pipe is None and self._breaker is not None and not self._breaker.allow():
+            return self._accept_unrecorded(wrapper_id, x_type)
+        call = self._record_script(
+            keys=[f"{self._stats_prefix}{wrapper_id}", f"{self._counter_prefix}{wrapper_id}", self._index_key],
+            args=[
+                wrapper_id,
+                x_type.value,
+                recorded_at.isoformat(),
+                data_count,
+                settings.WRAPPER_STATS_INVALIDATION_CHANNEL,
+                self._stats_cache.invalidation_message(wrapper_id),
+            ],
+            client=pipe or self._redis,
+        )
+        if pipe is not None:
+            await call
+            return None
+        if self._breaker is None:
+            result = await call
+        else:
+            try:
+                result = await asyncio.wait_for(call, settings.CACHE_WRITE_BEHIND_TIMEOUT)
+            except _RECORD_ERRORS as e:
+                self._record_failed(e)
+                return self._accept_unrecorded(wrapper_id, x_type)
+            self._breaker.record_success()
+        return self._apply_record_result(message, x_type, result)
+
+    async def _execute_records(self, pipe: Pipeline) -> Optional[List[Any]]:
+        """Execute pipelined recording calls, or return None when they are skipped or fail under the breaker."""
+        if self._breaker is None:
+            return await pipe.execute()
+        if not self._breaker.allow():
+            return None
         try:
-            if "wrapper_id" not in raw_data:
-                error = ValidationError(
-                    wrapper_id="unknown",
-                    error_type="schema_error",
-                    error_message="Missing wrapper_id field",
-                    original_data=raw_data
-                )
-                return None, error
+            recorded = await asyncio.wait_for(pipe.execute(), settings.CACHE_WRITE_BEHIND_TIMEOUT)
+        except _RECORD_ERRORS as e:
+            self._record_failed(e)
+            return None
+        self._breaker.record_success()
+        return recorded
 
-            if "data" not in raw_data:
-                error = ValidationError(
-                    wrapper_id=wrapper_id,
-                    error_type="schema_error",
-                    error_message="Missing data field",
-                    original_data=raw_data
-                )
-                return None, error
+    def _record_failed(self, e: Exception) -> None:
+        self._breaker.record_failure()
+        logger.warning(f"Could not record wrapper statistics, checking cached X value types only: {e!r}")
 
-            if not isinstance(raw_data["data"], list):
-                error = ValidationError(
-                    wrapper_id=wrapper_id,
-                    error_type="schema_error",
-                    error_message="Data field must be an array",
-                    original_data=raw_data
-                )
-                return None, error
+    def _accept_unrecorded(self, wrapper_id: str, x_type: XValueType) -> Optional[XValueType]:
+        """Degraded counterpart of recording: check ``x_type`` against the type known in process only."""
+        STATS_NOT_RECORDED.inc()
+        cached_type = self._stats_cache.get(wrapper_id)
+        return self._check_stored_type(wrapper_id, x_type, cached_type.value if cached_type else None)
 
-            if raw_data["data"]:
-                first_point = raw_data["data"][0]
-                if "x" not in first_point or "y" not in first_point:
-                    error = ValidationError(
-                        wrapper_id=wrapper_id,
-                        error_type="schema_error",
-                        error_message="Data points must have 'x' and 'y' fields",
-                        original_data=raw_data
-                    )
-                    return None, error
+    def _apply_record_result(
+        self, message: WrapperMessage, x_type: XValueType, result: List[Any]
+    ) -> Optional[XValueType]:
+        """Refresh the cached X value type from a script result and return the conflicting type, if any."""
+        if self._read_only:
+            return self._check_stored_type(message.wrapper_id, x_type, result)
+        accepted, value = result
+        if not int(accepted):
+            stored_type = XValueType(value)
+            self._stats_cache.put(message.wrapper_id, stored_type)
+            return stored_type
 
-                x_type = self._detect_x_type(first_point["x"])
+        self._stats_cache.put(message.wrapper_id, x_type)
+        return None
 
-                existing_stats = await self.get_wrapper_stats(wrapper_id)
-                if existing_stats and existing_stats.x_value_type != x_type:
-                    error = ValidationError(
-                        wrapper_id=wrapper_id,
-                        error_type="coherence_error",
-                        error_message=f"X value type changed from {existing_stats.x_value_type} to {x_type}",
-                        original_data=raw_data
-                    )
-                    return None, error
+    def _check_stored_type(
+        self, wrapper_id: str, x_type: XValueType, stored: Optional[str]
+    ) -> Optional[XValueType]:
+        """Recording without Redis writes: the conflicting type, if any, else remember ``x_type``."""
+        stored_type = XValueType(stored) if stored else self._seen_types.get(wrapper_id)
+        if stored_type and stored_type != x_type:
+            return stored_type
+        self._seen_types.setdefault(wrapper_id, x_type)
+        return None
 
-            message = WrapperMessage(**raw_data)
+    def _cached_x_type(self, wrapper_id: str) -> Optional[XValueType]:
+        return self._stats_cache.get(wrapper_id) or self._seen_types.get(wrapper_id)
 
-            if message.data:
-                x_type = self._detect_x_type(message.data[0].x)
-                await self.update_wrapper_stats(message.wrapper_id, message, x_type)
+    def _check_schema(self, raw_data: Any) -> Optional[ValidationError]:
+        """Check required fields and data point shape before model construction."""
+        if not isinstance(raw_data, dict):
+            return ValidationError(
+                wrapper_id="unknown",
+                error_type="schema_error",
+                error_message=f"Message must be a JSON object, not {type(raw_data).__name__}",
+                original_data={"message": raw_data}
+            )
+        wrapper_id = _raw_wrapper_id(raw_data)
 
-            return message, None
+        if "wrapper_id" not in raw_data:
+            return ValidationError(
+                wrapper_id="unknown",
+                error_type="schema_error",
+                error_message="Missing wrapper_id field",
+                original_data=raw_data
+            )
 
-        except (ValueError, TypeError) as e:
-            error = ValidationError(
+        if "data" not in raw_data:
+            return ValidationError(
                 wrapper_id=wrapper_id,
-                error_type="validation_error",
-                error_message=str(e),
+                error_type="schema_error",
+                error_message="Missing data field",
                 original_data=raw_data
             )
-            return None, error
-        except KeyError as e:
-            error = ValidationError(
+
+        if not isinstance(raw_data["data"], list):
+            return ValidationError(
                 wrapper_id=wrapper_id,
                 error_type="schema_error",
-                error_message=f"Missing required field: {str(e)}",
+                error_message="Data field must be an array",
                 original_data=raw_data
             )
+
+        if raw_data["data"]:
+            first_point = raw_data["data"][0]
+            if not isinstance(first_point, dict) or "x" not in first_point or "y" not in first_point:
+                return ValidationError(
+                    wrapper_id=wrapper_id,
+                    error_type="schema_error",
+                    error_message="Data points must have 'x' and 'y' fields",
+                    original_data=raw_data
+                )
+
+        return None
+
+    def _check_coherence(
+        self,
+        message: WrapperMessage,
+        raw_data: Optional[dict],
+        stored_type: Optional[XValueType],
+        x_type: XValueType,
+    ) -> Optional[ValidationError]:
+        """Reject messages whose X value type differs from the one recorded for the wrapper."""
+        if stored_type and stored_type != x_type:
+            return ValidationError(
+                wrapper_id=message.wrapper_id,
+                error_type="coherence_error",
+                error_message=f"X value type changed from {stored_type} to {x_type}",
+                original_data=raw_data if raw_data is not None else message.model_dump(mode="json")
+            )
+        return None
+
+    def _check_points(
+        self, message: WrapperMessage, raw_data: Optional[dict], x_type: XValueType, scan: PointScan
+    ) -> Optional[ValidationError]:
+        """Reject messages with a point whose X value type differs from the first point's."""
+        if scan.mismatch is not None:
+            return ValidationError(
+                wrapper_id=message.wrapper_id,
+                error_type="coherence_error",
+                error_message=f"X value of point {scan.mismatch} is not a {x_type.value} like the first point",
+                original_data=raw_data if raw_data is not None else message.model_dump(mode="json")
+            )
+        return None
+
+    def _flag_anomalies(self, message: WrapperMessage, anomalies: List[str]) -> None:
+        if anomalies:
+            message.metadata[ANOMALIES_METADATA_KEY] = anomalies
+            for anomaly in anomalies:
+                SCHEMA_ANOMALIES.labels(anomaly).inc()
+
+    def _error_from_exception(self, raw_data: Any, e: Exception) -> ValidationError:
+        """Convert an exception raised while validating into a ValidationError."""
+        if not isinstance(raw_data, dict):
+            return self._check_schema(raw_data)
+        wrapper_id = _raw_wrapper_id(raw_data)
+        if isinstance(e, KeyError):
             logger.error(f"Schema validation error for wrapper_id={wrapper_id}: {e}")
-            return None, error
\ No newline at end of file
+            return ValidationError(
+                wrapper_id=wrapper_id,
+                error_type="schema_error",
+                error_message=f"Missing required field: {str(e)}",
+                original_data=raw_data
+            )
+        return ValidationError(
+            wrapper_id=wrapper_id,
+            error_type="validation_error",
+            error_message=str(e),
+            original_data=raw_data
+        )
+
+    def decode_body(self, body: bytes) -> Tuple[Optional[WrapperMessage], Optional[dict]]:
+        """Decode a raw message body straight into the model, or into a dict when that fails.
+
+        The dict is only produced for bodies that do not match the schema, so that
+        ``validate_message`` can report precisely what is wrong with them. With
+        COLUMNAR_DATA_ENABLED the message is a ColumnarWrapperMessage.
+        """
+        if orjson is None and not settings.COLUMNAR_DATA_ENABLED:
+            # pydantic parses and validates in one pass, so it is all timed as validation
+            with INGEST_STAGE_SECONDS.labels("validate").time():
+                try:
+                    return decode_wrapper_message(body), None
+                except PydanticValidationError:
+                    return None, loads(body)
+
+        with INGEST_STAGE_SECONDS.labels("decode").time():
+            raw_data = loads(body)
+
+        with INGEST_STAGE_SECONDS.labels("validate").time():
+            if settings.COLUMNAR_DATA_ENABLED:
+                try:
+                    return ColumnarWrapperMessage.from_raw(raw_data), None
+                except (ValueError, TypeError, KeyError):
+                    return None, raw_data
+
+            try:
+                return WrapperMessage.model_validate(raw_data), None
+            except PydanticValidationError:
+                return None, raw_data
+
+    async def _record_validated(
+        self, message: WrapperMessage, raw_data: Optional[dict]
+    ) -> Tuple[Optional[WrapperMessage], Optional[ValidationError]]:
+        if message.data:
+            with INGEST_STAGE_SECONDS.labels("points").time():
+                x_type, datetime_format, scan = scan_message(message)
+            error = self._check_points(message, raw_data, x_type, scan)
+            if error:
+                return None, error
+            # A cached type is authoritative enough to reject without a round trip
+            error = self._check_coherence(message, raw_data, self._cached_x_type(message.wrapper_id), x_type)
+            if error:
+                return None, error
+
+            with INGEST_STAGE_SECONDS.labels("stats").time():
+                stored_type = await self.update_wrapper_stats(message.wrapper_id, message, x_type)
+            error = self._check_coherence(message, raw_data, stored_type, x_type)
+            if error:
+                return None, error
+
+            if self._profiles is not None:
+                with INGEST_STAGE_SECONDS.labels("profile").time():
+                    anomalies = await self._profiles.check_many([(message, x_type, datetime_format, scan)])
+                self._flag_anomalies(message, anomalies[0])
+
+        return message, None
+
+    async def validate_segments(
+        self, body: bytes, plan: SegmentPlan
+    ) -> Tuple[Optional[SegmentPoints], Optional[ValidationError]]:
+        """Validate every segment of an oversized message before any of it is forwarded.
+
+        The first segment fixes the X layout the others must follow, and X values
+        are checked for conflicts across segments. Statistics are recorded once for
+        the whole message. Returns the index of first X occurrences, which tells
+        which points of each segment to forward.
+        """
+        points = SegmentPoints()
+        count = len(plan.spans)
+        first_segment = layout = None
+        for index in range(count):
+            try:
+                segment = payload_segmenter.decode_segment(body, plan, index)
+            except (ValueError, TypeError, KeyError) as e:
+                return None, self._segment_error(plan, index, self._error_from_exception({"wrapper_id": plan.wrapper_id}, e))
+
+            if layout is None:
+                x_type, datetime_format, scan = scan_message(segment)
+                layout = (x_type, datetime_format)
+                first_segment = segment
+            else:
+                scan = point_validator(*layout).scan(*message_columns(segment))
+            error = self._check_points(segment, None, layout[0], scan)
+            if error:
+                return None, self._segment_error(plan, index, error)
+            conflict = points.add(segment, index)
+            if conflict:
+                return None, self._segment_error(
+                    plan, index, self._error_from_exception({"wrapper_id": plan.wrapper_id}, ValueError(conflict))
+                )
+            # Decoding a segment takes a while; let other messages through in between
+            await asyncio.sleep(0)
+
+        x_type = layout[0]
+        error = self._check_coherence(first_segment, None, self._cached_x_type(plan.wrapper_id), x_type)
+        if error:
+            return None, error
+        stored_type = await self.update_wrapper_stats(plan.wrapper_id, first_segment, x_type, data_count=points.points)
+        error = self._check_coherence(first_segment, None, stored_type, x_type)
+        if error:
+            return None, error
+        return points, None
+
+    def _segment_error(self, plan: SegmentPlan, index: int, error: ValidationError) -> ValidationError:
+        error.error_message = f"Segment {index} of {len(plan.spans)}: {error.error_message}"
+        return error
+
+    async def validate_body(self, body: bytes) -> Tuple[Optional[WrapperMessage], Optional[ValidationError]]:
+        """Validate a raw message body, skipping the intermediate dict for well-formed messages."""
+        message, raw_data = self.decode_body(body)
+        if message is None:
+            return await self.validate_message(raw_data)
+        return await self._record_validated(message, None)
+
+    async def validate_message(self, raw_data: dict) -> Tuple[Optional[WrapperMessage], Optional[ValidationError]]:
+        """Validate wrapper message structure, types, and coherence with historical data."""
+        try:
+            with INGEST_STAGE_SECONDS.labels("validate").time():
+                error = self._check_schema(raw_data)
+                if error:
+                    return None, error
+
+                message = WrapperMessage(**raw_data)
+            return await self._record_validated(message, raw_data)
+
+        except (ValueError, TypeError, KeyError) as e:
+            return None, self._error_from_exception(raw_data, e)
+
+    async def validate_batch(
+        self, decoded_items: List[Tuple[Optional[WrapperMessage], Optional[dict]]]
+    ) -> List[Tuple[Optional[WrapperMessage], Optional[ValidationError]]]:
+        """Validate a batch of ``decode_body`` results, recording statistics in one pipelined round trip.
+
+        Statistics are recorded in message order, so a wrapper's first message in the batch
+        fixes its X value type for the following ones.
+        """
+        results: List[Tuple[Optional[WrapperMessage], Optional[ValidationError]]] = []
+        pending: List[Tuple[int, Optional[dict], WrapperMessage, XValueType, Optional[str], PointScan]] = []
+        recorded_at = datetime.now(timezone.utc)
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for message, raw_data in decoded_items:
+                try:
+                    if message is None:
+                        error = self._check_schema(raw_data)
+                        if error:
+                            results.append((None, error))
+                            continue
+                        message = WrapperMessage(**raw_data)
+
+                    if message.data:
+                        x_type, datetime_format, scan = scan_message(message)
+                        error = self._check_points(message, raw_data, x_type, scan) or self._check_coherence(
+                            message, raw_data, self._cached_x_type(message.wrapper_id), x_type
+                        )
+                        if error:
+                            results.append((None, error))
+                            continue
+
+                        await self.update_wrapper_stats(
+                            message.wrapper_id, message, x_type, pipe=pipe, recorded_at=recorded_at
+                        )
+                        pending.append((len(results), raw_data, message, x_type, datetime_format, scan))
+
+                    results.append((message, None))
+
+                except (ValueError, TypeError, KeyError) as e:
+                    results.append((None, self._error_from_exception(raw_data, e)))
+
+            recorded = await self._execute_records(pipe) if pending else []
+
+        accepted = []
+        for position, (index, raw_data, message, x_type, datetime_format, scan) in enumerate(pending):
+            if recorded is None:
+                stored_type = self._accept_unrecorded(message.wrapper_id, x_type)
+            else:
+                stored_type = self._apply_record_result(message, x_type, recorded[position])
+            error = self._check_coherence(message, raw_data, stored_type, x_type)
+            if error:
+                results[index] = (None, error)
+            else:
+                accepted.append((message, x_type, datetime_format, scan))
+
+        if self._profiles is not None and accepted:
+            anomalies = await self._profiles.check_many(accepted)
+            for (message, _, _, _), found in zip(accepted, anomalies):
+                self._flag_anomalies(message, found)
+
+        return results
@@ -0,0 +1,163 @@
+"""Run the AMQP consumers without the HTTP API.
+
+    python worker.py [--workers N]
+
+With more than one worker a supervisor process starts N consumer processes that
+share the queues, restarts any that crash, and on SIGTERM or SIGINT asks them to
+drain and exit. Run the API with RUN_CONSUMERS=false alongside it.
+"""
+import argparse
+import asyncio
+import glob
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from multiprocessing.connection import wait
+from typing import Dict, Optional
+from wsgiref.simple_server import WSGIServer
+
+from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+
+from config import settings
+
+logger = logging.getLogger("worker")
+
+
+def _serve_metrics(port: int) -> WSGIServer:
+    """Expose this process's metrics over plain HTTP, since workers have no API."""
+    from dependencies.metrics import collecting_registry
+
+    server, _ = start_http_server(port, registry=collecting_registry())
+    return server
+
+
+async def _consume(index: int, serve_metrics: bool) -> None:
+    from runtime import pipeline
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    metrics_server: Optional[WSGIServer] = None
+    if serve_metrics and settings.WORKER_METRICS_PORT:
+        metrics_server = _serve_metrics(settings.WORKER_METRICS_PORT + index)
+
+    async with pipeline(run_consumers=True):
+        logger.info(f"Worker {index} consuming")
+        await stop.wait()
+        logger.info(f"Worker {index} draining")
+
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    logger.info(f"Worker {index} stopped")
+
+
+def run_worker(index: int = 0, serve_metrics: bool = True) -> None:
+    """Entry point of one consumer process."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s worker-{index} %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_consume(index, serve_metrics))
+
+
+class Supervisor:
+    """Keeps ``workers`` consumer processes running until asked to stop.
+
+    With ``PROMETHEUS_MULTIPROC_DIR`` set, the workers write their metrics to that
+    directory and the supervisor serves them merged on ``WORKER_METRICS_PORT``.
+    """
+
+    def __init__(self, workers: int, restart_delay: float, shutdown_timeout: float) -> None:
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = workers
+        self._restart_delay = restart_delay
+        self._shutdown_timeout = shutdown_timeout
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._stopping = False
+        self._metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(
+            target=run_worker, args=(index, not self._metrics_dir), name=f"worker-{index}"
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def _request_stop(self, signum: int, frame) -> None:
+        logger.info(f"Received {signal.Signals(signum).name}, stopping workers")
+        self._stopping = True
+
+    def _start_metrics(self) -> None:
+        # Files left by an earlier run would be merged into this one's metrics
+        os.makedirs(self._metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(self._metrics_dir, "*.db")):
+            os.remove(path)
+        if settings.WORKER_METRICS_PORT:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            start_http_server(settings.WORKER_METRICS_PORT, registry=registry)
+
+    def _stopped(self, process: multiprocessing.Process) -> None:
+        if self._metrics_dir:
+            # Drops the live gauges of the process; its counters stay in the totals
+            multiprocess.mark_process_dead(process.pid)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        if self._metrics_dir:
+            self._start_metrics()
+        for index in range(self._workers):
+            self._start(index)
+
+        while not self._stopping:
+            wait([process.sentinel for process in self._processes.values()], timeout=1.0)
+            for index, process in list(self._processes.items()):
+                if process.is_alive() or self._stopping:
+                    continue
+                logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+                self._stopped(process)
+                time.sleep(self._restart_delay)
+                if not self._stopping:
+                    self._start(index)
+
+        self._shutdown()
+
+    def _shutdown(self) -> None:
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self._shutdown_timeout
+        for index, process in self._processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not drain in time, killing it")
+                process.kill()
+                process.join()
+            self._stopped(process)
+        logger.info("All workers stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=settings.WORKER_PROCESSES)
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        run_worker()
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s supervisor %(levelname)s %(name)s: %(message)s")
+    # Leave the workers time to drain their dispatchers and flush publishes
+    Supervisor(
+        args.workers,
+        restart_delay=settings.WORKER_RESTART_DELAY,
+        shutdown_timeout=settings.CONSUMER_DRAIN_TIMEOUT + 10,
+    ).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
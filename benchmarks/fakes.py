@@ -0,0 +1,212 @@
+"""In-process stand-ins for RabbitMQ and Redis used by the ingest benchmark.
+
+The AMQP fake implements the slice of aio-pika that RabbitMQClient and Publisher
+use (robust connection, channels with qos and confirms, queue iterators, the
+default exchange and message settlement). Redis is fakeredis with a connection
+class that sleeps once per round trip, so pipelining shows up in the numbers.
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import fakeredis
+from fakeredis.aioredis import FakeAsyncRedisConnection
+
+
+class LatencyRedisConnection(FakeAsyncRedisConnection):
+    """fakeredis connection that adds ``latency`` seconds to every round trip."""
+
+    latency = 0.0
+
+    async def send_packed_command(self, command: Any, check_health: bool = True) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        await super().send_packed_command(command, check_health)
+
+
+def make_redis_clients(latency: float):
+    """Return text and binary clients sharing one fake server, like the two app clients."""
+    LatencyRedisConnection.latency = latency
+    server = fakeredis.FakeServer()
+    text_client = fakeredis.FakeAsyncRedis(
+        server=server, connection_class=LatencyRedisConnection, decode_responses=True
+    )
+    binary_client = fakeredis.FakeAsyncRedis(server=server, connection_class=LatencyRedisConnection)
+    return text_client, binary_client
+
+
+class FakeDeclarationResult:
+    def __init__(self, message_count: int) -> None:
+        self.message_count = message_count
+
+
+class FakeIncomingMessage:
+    def __init__(self, channel: "FakeChannel", body: bytes, headers: Optional[Dict[str, Any]], delivery_tag: int):
+        self.body = body
+        self.headers = headers or {}
+        self.delivery_tag = delivery_tag
+        self.redelivered = False
+        self.delivered_at = time.perf_counter()
+        self._channel = channel
+
+    async def ack(self, multiple: bool = False) -> None:
+        self._channel.settle(self, "ack", multiple)
+
+    async def reject(self, requeue: bool = False) -> None:
+        self._channel.settle(self, "reject", False)
+
+    async def nack(self, multiple: bool = False, requeue: bool = True) -> None:
+        self._channel.settle(self, "nack", multiple)
+
+
+class FakeQueueIterator:
+    def __init__(self, queue: "FakeQueue") -> None:
+        self._queue = queue
+
+    async def __aenter__(self) -> "FakeQueueIterator":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+    def __aiter__(self) -> "FakeQueueIterator":
+        return self
+
+    async def __anext__(self) -> FakeIncomingMessage:
+        return await self._queue.channel.deliver(self._queue.name)
+
+
+class FakeQueue:
+    def __init__(self, channel: "FakeChannel", name: str) -> None:
+        self.channel = channel
+        self.name = name
+        self.declaration_result = FakeDeclarationResult(len(channel.broker.queue(name)))
+
+    def iterator(self) -> FakeQueueIterator:
+        return FakeQueueIterator(self)
+
+
+class FakeExchange:
+    def __init__(self, broker: "FakeBroker") -> None:
+        self._broker = broker
+
+    async def publish(self, message: Any, routing_key: str) -> None:
+        # The latency stands for the wait on the broker confirm
+        if self._broker.latency:
+            await asyncio.sleep(self._broker.latency)
+        self._broker.enqueue(routing_key, message.body, message.headers)
+
+
+class FakeChannel:
+    def __init__(self, broker: "FakeBroker") -> None:
+        self.broker = broker
+        self.is_closed = False
+        self.default_exchange = FakeExchange(broker)
+        self._prefetch = 0
+        self._tags = itertools.count(1)
+        self._unacked: Dict[int, FakeIncomingMessage] = {}
+        self._capacity = asyncio.Condition()
+
+    async def set_qos(self, prefetch_count: int = 0, **kwargs: Any) -> None:
+        self._prefetch = prefetch_count
+
+    async def declare_queue(self, name: str, durable: bool = False, passive: bool = False, **kwargs: Any) -> FakeQueue:
+        if self.broker.latency:
+            await asyncio.sleep(self.broker.latency)
+        return FakeQueue(self, name)
+
+    async def deliver(self, queue_name: str) -> FakeIncomingMessage:
+        async with self._capacity:
+            await self._capacity.wait_for(lambda: not self._prefetch or len(self._unacked) < self._prefetch)
+        body, headers = await self.broker.get(queue_name)
+        message = FakeIncomingMessage(self, body, headers, next(self._tags))
+        self._unacked[message.delivery_tag] = message
+        return message
+
+    def settle(self, message: FakeIncomingMessage, outcome: str, multiple: bool) -> None:
+        if multiple:
+            tags = [tag for tag in self._unacked if tag <= message.delivery_tag]
+        else:
+            tags = [message.delivery_tag]
+        now = time.perf_counter()
+        for tag in tags:
+            settled = self._unacked.pop(tag, None)
+            if settled is not None:
+                self.broker.record_settlement(outcome, now - settled.delivered_at)
+        asyncio.get_running_loop().create_task(self._notify())
+
+    async def _notify(self) -> None:
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    async def close(self) -> None:
+        self.is_closed = True
+
+
+class FakeConnection:
+    def __init__(self, broker: "FakeBroker") -> None:
+        self._broker = broker
+        self.reconnect_callbacks = set()
+        self.is_closed = False
+
+    async def channel(self, publisher_confirms: bool = True, **kwargs: Any) -> FakeChannel:
+        return FakeChannel(self._broker)
+
+    async def close(self) -> None:
+        self.is_closed = True
+
+
+class FakeBroker:
+    """Named in-memory queues shared by every fake connection, with settlement bookkeeping.
+
+    ``latency`` seconds are added to each publish confirm and queue declaration.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self._queues: Dict[str, Deque] = {}
+        self._ready: Dict[str, asyncio.Event] = {}
+        self.published: Dict[str, int] = {}
+        self.settled: Dict[str, int] = {"ack": 0, "reject": 0, "nack": 0}
+        self.latencies: List[float] = []
+        self.all_settled = asyncio.Event()
+        self.expected = 0
+
+    def queue(self, name: str) -> Deque:
+        return self._queues.setdefault(name, deque())
+
+    def _event(self, name: str) -> asyncio.Event:
+        return self._ready.setdefault(name, asyncio.Event())
+
+    def enqueue(self, name: str, body: bytes, headers: Optional[Dict[str, Any]] = None) -> None:
+        self.queue(name).append((body, headers))
+        self.published[name] = self.published.get(name, 0) + 1
+        self._event(name).set()
+
+    async def get(self, name: str):
+        queue = self.queue(name)
+        while not queue:
+            event = self._event(name)
+            event.clear()
+            await event.wait()
+        return queue.popleft()
+
+    def record_settlement(self, outcome: str, latency: float) -> None:
+        self.settled[outcome] += 1
+        self.latencies.append(latency)
+        if len(self.latencies) >= self.expected:
+            self.all_settled.set()
+
+    def reset(self, expected: int) -> None:
+        for queue in self._queues.values():
+            queue.clear()
+        self.published.clear()
+        self.settled = {"ack": 0, "reject": 0, "nack": 0}
+        self.latencies = []
+        self.expected = expected
+        self.all_settled = asyncio.Event()
+
+    async def connect_robust(self, url: str, **kwargs: Any) -> FakeConnection:
+        return FakeConnection(self)
@@ -0,0 +1,240 @@
+"""Measure end-to-end ingest throughput against in-process RabbitMQ and Redis fakes.
+
+Messages are preloaded into the data queue and consumed through the real
+RabbitMQClient and data ingestor handlers, with the consumer, publisher and
+Redis settings taken from the environment as in production. Each case in the
+payload matrix reports messages/sec, handling latency percentiles (delivery to
+ack) and the peak traced memory of a smaller follow-up pass. Needs the packages
+in benchmarks/requirements.txt; no broker or Redis server.
+
+Run from the repository root:
+
+    python benchmarks/ingest_benchmark.py [--points 1 100 10000] [--redis-latency-ms 0.2] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import aio_pika  # noqa: E402
+
+import dependencies.redis  # noqa: E402
+from fakes import FakeBroker, make_redis_clients  # noqa: E402
+
+POINT_COUNTS = [1, 100, 10_000, 100_000]
+X_TYPES = ["number", "datetime", "string"]
+DUPLICATE_RATIOS = [0.0, 0.5]
+WRAPPER_COUNT = 8
+BASE_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_body(points: int, x_type: str, duplicate_ratio: float, wrapper_id: str, sequence: int) -> bytes:
+    """Build one wrapper message whose ``duplicate_ratio`` share of points repeats an earlier x."""
+    unique = max(1, round(points * (1 - duplicate_ratio)))
+    offset = sequence * unique
+    data = []
+    for i in range(points):
+        j = i if i < unique else i * 7919 % unique
+        if x_type == "number":
+            x: Any = offset + j
+        elif x_type == "datetime":
+            x = (BASE_TIME + timedelta(seconds=offset + j)).isoformat().replace("+00:00", "Z")
+        else:
+            x = f"category-{j}"
+        data.append({"x": x, "y": j * 0.5})
+    return json.dumps({
+        "wrapper_id": wrapper_id,
+        "data": data,
+        "metadata": {"source": "benchmark", "sequence": sequence},
+    }).encode()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class IngestBench:
+    def __init__(self, broker: FakeBroker, redis_client: Any, timeout: float) -> None:
+        self.broker = broker
+        self.redis = redis_client
+        self.timeout = timeout
+
+    async def start(self) -> None:
+        from dependencies.rabbitmq import data_mq_client, services_mq_client
+        import services.data_ingestor  # noqa: F401 - registers the data consumer
+
+        self.clients = (data_mq_client, services_mq_client)
+        for client in self.clients:
+            await client.connect()
+        for client in self.clients:
+            await client.start_consumers()
+
+    async def stop(self) -> None:
+        import services.data_ingestor
+
+        data_mq_client, services_mq_client = self.clients
+        await data_mq_client.close()
+        await services.data_ingestor.collected_envelope_writer.close()
+        await services_mq_client.close()
+
+    async def _reset(self, expected: int) -> None:
+        from services.stats_cache import wrapper_stats_cache
+
+        self.broker.reset(expected)
+        await self.redis.flushall()
+        wrapper_stats_cache.invalidate()
+
+    async def run(self, bodies: List[bytes]) -> float:
+        from config import settings
+
+        await self._reset(len(bodies))
+        start = time.perf_counter()
+        for body in bodies:
+            self.broker.enqueue(settings.DATA_QUEUE, body)
+        await asyncio.wait_for(self.broker.all_settled.wait(), self.timeout)
+        return time.perf_counter() - start
+
+    async def case(
+        self, points: int, x_type: str, duplicate_ratio: float, messages: int, memory_messages: int
+    ) -> Dict[str, Any]:
+        from config import settings
+
+        bodies = [
+            make_body(points, x_type, duplicate_ratio, f"wrapper-{i % WRAPPER_COUNT}", i)
+            for i in range(messages)
+        ]
+        elapsed = await self.run(bodies)
+        latencies = self.broker.latencies
+        settled = dict(self.broker.settled)
+        forwarded = self.broker.published.get(settings.COLLECTED_DATA_QUEUE, 0)
+
+        memory_bodies = bodies[:memory_messages]
+        del bodies
+        tracemalloc.start()
+        await self.run(memory_bodies)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            "points": points,
+            "x_type": x_type,
+            "duplicate_ratio": duplicate_ratio,
+            "messages": messages,
+            "seconds": elapsed,
+            "messages_per_sec": messages / elapsed,
+            "points_per_sec": messages * points / elapsed,
+            "latency_p50_ms": percentile(latencies, 0.50) * 1000,
+            "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+            "settled": settled,
+            "forwarded_amqp_messages": forwarded,
+            "peak_memory_bytes": peak,
+            "peak_memory_messages": len(memory_bodies),
+        }
+
+
+def settings_snapshot() -> Dict[str, Any]:
+    from config import settings
+
+    return {
+        name: value for name, value in settings.model_dump().items()
+        if not name.endswith("_URL") and name != "ORIGINS"
+    }
+
+
+async def run_matrix(args: argparse.Namespace) -> Dict[str, Any]:
+    broker = FakeBroker(latency=args.amqp_latency_ms / 1000)
+    aio_pika.connect_robust = broker.connect_robust
+    text_client, binary_client = make_redis_clients(args.redis_latency_ms / 1000)
+    # Swap the clients before any service module binds them at import time
+    dependencies.redis.redis_client = text_client
+    dependencies.redis.redis_binary_client = binary_client
+
+    bench = IngestBench(broker, text_client, args.timeout)
+    await bench.start()
+    results = []
+    try:
+        for points in args.points:
+            messages = max(args.min_messages, min(args.messages, args.point_budget // points))
+            for x_type in args.x_types:
+                for duplicate_ratio in args.duplicate_ratios:
+                    result = await bench.case(
+                        points, x_type, duplicate_ratio, messages, min(messages, args.memory_messages)
+                    )
+                    results.append(result)
+                    print(
+                        f"{points:>7} {x_type:>8} {duplicate_ratio:>5.2f} {messages:>6}"
+                        f" {result['messages_per_sec']:>10.1f} {result['latency_p50_ms']:>9.3f}"
+                        f" {result['latency_p99_ms']:>9.3f} {result['peak_memory_bytes'] / 1e6:>9.2f}",
+                        file=sys.stderr,
+                    )
+    finally:
+        await bench.stop()
+
+    return {
+        "benchmark": "ingest",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "orjson": sys.modules.get("orjson") is not None,
+        "redis_latency_ms": args.redis_latency_ms,
+        "amqp_latency_ms": args.amqp_latency_ms,
+        "settings": settings_snapshot(),
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=POINT_COUNTS)
+    parser.add_argument("--x-types", nargs="+", choices=X_TYPES, default=X_TYPES)
+    parser.add_argument("--duplicate-ratios", type=float, nargs="+", default=DUPLICATE_RATIOS)
+    parser.add_argument("--messages", type=int, default=2000, help="maximum messages per case")
+    parser.add_argument("--min-messages", type=int, default=3, help="minimum messages per case")
+    parser.add_argument("--point-budget", type=int, default=300_000, help="points per case before --min-messages")
+    parser.add_argument("--memory-messages", type=int, default=20, help="messages in the traced memory pass")
+    parser.add_argument("--redis-latency-ms", type=float, default=0.0, help="added to every Redis round trip")
+    parser.add_argument("--amqp-latency-ms", type=float, default=0.0, help="added to every publish confirm")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for a case to settle")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    print(
+        f"{'points':>7} {'x_type':>8} {'dup':>5} {'msgs':>6} {'msg/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>9}",
+        file=sys.stderr,
+    )
+    report = asyncio.run(run_matrix(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compare per-message CPU of the legacy, single-encode and columnar serialization paths.
+
+Run from the repository root:
+
+    python benchmarks/serialization_benchmark.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from schemas.columnar import ColumnarWrapperMessage  # noqa: E402
+from schemas.wrapper_message import WrapperMessage  # noqa: E402
+from services.serialization import decode_wrapper_message, encode_wrapper_message, loads, orjson  # noqa: E402
+
+POINT_COUNTS = [10, 1_000, 50_000]
+
+
+def make_body(points: int) -> bytes:
+    return json.dumps({
+        "wrapper_id": "3f1c8a4e-0d5b-4a8e-9a51-2b7f1f3c9d10",
+        "data": [{"x": f"2024-01-01T00:00:{i % 60:02d}.{i:06d}Z", "y": i * 0.5} for i in range(points)],
+        "metadata": {"source": "benchmark"},
+    }).encode()
+
+
+def legacy_path(body: bytes) -> None:
+    raw_data = json.loads(body.decode())
+    message = WrapperMessage(**raw_data)
+    message.model_dump_json()  # last_message
+    message.model_dump_json()  # wrapper_last_message
+    message.model_dump_json().encode()  # publish
+
+
+def single_encode_path(body: bytes) -> None:
+    message = decode_wrapper_message(body)
+    encode_wrapper_message(message)
+
+
+def columnar_path(body: bytes) -> None:
+    message = ColumnarWrapperMessage.from_raw(loads(body))
+    encode_wrapper_message(message)
+
+
+def measure(func, body: bytes, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        func(body)
+    return (time.process_time() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"orjson available: {orjson is not None}")
+    print(f"{'points':>8} {'legacy ms':>10} {'single ms':>10} {'saved':>7} {'columnar ms':>12} {'saved':>7}")
+    for points in POINT_COUNTS:
+        body = make_body(points)
+        repeat = max(1, args.repeat * 1000 // max(points, 1000))
+        legacy = measure(legacy_path, body, repeat)
+        single = measure(single_encode_path, body, repeat)
+        columnar = measure(columnar_path, body, repeat)
+        print(
+            f"{points:>8} {legacy * 1000:>10.3f} {single * 1000:>10.3f} {1 - single / legacy:>7.1%}"
+            f" {columnar * 1000:>12.3f} {1 - columnar / legacy:>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
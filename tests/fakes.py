@@ -0,0 +1,28 @@
+from aio_pika.exceptions import MessageProcessError
+
+
+class FakeIncomingMessage:
+    """Incoming message stand-in that settles like aio_pika's: once, and only itself."""
+
+    def __init__(self, body: bytes, delivery_tag: int = 1, headers: dict = None) -> None:
+        self.body = body
+        self.headers = headers or {}
+        self.redelivered = False
+        self.delivery_tag = delivery_tag
+        self.processed = False
+        self.settled = []
+
+    def _settle(self, outcome: str) -> None:
+        if self.processed:
+            raise MessageProcessError("Message already processed", self)
+        self.processed = True
+        self.settled.append(outcome)
+
+    async def ack(self, multiple: bool = False) -> None:
+        self._settle("ack")
+
+    async def reject(self, requeue: bool = False) -> None:
+        self._settle("reject")
+
+    async def nack(self, multiple: bool = False, requeue: bool = True) -> None:
+        self._settle("nack")
@@ -0,0 +1,61 @@
+import json
+import queue
+import threading
+
+from backfill import Checkpoint, Reader
+
+
+# w1 and w2 go to worker 0, w4 to worker 1
+WRAPPER_IDS = ["w1", "w4", "w2", "w1", "w4", "w1", "w2"]
+
+
+def write_input(tmp_path):
+    lines = [json.dumps({"wrapper_id": wrapper_id, "n": n}) + "\n" for n, wrapper_id in enumerate(WRAPPER_IDS)]
+    path = tmp_path / "input.jsonl"
+    path.write_text("".join(lines))
+    offsets = [sum(len(line) for line in lines[:n]) for n in range(len(lines))]
+    return [str(path)], offsets
+
+
+def run_reader(files, checkpoint, processes=2, batch_size=2):
+    queues = [queue.Queue(maxsize=2) for _ in range(processes)]
+    progress = queue.Queue()
+    received = {index: [] for index in range(processes)}
+
+    def work(index):
+        while (batch := queues[index].get()) is not None:
+            seq, bodies = batch
+            received[index].extend(json.loads(body) for body in bodies)
+            progress.put((index, seq, {"messages": len(received[index])}, {}))
+        progress.put((index, None, {"messages": len(received[index])}, {}))
+
+    workers = [threading.Thread(target=work, args=(index,), name=f"backfill-{index}") for index in range(processes)]
+    for worker in workers:
+        worker.start()
+    reader = Reader(workers, queues, progress, batch_size, checkpoint, total_bytes=1)
+    reader.read(files)
+    reader.stop()
+    return received
+
+
+def test_each_worker_gets_its_wrappers_in_file_order(tmp_path):
+    files, _ = write_input(tmp_path)
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint"), 2, files)
+
+    received = run_reader(files, checkpoint)
+
+    assert [message["n"] for message in received[0]] == [0, 2, 3, 5, 6]
+    assert [message["n"] for message in received[1]] == [1, 4]
+    # Saved after the last, partial batches too
+    assert Checkpoint(str(tmp_path / "checkpoint"), 2, files).positions == [(1, 0), (1, 0)]
+
+
+def test_resume_skips_the_lines_each_worker_handled(tmp_path):
+    files, offsets = write_input(tmp_path)
+    checkpoint = Checkpoint(None, 2, files)
+    checkpoint.positions = [(0, offsets[3]), (0, offsets[2])]
+
+    resumed = run_reader(files, checkpoint)
+
+    assert [message["n"] for message in resumed[0]] == [3, 5, 6]
+    assert [message["n"] for message in resumed[1]] == [4]
@@ -0,0 +1,44 @@
+import asyncio
+
+import fakeredis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from dependencies.circuit_breaker import CircuitBreaker
+from services.cache_writer import CacheWriteBuffer
+
+
+class FailingRedis:
+    async def mset(self, values):
+        await asyncio.sleep(0.01)
+        raise RedisConnectionError("down")
+
+
+def test_failed_flush_keeps_newest_entries_within_cap():
+    buffer = CacheWriteBuffer(0.1, 2, 1.0, CircuitBreaker("test_flush", 5, 10.0))
+    buffer._redis = FailingRedis()
+    buffer.put("a", {"a": b"1", "a_etag": "1"})
+    buffer.put("b", {"b": b"1", "b_etag": "1"})
+
+    async def flush_while_writing():
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        assert not buffer._pending
+        buffer.put("c", {"c": b"1", "c_etag": "1"})
+        await flush
+
+    asyncio.run(flush_while_writing())
+
+    assert list(buffer._pending) == ["b", "c"]
+    assert buffer._pending["b"] == {"b": b"1", "b_etag": "1"}
+
+
+def test_flush_writes_entries_in_one_mset():
+    buffer = CacheWriteBuffer(0.1, 10, 1.0, CircuitBreaker("test_flush_ok", 5, 10.0))
+    buffer._redis = fakeredis.FakeAsyncRedis()
+    buffer.put("a", {"a": b"1"})
+    buffer.put("a", {"a": b"2", "a_etag": b"2"})
+
+    asyncio.run(buffer.flush())
+
+    assert asyncio.run(buffer._redis.mget(["a", "a_etag"])) == [b"2", b"2"]
+    assert not buffer._pending
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from config import settings
+from dependencies.rabbitmq import data_mq_client
+from services import data_ingestor
+from services import validation_service as validation_module
+from services.data_ingestor import body_wrapper_id
+from services.segmenter import PayloadSegmenter
+from services.validation_service import ValidationService
+
+from fakes import FakeIncomingMessage
+
+
+@pytest.mark.parametrize("body, wrapper_id", [
+    (b'{"wrapper_id": "w1", "data": [], "metadata": {}}', "w1"),
+    (b'{"metadata": {"wrapper_id": "nested"}, "wrapper_id": "w1", "data": []}', "w1"),
+    (b'{"data": [{"x": 1, "y": 1, "wrapper_id": "point"}], "wrapper_id": "w1", "metadata": {}}', "w1"),
+    (b'{"wrapper_id": "caf\\u00e9", "data": []}', "café"),
+    (b'{"metadata": {"wrapper_id": "a"}, "wrapper_id": "b", "data": [}', None),
+    (b' {\n  "wrapper_id" : "w1", "metadata": {"wrapper_id": "nested"}}', "w1"),
+    (b'{"wrapper_id": "say \\"hi\\"", "data": []}', 'say "hi"'),
+    (b'{"wrapper_id": "w\\\\", "data": []}', "w\\"),
+    (b'{"metadata": {"wrapper_id": "nested"}, "data": []}', None),
+    (b'{"wrapper_id": 5, "metadata": {"wrapper_id": "nested"}}', None),
+    (b'{"wrapper_id": null, "data": [{"x": 1, "y": 1, "wrapper_id": "point"}]}', None),
+    (b'[{"wrapper_id": "w1"}]', None),
+])
+def test_body_wrapper_id_reads_the_top_level_field(body, wrapper_id):
+    assert body_wrapper_id(body) == wrapper_id
+
+
+def message(tag, wrapper_id="w", points=1):
+    body = json.dumps({
+        "wrapper_id": wrapper_id,
+        "data": [{"x": tag * 1000 + index, "y": 1.0} for index in range(points)],
+        "metadata": {},
+    }).encode()
+    return FakeIncomingMessage(body, delivery_tag=tag)
+
+
+@pytest.fixture
+def ingestor(monkeypatch):
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    validation_service = ValidationService()
+    validation_service._redis = redis
+    monkeypatch.setattr(data_ingestor, "validation_service", validation_service)
+    monkeypatch.setattr(data_ingestor, "redis_client", redis)
+    monkeypatch.setattr(data_ingestor.cache_service, "_redis", redis)
+    monkeypatch.setattr(data_ingestor.cache_service, "_binary_redis", fakeredis.FakeAsyncRedis())
+    segmenter = PayloadSegmenter(300, 2)
+    monkeypatch.setattr(data_ingestor, "payload_segmenter", segmenter)
+    monkeypatch.setattr(validation_module, "payload_segmenter", segmenter)
+
+    state = {"forwarded": [], "retried": [], "fail_on": None}
+
+    async def forward_collected(payloads):
+        for payload in payloads:
+            if state["fail_on"] is not None and state["fail_on"] in payload:
+                raise state["error"]
+        state["forwarded"].extend(payloads)
+
+    async def retry_later(queue_name, messages, reason):
+        state["retried"].append([message for message in messages if not message.processed])
+        for message in messages:
+            if not message.processed:
+                await message.ack()
+
+    async def report(errors):
+        pass
+
+    monkeypatch.setattr(data_ingestor, "forward_collected", forward_collected)
+    monkeypatch.setattr(data_mq_client, "retry_later", retry_later)
+    monkeypatch.setattr(data_ingestor.error_reporter, "report", report)
+    return state
+
+
+def test_batch_acks_every_message_on_its_own(ingestor):
+    messages = [message(1), message(2), message(3, points=20), message(4)]
+
+    asyncio.run(data_ingestor.handle_data_batch(messages))
+
+    assert [m.settled for m in messages] == [["ack"]] * 4
+    assert ingestor["retried"] == []
+
+
+def test_failed_oversized_message_is_retried_with_the_messages_after_it(ingestor):
+    messages = [message(1), message(2), message(3, points=20), message(4)]
+    ingestor["fail_on"], ingestor["error"] = b'"x":3000', ConnectionError("down")
+
+    asyncio.run(data_ingestor.handle_data_batch(messages))
+
+    assert ingestor["retried"] == [messages[2:]]
+    assert [m.settled for m in messages] == [["ack"]] * 4
+
+
+def test_failed_run_after_an_oversized_message_retries_only_its_suffix(ingestor):
+    messages = [message(1), message(2), message(3, points=20), message(4), message(5)]
+    ingestor["fail_on"], ingestor["error"] = b'"x":4000', ConnectionError("down")
+
+    asyncio.run(data_ingestor.handle_data_batch(messages))
+
+    assert ingestor["retried"] == [messages[3:]]
+    assert b'"x":5000' not in b"".join(ingestor["forwarded"])
+
+
+def test_unexpected_failure_after_a_mixed_run_leaves_only_the_suffix_unsettled(ingestor):
+    messages = [message(1), message(2), message(3, points=20), message(4), message(5)]
+    ingestor["fail_on"], ingestor["error"] = b'"x":4000', RuntimeError("Publisher not bound")
+
+    asyncio.run(data_mq_client._handle_batch(settings.DATA_QUEUE, data_ingestor.handle_data_batch, messages))
+
+    assert ingestor["retried"] == [messages[3:]]
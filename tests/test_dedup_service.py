@@ -0,0 +1,20 @@
+import asyncio
+
+import fakeredis
+
+from services.dedup_service import DedupService
+
+
+def test_sub_second_ttl_claims_in_redis():
+    service = DedupService(max_size=10, ttl=0.5, use_redis=True)
+    service._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def claim():
+        key, is_new = await service.claim("w", b"body")
+        return is_new, await service._redis.pttl(key), await service.claim_many([("w", b"other")])
+
+    is_new, ttl, claimed = asyncio.run(claim())
+
+    assert is_new
+    assert 0 < ttl <= 500
+    assert claimed[0][1]
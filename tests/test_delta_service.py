@@ -0,0 +1,52 @@
+import asyncio
+
+import fakeredis
+
+from schemas.wrapper_message import WrapperMessage
+from services.delta_service import DELTA_METADATA_KEY, DIFF_POINTS_SCRIPT, DeltaService
+
+
+def make_service():
+    service = DeltaService("w", ttl=60)
+    service._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    service._diff_script = service._redis.register_script(DIFF_POINTS_SCRIPT)
+    return service
+
+
+def wrapper_message(points):
+    return WrapperMessage.model_validate({
+        "wrapper_id": "w",
+        "data": [{"x": x, "y": y} for x, y in points],
+        "metadata": {},
+    })
+
+
+def test_equal_numbers_share_a_delta_field():
+    service = make_service()
+
+    async def deltas():
+        first = await service.delta(wrapper_message([(1, 2.0), (2, 3.0)]))
+        unchanged = await service.delta(wrapper_message([(1.0, 2.0), (2.0, 3.0)]))
+        changed = await service.delta(wrapper_message([(1, 2.0), (2.0, 4.0)]))
+        return first, unchanged, changed
+
+    first, unchanged, changed = asyncio.run(deltas())
+
+    assert len(first.data) == 2
+    assert unchanged is None
+    assert [(point.x, point.y) for point in changed.data] == [(2.0, 4.0)]
+    assert changed.metadata[DELTA_METADATA_KEY] == {"total_points": 2, "new_points": 1}
+
+
+def test_batch_deltas_pass_other_wrappers_through():
+    service = make_service()
+    other = WrapperMessage.model_validate({"wrapper_id": "other", "data": [{"x": 1, "y": 1}], "metadata": {}})
+
+    async def deltas():
+        await service.delta(wrapper_message([(1, 2.0)]))
+        return await service.deltas([wrapper_message([(1.0, 2.0)]), other], [False, False])
+
+    unchanged, passed = asyncio.run(deltas())
+
+    assert unchanged is None
+    assert passed is other
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from dependencies.dispatchers import BatchDispatcher, ShardedDispatcher
+
+from fakes import FakeIncomingMessage
+
+
+def wrapper_key(message):
+    return json.loads(message.body)["wrapper_id"]
+
+
+def test_sharded_dispatcher_keeps_each_key_in_delivery_order():
+    handled = []
+
+    async def process(message):
+        body = json.loads(message.body)
+        # Uneven handling times, so that shards overtake each other
+        await asyncio.sleep(body["n"] * 7 % 5 / 1000)
+        handled.append(body)
+
+    async def dispatch():
+        dispatcher = ShardedDispatcher("q", process, wrapper_key, shards=4, max_in_flight=3)
+        dispatcher.start()
+        for n in range(40):
+            body = json.dumps({"wrapper_id": f"w{n % 5}", "n": n}).encode()
+            await dispatcher.submit(FakeIncomingMessage(body, delivery_tag=n + 1))
+            assert dispatcher.in_flight <= 3
+        await dispatcher.drain(timeout=5)
+        return dispatcher
+
+    dispatcher = asyncio.run(dispatch())
+
+    assert dispatcher.in_flight == 0
+    assert sorted(message["n"] for message in handled) == list(range(40))
+    for wrapper_id in {message["wrapper_id"] for message in handled}:
+        ns = [message["n"] for message in handled if message["wrapper_id"] == wrapper_id]
+        assert ns == sorted(ns)
+
+
+def test_sharded_dispatcher_survives_a_failing_message():
+    handled = []
+
+    async def process(message):
+        if message.body == b"bad":
+            raise RuntimeError("boom")
+        handled.append(message.body)
+
+    async def dispatch():
+        dispatcher = ShardedDispatcher("q", process, None, shards=1, max_in_flight=10)
+        dispatcher.start()
+        for body in (b"bad", b"good"):
+            await dispatcher.submit(FakeIncomingMessage(body))
+        await dispatcher.drain(timeout=5)
+
+    asyncio.run(dispatch())
+
+    assert handled == [b"good"]
+
+
+def test_batch_dispatcher_closes_batches_at_size_and_after_linger():
+    batches = []
+
+    async def process_batch(messages):
+        batches.append([message.delivery_tag for message in messages])
+
+    async def dispatch():
+        dispatcher = BatchDispatcher("q", process_batch, batch_size=3, linger=0.05)
+        dispatcher.start()
+        for tag in range(1, 5):
+            await dispatcher.submit(FakeIncomingMessage(b"{}", delivery_tag=tag))
+        await dispatcher.drain(timeout=5)
+        return dispatcher
+
+    dispatcher = asyncio.run(dispatch())
+
+    assert batches == [[1, 2, 3], [4]]
+    assert dispatcher.in_flight == 0
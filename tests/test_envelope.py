@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from services.envelope import (
+    ENVELOPE_COUNT_HEADER,
+    ENVELOPE_ENCODING_HEADER,
+    EnvelopeWriter,
+    pack_envelope,
+    unpack_envelope,
+)
+
+
+class FakeClient:
+    def __init__(self, error=None):
+        self.published = []
+        self._error = error
+
+    async def publish(self, queue_name, body, headers=None):
+        if self._error is not None:
+            raise self._error
+        self.published.append((queue_name, body, headers))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_envelopes_round_trip(compress):
+    body, headers = pack_envelope([b'{"n": 1}', b'{"n": 2}'], compress)
+
+    assert headers[ENVELOPE_COUNT_HEADER] == 2
+    assert unpack_envelope(body, headers) == [{"n": 1}, {"n": 2}]
+
+
+def test_unpack_checks_the_declared_count_and_encoding():
+    body, headers = pack_envelope([b'{"n": 1}'])
+
+    assert unpack_envelope(b'{"n": 1}') == [{"n": 1}]
+    with pytest.raises(ValueError):
+        unpack_envelope(body, {**headers, ENVELOPE_COUNT_HEADER: 2})
+    with pytest.raises(ValueError):
+        unpack_envelope(body, {**headers, ENVELOPE_ENCODING_HEADER: "gzip"})
+
+
+def test_writer_flushes_full_envelopes_and_the_lingering_rest():
+    client = FakeClient()
+    writer = EnvelopeWriter(client, "collected", max_messages=2, max_bytes=1000, linger=0.01)
+
+    asyncio.run(writer.add_many([b'{"n": 1}', b'{"n": 2}', b'{"n": 3}']))
+
+    assert [unpack_envelope(body, headers) for _, body, headers in client.published] == [
+        [{"n": 1}, {"n": 2}],
+        [{"n": 3}],
+    ]
+
+
+def test_writer_flushes_at_max_bytes():
+    client = FakeClient()
+    writer = EnvelopeWriter(client, "collected", max_messages=10, max_bytes=8, linger=60)
+
+    asyncio.run(writer.add_many([b'{"n": 1}', b'{"n": 2}']))
+
+    assert [headers[ENVELOPE_COUNT_HEADER] for _, _, headers in client.published] == [1, 1]
+
+
+def test_add_many_raises_when_an_envelope_is_not_published():
+    writer = EnvelopeWriter(FakeClient(ConnectionError("down")), "collected", max_messages=1, max_bytes=1000, linger=60)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(writer.add_many([b'{"n": 1}']))
@@ -0,0 +1,65 @@
+from dependencies.flow_control import FlowController
+
+
+def make_controller():
+    return FlowController(
+        watched_queues=["collected"],
+        initial_prefetch=10,
+        min_prefetch=1,
+        max_prefetch=12,
+        step=2,
+        target_latency=0.5,
+        max_error_rate=0.1,
+        pause_latency=1.0,
+        resume_latency=0.2,
+        pause_seconds=5.0,
+        interval=1.0,
+    )
+
+
+def test_prefetch_grows_additively_and_halves_on_slow_handlers():
+    controller = make_controller()
+
+    controller.observe_handler(0.1)
+    controller.adjust(0.0)
+    assert controller.prefetch == 12
+    controller.observe_handler(0.1)
+    controller.adjust(1.0)
+    assert controller.prefetch == 12
+    controller.observe_handler(0.9)
+    controller.adjust(2.0)
+    assert controller.prefetch == 6
+    controller.observe_handler(0.1, failed=True)
+    controller.adjust(3.0)
+    assert controller.prefetch == 3
+
+
+def test_failing_publishes_pause_until_they_recover_and_the_pause_elapsed():
+    controller = make_controller()
+
+    controller.observe_publish("other", 5.0, failed=True)
+    controller.adjust(0.0)
+    assert not controller.paused
+
+    controller.observe_publish("collected", 0.1, failed=True)
+    controller.adjust(1.0)
+    assert controller.paused and controller.prefetch == 1
+
+    controller.observe_publish("collected", 0.1)
+    controller.adjust(3.0)
+    assert controller.paused
+
+    controller.observe_publish("collected", 0.5)
+    controller.adjust(10.0)
+    assert controller.paused
+
+    controller.observe_publish("collected", 0.1)
+    controller.adjust(11.0)
+    assert not controller.paused and controller.prefetch == 1
+
+
+def test_prefetch_respects_the_floor_of_batch_consumers():
+    controller = make_controller()
+
+    assert controller.prefetch_for(floor=50) == 50
+    assert controller.prefetch_for() == 10
@@ -0,0 +1,51 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import fakeredis
+import pytest
+
+from config import settings
+from schemas.wrapper_message import WrapperMessage
+from services.history_service import HistoryService
+
+
+@pytest.fixture
+def history_service():
+    service = HistoryService()
+    service._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return service
+
+
+def history_points(service, wrapper_id):
+    return json.loads(asyncio.run(service.get_history_json(wrapper_id)))["points"]
+
+
+def test_equal_points_of_different_messages_are_all_kept(history_service):
+    message = WrapperMessage(wrapper_id="w", data=[{"x": "a", "y": 1}], metadata={})
+
+    asyncio.run(history_service.append(message))
+    asyncio.run(history_service.append(message))
+
+    assert history_points(history_service, "w") == [{"x": "a", "y": 1.0}] * 2
+
+
+def test_downsampling_averages_old_points_into_buckets(history_service, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_DOWNSAMPLE_AFTER_SECONDS", 3600)
+    monkeypatch.setattr(settings, "HISTORY_DOWNSAMPLE_BUCKET_SECONDS", 60)
+    bucket = (time.time() - 7200) // 60 * 60
+    data = [
+        {"x": datetime.fromtimestamp(bucket + offset, timezone.utc).isoformat(), "y": y}
+        for offset, y in ((0, 1.0), (10, 1.0), (20, 4.0), (60, 2.0))
+    ]
+    # Stored before history members had a sequence number
+    legacy_x = datetime.fromtimestamp(bucket + 30, timezone.utc).isoformat()
+    asyncio.run(history_service._redis.zadd("wrapper_history:w", {json.dumps({"x": legacy_x, "y": 2.0}): bucket + 30}))
+
+    asyncio.run(history_service.append(WrapperMessage(wrapper_id="w", data=data, metadata={})))
+
+    assert history_points(history_service, "w") == [
+        {"x": datetime.fromtimestamp(bucket, timezone.utc).isoformat(), "y": 2, "n": 4},
+        {"x": datetime.fromtimestamp(bucket + 60, timezone.utc).isoformat(), "y": 2, "n": 1},
+    ]
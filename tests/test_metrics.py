@@ -0,0 +1,17 @@
+from dependencies.metrics import MESSAGES_SETTLED, render
+
+
+def test_unlabelled_counters_are_exposed_before_their_first_increment():
+    lines = render().decode().splitlines()
+
+    assert "# TYPE data_collector_duplicates_skipped_total counter" in lines
+    assert any(line.startswith("data_collector_duplicates_skipped_total ") for line in lines)
+    assert any(line.startswith("data_collector_duplicates_skipped_created ") for line in lines)
+
+
+def test_labelled_counters_are_exposed_with_the_total_suffix():
+    MESSAGES_SETTLED.labels("metrics-test", "ack").inc(2)
+
+    text = render().decode()
+
+    assert 'data_collector_messages_settled_total{outcome="ack",queue="metrics-test"} 2.0' in text
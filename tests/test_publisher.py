@@ -0,0 +1,67 @@
+import asyncio
+
+import aio_pika
+
+from dependencies.publisher import Publisher
+
+
+class FakeChannel:
+    """Confirm channel that writes publishes in call order and confirms them out of order."""
+
+    def __init__(self, nack_once=()):
+        self.is_closed = False
+        self.declares = 0
+        self.written = []
+        self.confirmed = []
+        self._nack_once = set(nack_once)
+        self.default_exchange = self
+
+    async def declare_queue(self, name, durable, arguments=None):
+        await asyncio.sleep(0.01)
+        self.declares += 1
+
+    async def publish(self, message, routing_key):
+        self.written.append(message.body)
+        # Later messages confirm first, as an earlier one's retry backoff would allow
+        await asyncio.sleep(0.01 / len(self.written))
+        if message.body in self._nack_once:
+            self._nack_once.discard(message.body)
+            raise aio_pika.exceptions.AMQPError("nacked")
+        self.confirmed.append(message.body)
+
+
+class FakeConnection:
+    def __init__(self, channel):
+        self._channel = channel
+        self.reconnect_callbacks = set()
+
+    async def channel(self, publisher_confirms):
+        return self._channel
+
+
+def make_publisher(channel):
+    publisher = Publisher(max_in_flight=10, retry_backoff=0.001)
+    publisher.bind(FakeConnection(channel))
+    return publisher
+
+
+def test_failed_message_is_resent_with_everything_after_it_in_order():
+    channel = FakeChannel(nack_once={b"2"})
+    publisher = make_publisher(channel)
+
+    asyncio.run(publisher.publish_many("q", [b"1", b"2", b"3", b"4"]))
+
+    assert channel.written == [b"1", b"2", b"3", b"4", b"2", b"3", b"4"]
+
+
+def test_concurrent_first_publishes_declare_the_queue_once():
+    channel = FakeChannel()
+    publisher = make_publisher(channel)
+
+    async def publish_both():
+        await asyncio.gather(publisher.publish_many("q", [b"1"]), publisher.publish_many("q", [b"2"]))
+
+    asyncio.run(publish_both())
+
+    assert channel.declares == 1
+    assert sorted(channel.confirmed) == [b"1", b"2"]
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from dependencies.rabbitmq import RabbitMQClient
+from dependencies.retry import RETRY_COUNT_HEADER, RetryScheduler
+
+from fakes import FakeIncomingMessage
+
+
+class FakePublisher:
+    def __init__(self):
+        self.published = []
+        self.arguments = {}
+
+    def set_queue_arguments(self, queue_name, arguments):
+        self.arguments[queue_name] = arguments
+
+    async def publish(self, queue_name, message, headers=None):
+        self.published.append((queue_name, message, headers))
+
+
+@pytest.fixture
+def client():
+    client = RabbitMQClient(url="amqp://unused")
+    client.retries = RetryScheduler(FakePublisher(), max_attempts=3, base_delay_ms=100, max_delay_ms=150)
+    return client
+
+
+def test_retry_later_counts_attempts_in_a_header(client):
+    first = FakeIncomingMessage(b"first")
+    retried = FakeIncomingMessage(b"retried", headers={RETRY_COUNT_HEADER: 1, "x-death": [{}]})
+
+    asyncio.run(client.retry_later("q", [first, retried], "ValueError: boom"))
+
+    published = client.retries._publisher.published
+    assert [(queue, body) for queue, body, _ in published] == [("q.retry.100", b"first"), ("q.retry.150", b"retried")]
+    assert [headers[RETRY_COUNT_HEADER] for _, _, headers in published] == [1, 2]
+    assert "x-death" not in published[1][2]
+    assert client.retries._publisher.arguments["q.retry.150"]["x-dead-letter-routing-key"] == "q"
+    assert first.settled == retried.settled == ["ack"]
+
+
+def test_retry_later_quarantines_after_max_attempts(client):
+    message = FakeIncomingMessage(b"poison", headers={RETRY_COUNT_HEADER: 2})
+
+    asyncio.run(client.retry_later("q", [message], "ValueError: boom"))
+
+    queue, _, headers = client.retries._publisher.published[0]
+    assert queue == "q.dead"
+    assert headers[RETRY_COUNT_HEADER] == 3
+    assert headers["x-failure-reason"] == "ValueError: boom"
+    assert message.settled == ["ack"]
+
+
+def test_retry_later_skips_settled_messages(client):
+    settled, unsettled = FakeIncomingMessage(b"settled"), FakeIncomingMessage(b"unsettled")
+    asyncio.run(settled.ack())
+
+    asyncio.run(client.retry_later("q", [settled, unsettled], "ValueError: boom"))
+
+    assert [body for _, body, _ in client.retries._publisher.published] == [b"unsettled"]
+    assert settled.settled == unsettled.settled == ["ack"]
+
+
+def test_retry_later_requeues_unsettled_messages_when_disabled(client):
+    client.retries = None
+    settled, unsettled = FakeIncomingMessage(b"settled"), FakeIncomingMessage(b"unsettled")
+    asyncio.run(settled.ack())
+
+    asyncio.run(client.retry_later("q", [settled, unsettled], "ValueError: boom"))
+
+    assert settled.settled == ["ack"]
+    assert unsettled.settled == ["nack"]
+
+
+def test_failed_copy_requeues_the_message(client):
+    async def fail(queue_name, message, headers=None):
+        raise ConnectionError("broker gone")
+
+    client.retries._publisher.publish = fail
+    message = FakeIncomingMessage(b"body")
+
+    asyncio.run(client.retry_later("q", [message], "ValueError: boom"))
+
+    assert message.settled == ["nack"]
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from schemas.columnar import ColumnarWrapperMessage
+from services.segmenter import PayloadSegmenter, SegmentPoints
+
+
+def body(points, **fields):
+    return json.dumps({
+        "metadata": {"data": [{"x": "not", "y": "points"}], "note": "a } in a string"},
+        "wrapper_id": "w",
+        "data": [{"x": x, "y": y} for x, y in points],
+        **fields,
+    }).encode()
+
+
+def test_plan_splits_the_top_level_data_array_into_chunks():
+    segmenter = PayloadSegmenter(threshold_bytes=10, chunk_points=2)
+    raw = body([(index, float(index)) for index in range(5)])
+
+    plan = asyncio.run(segmenter.plan(raw))
+
+    assert plan.wrapper_id == "w"
+    assert plan.metadata["note"] == "a } in a string"
+    assert plan.points == 5
+    segments = [segmenter.decode_segment(raw, plan, index) for index in range(len(plan.spans))]
+    assert [list(segment.x) for segment in segments] == [[0, 1], [2, 3], [4]]
+    assert all(segment.metadata == plan.metadata for segment in segments)
+
+
+def test_plan_leaves_bodies_without_point_objects_to_the_regular_path():
+    segmenter = PayloadSegmenter(threshold_bytes=10, chunk_points=2)
+
+    assert asyncio.run(segmenter.plan(b'{"wrapper_id": "w", "data": [1, 2], "metadata": {}}')) is None
+    assert asyncio.run(segmenter.plan(b'{"wrapper_id": "w", "data": [], "metadata": {}}')) is None
+    assert asyncio.run(segmenter.plan(body([(1, 1.0)], wrapper_id=5))) is None
+
+
+def test_repeated_x_values_belong_to_the_segment_where_they_first_appear():
+    segmenter = PayloadSegmenter(threshold_bytes=10, chunk_points=2)
+    raw = body([(1, 1.0), (2, 2.0), (1, 1.0), (3, 3.0)])
+    plan = asyncio.run(segmenter.plan(raw))
+    segments = [segmenter.decode_segment(raw, plan, index) for index in range(len(plan.spans))]
+    points = SegmentPoints()
+
+    assert [points.add(segment, index) for index, segment in enumerate(segments)] == [None, None]
+    assert points.points == 3
+    assert points.owned_positions(segments[1], 1) == [1]
+
+    conflicting = ColumnarWrapperMessage.from_raw({"wrapper_id": "w", "data": [{"x": 2, "y": 5.0}], "metadata": {}})
+    assert points.add(conflicting, 2) == "Conflicting y values [2.0, 5.0] for x=2"
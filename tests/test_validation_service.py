@@ -0,0 +1,145 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from config import settings
+from dependencies.circuit_breaker import CircuitBreaker
+from services import data_ingestor
+from services.stats_cache import WrapperStatsCache
+from services.validation_service import ValidationService
+
+from fakes import FakeIncomingMessage
+
+NON_OBJECT_BODIES = [b"[]", b"1", b'"x"', b"null"]
+
+
+@pytest.fixture
+def validation_service():
+    service = ValidationService()
+    service._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return service
+
+
+@pytest.mark.parametrize("body", NON_OBJECT_BODIES)
+def test_validate_body_rejects_non_object_json(validation_service, body):
+    message, error = asyncio.run(validation_service.validate_body(body))
+
+    assert message is None
+    assert error.error_type == "schema_error"
+    assert error.wrapper_id == "unknown"
+
+
+def test_validate_batch_rejects_non_object_json(validation_service):
+    decoded = [validation_service.decode_body(body) for body in NON_OBJECT_BODIES]
+
+    results = asyncio.run(validation_service.validate_batch(decoded))
+
+    assert [error.error_type for _, error in results] == ["schema_error"] * len(NON_OBJECT_BODIES)
+
+
+def test_validate_body_rejects_non_string_wrapper_id(validation_service):
+    message, error = asyncio.run(validation_service.validate_body(b'{"wrapper_id": 5, "data": 1, "metadata": {}}'))
+
+    assert message is None
+    assert error.wrapper_id == "unknown"
+
+
+@pytest.mark.parametrize("body", NON_OBJECT_BODIES)
+def test_consumer_reports_and_acks_non_object_json(monkeypatch, validation_service, body):
+    reported = []
+
+    async def report(errors):
+        reported.extend(errors)
+
+    monkeypatch.setattr(data_ingestor, "validation_service", validation_service)
+    monkeypatch.setattr(data_ingestor.error_reporter, "report", report)
+    message = FakeIncomingMessage(body)
+
+    asyncio.run(data_ingestor.handle_data_message(message))
+
+    assert message.settled == ["ack"]
+    assert [error.error_type for error in reported] == ["schema_error"]
+
+
+def test_read_only_service_checks_coherence_without_recording():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    recording = ValidationService()
+    recording._redis = redis
+    recording._record_script = redis.register_script(recording._record_script.script)
+    read_only = ValidationService(read_only=True)
+    read_only._redis = redis
+    numbers = b'{"wrapper_id": "w", "data": [{"x": 1, "y": 1}], "metadata": {}}'
+    strings = b'{"wrapper_id": "w", "data": [{"x": "a", "y": 1}], "metadata": {}}'
+    fresh = b'{"wrapper_id": "new", "data": [{"x": 1, "y": 1}], "metadata": {}}'
+    fresh_strings = b'{"wrapper_id": "new", "data": [{"x": "a", "y": 1}], "metadata": {}}'
+
+    async def run():
+        await recording.validate_body(numbers)
+        before = {key: await redis.dump(key) for key in await redis.keys()}
+        single = [await read_only.validate_body(body) for body in (numbers, strings, fresh)]
+        batch = await read_only.validate_batch([read_only.decode_body(body) for body in (strings, fresh_strings)])
+        after = {key: await redis.dump(key) for key in await redis.keys()}
+        return before, after, single, batch
+
+    before, after, single, batch = asyncio.run(run())
+
+    assert after == before
+    assert [error.error_type if error else None for _, error in single] == [None, "coherence_error", None]
+    assert [error.error_type for _, error in batch] == ["coherence_error", "coherence_error"]
+
+
+def test_open_write_breaker_accepts_on_cached_types_without_recording(validation_service):
+    breaker = CircuitBreaker("test_stats", 1, 60.0)
+    breaker.record_failure()
+    validation_service._breaker = breaker
+    bodies = [
+        b'{"wrapper_id": "w", "data": [{"x": 1, "y": 1}], "metadata": {}}',
+        b'{"wrapper_id": "w", "data": [{"x": "a", "y": 1}], "metadata": {}}',
+    ]
+
+    results = asyncio.run(validation_service.validate_batch([validation_service.decode_body(body) for body in bodies]))
+
+    assert results[0][1] is None
+    assert results[1][1].error_type == "coherence_error"
+    assert asyncio.run(validation_service._redis.keys("*")) == []
+
+
+def test_recording_publishes_an_invalidation_only_when_statistics_are_created(validation_service):
+    body = b'{"wrapper_id": "w", "data": [{"x": 1, "y": 1}], "metadata": {}}'
+
+    async def record_twice():
+        pubsub = validation_service._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(settings.WRAPPER_STATS_INVALIDATION_CHANNEL)
+        await validation_service.validate_body(body)
+        await validation_service.validate_body(body)
+        # The ignored subscribe confirmation also reads as None
+        messages = [await pubsub.get_message(timeout=0.05) for _ in range(4)]
+        await pubsub.aclose()
+        return [message for message in messages if message is not None]
+
+    assert len(asyncio.run(record_twice())) == 1
+
+
+def test_statistics_reads_see_writes_of_other_replicas(validation_service):
+    other_replica = ValidationService()
+    other_replica._redis = validation_service._redis
+    other_replica._stats_cache = WrapperStatsCache(max_size=10, ttl=300.0)
+    body = b'{"wrapper_id": "w", "data": [{"x": 1, "y": 1}], "metadata": {}}'
+
+    async def run():
+        await validation_service.validate_body(body)
+        await validation_service.get_wrapper_stats("w")
+        await other_replica.validate_body(body)
+        await other_replica.validate_body(body)
+        single = await validation_service.get_wrapper_stats("w")
+        many = await validation_service.get_wrapper_stats_many(["w", "missing"])
+        page, _ = await validation_service.list_wrapper_stats()
+        return single, many, page
+
+    single, many, page = asyncio.run(run())
+
+    assert single.total_messages == 3
+    assert many["w"] == single
+    assert many["missing"] is None
+    assert page == [single]